@@ -10,3 +10,4 @@ class ConversationState(Enum):
     LIST_TYPES = auto()
     SHOW_DETAILS = auto()
     CONFIRM_REMOVAL = auto()
+    LIST_LETTERS = auto()
@@ -10,9 +10,17 @@ from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandl
 
 from bot.command.subs.conversation_state import ConversationState
 from bot.command.subs.list_details import list_details
-from bot.command.subs.list_names import list_names
+from bot.command.subs.list_names import jump_to_letter, list_letters, list_names, list_page
 from bot.command.subs.list_types import followup_list_feed_types, initial_list_feed_types
-from bot.command.subs.query_data import DetailsData, NamesData, RemoveFeedData, TypesData
+from bot.command.subs.query_data import (
+    DetailsData,
+    LetterData,
+    LettersData,
+    NamesData,
+    PageData,
+    RemoveFeedData,
+    TypesData,
+)
 from bot.command.subs.remove_feed import remove_subscription, request_confirmation
 from bot.user_filter import USER_FILTER
 
@@ -25,21 +33,33 @@ def subscriptions_initial_handler() -> CommandHandler:
 def subscriptions_followup_handler() -> ConversationHandler:
     """Followup conversation handler for inline keyboard queries"""
     return ConversationHandler(
-        entry_points=[CallbackQueryHandler(list_names, NamesData)],
+        # Search results are listed right away, so conversation can start from the names list.
+        entry_points=[
+            CallbackQueryHandler(list_names, NamesData),
+            CallbackQueryHandler(list_details, DetailsData),
+            CallbackQueryHandler(list_page, PageData),
+            CallbackQueryHandler(followup_list_feed_types, TypesData),
+        ],
         states={
             ConversationState.LIST_NAMES: [
                 CallbackQueryHandler(list_details, DetailsData),
+                CallbackQueryHandler(list_page, PageData),
+                CallbackQueryHandler(list_letters, LettersData),
                 CallbackQueryHandler(followup_list_feed_types, TypesData),
             ],
+            ConversationState.LIST_LETTERS: [
+                CallbackQueryHandler(jump_to_letter, LetterData),
+                CallbackQueryHandler(list_page, PageData),
+            ],
             ConversationState.SHOW_DETAILS: [
                 CallbackQueryHandler(request_confirmation, RemoveFeedData),
-                CallbackQueryHandler(list_names, NamesData),
+                CallbackQueryHandler(list_page, PageData),
                 CallbackQueryHandler(followup_list_feed_types, TypesData),
             ],
             ConversationState.CONFIRM_REMOVAL: [
                 CallbackQueryHandler(remove_subscription, RemoveFeedData),
                 CallbackQueryHandler(list_details, DetailsData),
-                CallbackQueryHandler(list_names, NamesData),
+                CallbackQueryHandler(list_page, PageData),
                 CallbackQueryHandler(followup_list_feed_types, TypesData),
             ],
             ConversationState.LIST_TYPES: [CallbackQueryHandler(list_names, NamesData)],
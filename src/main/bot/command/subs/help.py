@@ -2,4 +2,7 @@
 "subscriptions" command help message.
 """
 
-SUBSCRIPTIONS_HELP_MESSAGE = "/subscriptions - list and manage your subscriptions"
+SUBSCRIPTIONS_HELP_MESSAGE = (
+    "/subscriptions - list and manage your subscriptions,"
+    " /subscriptions [text] lists only subscriptions starting with the text, ignoring case"
+)
@@ -9,23 +9,28 @@ from time import struct_time
 from dateutil.tz import tzlocal, tzutc
 from loguru import logger
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ContextTypes
+from telegram.ext import ContextTypes, ConversationHandler
 
 from bot.command.subs.conversation_state import ConversationState
-from bot.command.subs.query_data import NamesData, RemoveFeedData, TypesData
+from bot.command.subs.query_data import PageData, RemoveFeedData, TypesData
+from bot.command.subs.view import resolve_view
 from db.wrapper import get_latest_entry_data
 
 
-async def list_details(update: Update, _: ContextTypes.DEFAULT_TYPE) -> ConversationState:
+async def list_details(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> ConversationState | int:
     query = update.callback_query
     await query.answer()
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
     chat_id = update.effective_chat.id
-    type, name, chat_data = query.data
+    type, name = view.feeds[query.data.feed_id]
     logger.info(f"[{chat_id}] Showing details for [{type}] [{name}]")
-    link, date = get_latest_entry_data(chat_id, type, name)
+    link, date = await get_latest_entry_data(chat_id, type, name)
     await query.edit_message_text(
         _generate_description(type, name, date),
-        reply_markup=_prepare_keyboard(type, name, chat_data, link),
+        reply_markup=_prepare_keyboard(view.id, query.data.feed_id, link),
     )
     return ConversationState.SHOW_DETAILS
 
@@ -41,13 +46,11 @@ def _generate_description(type: str, name: str, date: struct_time) -> str:
     return "\n".join(details)
 
 
-def _prepare_keyboard(
-    type: str, name: str, data: dict[str, list[str]], link: str
-) -> InlineKeyboardMarkup:
+def _prepare_keyboard(view_id: int, feed_id: int, link: str) -> InlineKeyboardMarkup:
     keyboard = [
-        [InlineKeyboardButton("Remove", callback_data=RemoveFeedData(type, name, data))],
-        [InlineKeyboardButton("« Back to subscriptions", callback_data=NamesData(type, data))],
-        [InlineKeyboardButton("« Back to types", callback_data=TypesData(data))],
+        [InlineKeyboardButton("Remove", callback_data=RemoveFeedData(view_id, feed_id))],
+        [InlineKeyboardButton("« Back to subscriptions", callback_data=PageData(view_id, 0))],
+        [InlineKeyboardButton("« Back to types", callback_data=TypesData(view_id))],
     ]
     if link:
         keyboard.insert(0, [InlineKeyboardButton("Latest RSS link", url=link)])
@@ -1,32 +1,204 @@
 """
-Module handling printing feed names from selected type.
+Module handling printing feed names from selected type, or matching a search query.
+
+Names are listed in pages, each page is loaded by a single bounded DB query.
+Names of a single type can also be limited to ones starting with a selected letter.
+Both letters and search queries match names ignoring case.
 Also allows going back to the list of all types.
 """
 
+from html import escape
+from itertools import product
+from typing import Callable
+
 from loguru import logger
+from more_itertools import chunked
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ContextTypes
+from telegram.ext import ContextTypes, ConversationHandler
 
 from bot.command.subs.conversation_state import ConversationState
-from bot.command.subs.query_data import DetailsData, TypesData
+from bot.command.subs.query_data import (
+    DetailsData,
+    LetterData,
+    LettersData,
+    PageData,
+    TypesData,
+)
+from bot.command.subs.view import SubscriptionsView, resolve_view, store_view
+from db.wrapper import get_stored_feeds_page
+from settings import SUBSCRIPTIONS_PAGE_SIZE
+
+# Letter used for all names not starting with a letter.
+OTHER_LETTER = "#"
+LETTERS = OTHER_LETTER + "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+LETTERS_PER_ROW = 6
+# Case variants of only a few first characters of a query are loaded by index ranges,
+# the whole query is then matched ignoring case by the DB itself.
+QUERY_RANGE_PREFIX_SIZE = 3
 
 
-async def list_names(update: Update, _: ContextTypes.DEFAULT_TYPE) -> ConversationState:
+async def list_names(update: Update, context: ContextTypes.DEFAULT_TYPE) -> ConversationState | int:
+    """List the first page of names of the selected type"""
     query = update.callback_query
     await query.answer()
-    type, chat_data = query.data
-    logger.info(f"[{update.effective_chat.id}] Requesting feed name for [{type}]")
-    await query.edit_message_text(
-        "Select subscription:",
-        reply_markup=_prepare_keyboard(type, chat_data),
-    )
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
+    view = view._replace(type_id=query.data.type_id, query=None, letter=None)
+    logger.info(f"[{update.effective_chat.id}] Requesting feed name for [{_type(view)}]")
+    await send_names_page(query.edit_message_text, context, update.effective_chat.id, view)
+    return ConversationState.LIST_NAMES
+
+
+async def list_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> ConversationState | int:
+    """List the next, previous or the current page of names again"""
+    query = update.callback_query
+    await query.answer()
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
+    chat_id = update.effective_chat.id
+    direction = query.data.direction
+    logger.info(f"[{chat_id}] Requesting page [{direction}] of [{_type(view)}] [{view.query}]")
+    if direction > 0 and view.feeds:
+        view = await _load_page(chat_id, view, after=_key(view.feeds[-1]))
+    elif direction < 0 and view.feeds:
+        view = await _load_page(chat_id, view, before=_key(view.feeds[0]))
+    store_view(context, view)
+    await _send_page(query.edit_message_text, view)
     return ConversationState.LIST_NAMES
 
 
-def _prepare_keyboard(type: str, chat_data: dict[str, list[str]]) -> InlineKeyboardMarkup:
+async def list_letters(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> ConversationState | int:
+    """List letters, which names of the selected type can start with"""
+    query = update.callback_query
+    await query.answer()
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
+    logger.info(f"[{update.effective_chat.id}] Requesting letters for [{_type(view)}]")
     keyboard = [
-        [InlineKeyboardButton(name, callback_data=DetailsData(type, name, chat_data))]
-        for name in chat_data[type]
+        [InlineKeyboardButton(letter, callback_data=LetterData(view.id, letter)) for letter in row]
+        for row in chunked(LETTERS, LETTERS_PER_ROW)
+    ]
+    keyboard += [
+        [InlineKeyboardButton("All", callback_data=LetterData(view.id, None))],
+        [InlineKeyboardButton("« Back to subscriptions", callback_data=PageData(view.id, 0))],
     ]
-    keyboard += [[InlineKeyboardButton("« Back to types", callback_data=TypesData(chat_data))]]
-    return InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text("Select letter:", reply_markup=InlineKeyboardMarkup(keyboard))
+    return ConversationState.LIST_LETTERS
+
+
+async def jump_to_letter(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> ConversationState | int:
+    """List the first page of names of the selected type, starting with the selected letter"""
+    query = update.callback_query
+    await query.answer()
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
+    letter = query.data.letter
+    logger.info(f"[{update.effective_chat.id}] Requesting [{_type(view)}] names from [{letter}]")
+    view = view._replace(letter=letter)
+    await send_names_page(query.edit_message_text, context, update.effective_chat.id, view)
+    return ConversationState.LIST_NAMES
+
+
+async def send_names_page(
+    response_callback: Callable,
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_id: int,
+    view: SubscriptionsView,
+) -> None:
+    """Load and send the first page of names listed by a given view"""
+    view = await _load_page(chat_id, view)
+    store_view(context, view)
+    await _send_page(response_callback, view)
+
+
+async def _load_page(
+    chat_id: int,
+    view: SubscriptionsView,
+    after: tuple[str, str] | None = None,
+    before: tuple[str, str] | None = None,
+) -> SubscriptionsView:
+    # One additional feed is loaded only to check whether there's another page after this one.
+    feeds = await get_stored_feeds_page(
+        chat_id,
+        SUBSCRIPTIONS_PAGE_SIZE + 1,
+        _type(view),
+        _name_ranges(view),
+        after,
+        before,
+        name_prefix=view.query,
+    )
+    has_more = len(feeds) > SUBSCRIPTIONS_PAGE_SIZE
+    if before:
+        return view._replace(
+            feeds=tuple(feeds[-SUBSCRIPTIONS_PAGE_SIZE:]), has_previous=has_more, has_next=True
+        )
+    return view._replace(
+        feeds=tuple(feeds[:SUBSCRIPTIONS_PAGE_SIZE]),
+        has_previous=after is not None,
+        has_next=has_more,
+    )
+
+
+async def _send_page(response_callback: Callable, view: SubscriptionsView) -> None:
+    keyboard = [
+        [InlineKeyboardButton(_label(view, *feed), callback_data=DetailsData(view.id, feed_id))]
+        for feed_id, feed in enumerate(view.feeds)
+    ]
+    navigation = []
+    if view.has_previous:
+        navigation.append(InlineKeyboardButton("‹ Previous", callback_data=PageData(view.id, -1)))
+    if view.has_next:
+        navigation.append(InlineKeyboardButton("Next ›", callback_data=PageData(view.id, 1)))
+    if navigation:
+        keyboard.append(navigation)
+    if view.type_id is not None:
+        keyboard.append(
+            [InlineKeyboardButton("Jump to letter", callback_data=LettersData(view.id))]
+        )
+    keyboard.append([InlineKeyboardButton("« Back to types", callback_data=TypesData(view.id))])
+    await response_callback(_header(view), reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+def _header(view: SubscriptionsView) -> str:
+    if not view.feeds:
+        return "No subscriptions found"
+    if view.query:
+        return f"Subscriptions starting with <b>{escape(view.query)}</b>:"
+    return "Select subscription:"
+
+
+def _label(view: SubscriptionsView, feed_type: str, feed_name: str) -> str:
+    # Feeds of all types are listed together only when searching.
+    return feed_name if view.type_id is not None else f"{feed_name} ({feed_type})"
+
+
+def _type(view: SubscriptionsView) -> str | None:
+    return view.types[view.type_id] if view.type_id is not None else None
+
+
+def _key(feed: tuple[str, str]) -> tuple[str, str]:
+    # Pages are sorted by name first, type is used only to order feeds with the same name.
+    feed_type, feed_name = feed
+    return feed_name, feed_type
+
+
+def _name_ranges(view: SubscriptionsView) -> list[tuple[str, str | None]]:
+    if view.query:
+        prefix = view.query[:QUERY_RANGE_PREFIX_SIZE]
+        cases = product(*[{char.upper(), char.lower()} for char in prefix])
+        return [(variant, _prefix_end(variant)) for variant in sorted(map("".join, cases))]
+    if view.letter == OTHER_LETTER:
+        # Everything before, between and after upper and lower case letters.
+        return [("", "A"), ("[", "a"), ("{", None)]
+    if view.letter:
+        upper, lower = view.letter.upper(), view.letter.lower()
+        return [(upper, _prefix_end(upper)), (lower, _prefix_end(lower))]
+    return []
+
+
+def _prefix_end(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
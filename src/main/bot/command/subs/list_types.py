@@ -1,43 +1,52 @@
 """
 Module handling listing subscribed feed types.
+When "subscriptions" command is run with a search query, matching names are listed instead.
 """
 
 from typing import Callable
 
 from loguru import logger
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ContextTypes
+from telegram.ext import ContextTypes, ConversationHandler
 
 from bot.command.subs.conversation_state import ConversationState
+from bot.command.subs.list_names import send_names_page
 from bot.command.subs.query_data import NamesData
-from db.wrapper import get_stored_feed_type_to_names
+from bot.command.subs.view import SubscriptionsView, create_view, resolve_view
+from db.wrapper import get_stored_feed_types
 
 
-async def initial_list_feed_types(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    """Initial list of types directly after "subscriptions" command is run"""
+async def initial_list_feed_types(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Initial list of types, or names matching the search query, after "subscriptions" command"""
     chat_id = update.effective_chat.id
-    logger.info(f"[{chat_id}] Initial request of feed type")
-    if chat_data := get_stored_feed_type_to_names(chat_id):
-        await _send_types_list(update.message.reply_text, chat_data)
-    else:
+    search_query = " ".join(context.args) if context.args else None
+    logger.info(f"[{chat_id}] Initial request of feed type, search query [{search_query}]")
+    if not (types := await get_stored_feed_types(chat_id)):
         await update.message.reply_text("No subscriptions")
+    elif search_query:
+        view = create_view(context, types, search_query)
+        await send_names_page(update.message.reply_text, context, chat_id, view)
+    else:
+        await _send_types_list(update.message.reply_text, create_view(context, types))
 
 
 async def followup_list_feed_types(
-    update: Update, _: ContextTypes.DEFAULT_TYPE
-) -> ConversationState:
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> ConversationState | int:
     """List of types after going back from list of names"""
     query = update.callback_query
     await query.answer()
     logger.info(f"[{update.effective_chat.id}] Followup request of feed type")
-    await _send_types_list(query.edit_message_text, query.data.chat_data)
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
+    await _send_types_list(query.edit_message_text, view)
     return ConversationState.LIST_TYPES
 
 
-async def _send_types_list(response_callback: Callable, chat_data: dict[str, list[str]]) -> None:
+async def _send_types_list(response_callback: Callable, view: SubscriptionsView) -> None:
     keyboard = [
-        [InlineKeyboardButton(feed_type, callback_data=NamesData(feed_type, chat_data))]
-        for feed_type in sorted(chat_data.keys())
+        [InlineKeyboardButton(feed_type, callback_data=NamesData(view.id, type_id))]
+        for type_id, feed_type in enumerate(view.types)
     ]
     await response_callback(
         "Select source:",
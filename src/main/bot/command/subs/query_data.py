@@ -1,26 +1,41 @@
 """
 NamedTuples storing data passed via inline keyboard buttons in the "subscriptions" command.
+Types and feeds are passed as indexes in the view of chat subscriptions, not as whole values.
 """
 
 from typing import NamedTuple
 
 
 class TypesData(NamedTuple):
-    chat_data: dict[str, list[str]]
+    view_id: int
 
 
 class NamesData(NamedTuple):
-    type: str
-    chat_data: dict[str, list[str]]
+    view_id: int
+    type_id: int
+
+
+class PageData(NamedTuple):
+    view_id: int
+    # Next (1) or previous (-1) page, or the current one again (0).
+    direction: int
+
+
+class LettersData(NamedTuple):
+    view_id: int
+
+
+class LetterData(NamedTuple):
+    view_id: int
+    # Letter which names should start with, or None for all names.
+    letter: str | None
 
 
 class DetailsData(NamedTuple):
-    type: str
-    name: str
-    chat_data: dict[str, list[str]]
+    view_id: int
+    feed_id: int
 
 
 class RemoveFeedData(NamedTuple):
-    type: str
-    name: str
-    chat_data: dict[str, list[str]]
+    view_id: int
+    feed_id: int
@@ -7,23 +7,28 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes, ConversationHandler
 
 from bot.command.subs.conversation_state import ConversationState
-from bot.command.subs.query_data import DetailsData, NamesData, TypesData
+from bot.command.subs.query_data import DetailsData, PageData, TypesData
+from bot.command.subs.view import resolve_view
 from db.wrapper import remove_stored_feed
 
 
-async def request_confirmation(update: Update, _: ContextTypes.DEFAULT_TYPE) -> ConversationState:
+async def request_confirmation(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> ConversationState | int:
     """Request confirmation for removal of selected subscription"""
     query = update.callback_query
     await query.answer()
-    type, name, chat_data = query.data
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
+    type, name = view.feeds[query.data.feed_id]
     logger.info(f"[{update.effective_chat.id}] Selected [{type}] [{name}] for removal")
     keyboard = [
         [
             InlineKeyboardButton("Yes", callback_data=query.data),
-            InlineKeyboardButton("No", callback_data=DetailsData(type, name, chat_data)),
+            InlineKeyboardButton("No", callback_data=DetailsData(view.id, query.data.feed_id)),
         ],
-        [InlineKeyboardButton("« Back to subscriptions", callback_data=NamesData(type, chat_data))],
-        [InlineKeyboardButton("« Back to types", callback_data=TypesData(chat_data))],
+        [InlineKeyboardButton("« Back to subscriptions", callback_data=PageData(view.id, 0))],
+        [InlineKeyboardButton("« Back to types", callback_data=TypesData(view.id))],
     ]
     await query.edit_message_text(
         f"Do you want to unsubscribe from <b>{name}</b>?",
@@ -32,13 +37,15 @@ async def request_confirmation(update: Update, _: ContextTypes.DEFAULT_TYPE) ->
     return ConversationState.CONFIRM_REMOVAL
 
 
-async def remove_subscription(update: Update, _: ContextTypes.DEFAULT_TYPE) -> int:
+async def remove_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Remove selected subscription"""
     query = update.callback_query
     await query.answer()
+    if not (view := await resolve_view(query, context)):
+        return ConversationHandler.END
     chat_id = update.effective_chat.id
-    feed_type, feed_name, _ = query.data
+    feed_type, feed_name = view.feeds[query.data.feed_id]
     logger.info(f"[{chat_id}] Confirmed [{feed_name}] [{feed_type}] for removal")
-    remove_stored_feed(chat_id, feed_type, feed_name)
+    await remove_stored_feed(chat_id, feed_type, feed_name)
     await query.edit_message_text(f"Removed subscription for <b>{feed_name}</b>!")
     return ConversationHandler.END
@@ -0,0 +1,61 @@
+"""
+Module storing per-chat view of subscriptions listed by the "subscriptions" command.
+
+Inline keyboard buttons carry only short IDs: ID of the view and indexes of type or feed in it.
+The view itself is stored once per chat in "chat_data", instead of once per button,
+so size of callback data doesn't grow with number of subscriptions.
+View keeps only the currently listed page of feeds, other pages are loaded from the DB on demand.
+Each "subscriptions" command creates a new view, buttons of older views are treated as outdated.
+"""
+
+from typing import NamedTuple
+
+from loguru import logger
+from telegram import CallbackQuery
+from telegram.ext import ContextTypes
+
+_VIEW_KEY = "subscriptions_view"
+
+
+class SubscriptionsView(NamedTuple):
+    id: int
+    types: list[str]
+    # Listed feeds are limited either to a single type, or to names starting with a search query.
+    type_id: int | None = None
+    query: str | None = None
+    # Listed feeds of a single type can be limited to names starting with a given letter.
+    letter: str | None = None
+    # Feed types and names on the current page.
+    feeds: tuple[tuple[str, str], ...] = ()
+    has_previous: bool = False
+    has_next: bool = False
+
+
+def create_view(
+    context: ContextTypes.DEFAULT_TYPE, types: list[str], query: str | None = None
+) -> SubscriptionsView:
+    """Create a new view of subscriptions of given types, replacing the previous one."""
+    previous_view = context.chat_data.get(_VIEW_KEY)
+    view = SubscriptionsView(previous_view.id + 1 if previous_view else 0, types, query=query)
+    context.chat_data[_VIEW_KEY] = view
+    return view
+
+
+def store_view(context: ContextTypes.DEFAULT_TYPE, view: SubscriptionsView) -> None:
+    """Store changed view, e.g. after listing another page."""
+    context.chat_data[_VIEW_KEY] = view
+
+
+async def resolve_view(
+    query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE
+) -> SubscriptionsView | None:
+    """
+    Get view referenced by the query data.
+    If the view is outdated, user is informed about it and None is returned.
+    """
+    view = context.chat_data.get(_VIEW_KEY)
+    if view and view.id == getattr(query.data, "view_id", None):
+        return view
+    logger.info(f"[{query.message.chat.id}] Requested outdated subscriptions view")
+    await query.edit_message_text("Subscriptions changed, use /subscriptions again")
+    return None
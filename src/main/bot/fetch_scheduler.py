@@ -0,0 +1,115 @@
+"""
+Module scheduling fetches of RSS feeds during a single check for all updates.
+
+Fetches are started as fast as global and per-host token buckets allow,
+with a limited number of fetches running at once.
+This way time needed to check all feeds depends on their number divided by allowed concurrency,
+rather than on a fixed delay between every feed.
+
+Fetches of each host wait in a separate queue, started by a separate task,
+so a host with many feeds is limited only by its own rate and doesn't delay feeds of other hosts.
+Number of all queued fetches is limited, scheduling more of them waits until some are started,
+so fetches of all feeds aren't kept in memory at once.
+Buckets of hosts which weren't fetched recently are removed once all fetches are finished.
+"""
+
+from asyncio import Event, Semaphore, Task, create_task, current_task
+from collections import defaultdict, deque
+from typing import Awaitable, Callable
+
+from httpx import URL, InvalidURL
+from loguru import logger
+
+from web.token_bucket import TokenBucket
+
+
+class FetchScheduler:
+    """Limits rate of started fetches, globally and per host, and number of running fetches."""
+
+    def __init__(self, concurrency: int, rate: float, host_rate: float, max_queued: int):
+        self._semaphore = Semaphore(concurrency)
+        self._queue_slots = Semaphore(max_queued)
+        self._bucket = TokenBucket(rate, max(rate, 1))
+        self._host_buckets = defaultdict(lambda: TokenBucket(host_rate, max(host_rate, 1)))
+        self._host_queues: dict[str, deque[Callable[[], Awaitable[None]]]] = {}
+        self._host_tasks: dict[str, Task] = {}
+        # Fetches which are either queued or running.
+        self._pending = 0
+        self._idle = Event()
+        self._idle.set()
+
+    async def schedule(self, feed_link: str, start_fetch: Callable[[], Awaitable[None]]) -> None:
+        """
+        Queue a fetch of a given feed link, started once both global and host limits allow it.
+        Waits while the maximum number of fetches is already queued.
+        Started fetch has to be marked as finished via "release".
+        """
+        await self._queue_slots.acquire()
+        host = _get_host(feed_link)
+        self._pending += 1
+        self._idle.clear()
+        self._host_queues.setdefault(host, deque()).append(start_fetch)
+        if host not in self._host_tasks:
+            self._host_tasks[host] = create_task(self._start_host_fetches(host))
+
+    def release(self) -> None:
+        """Mark a single fetch as finished."""
+        self._semaphore.release()
+        self._pending -= 1
+        if not self._pending:
+            self._set_idle()
+
+    async def wait_until_idle(self) -> None:
+        """Wait until all queued fetches are started and finished."""
+        if self._pending:
+            logger.info(f"Waiting for [{self._pending}] queued and running fetches")
+        await self._idle.wait()
+
+    def cancel(self) -> None:
+        """Drop all queued fetches, already running ones are still marked via "release"."""
+        for task in self._host_tasks.values():
+            task.cancel()
+        dropped = sum(len(queue) for queue in self._host_queues.values())
+        self._pending -= dropped
+        for _ in range(dropped):
+            self._queue_slots.release()
+        self._host_tasks.clear()
+        self._host_queues.clear()
+        if not self._pending:
+            self._set_idle()
+
+    def _set_idle(self) -> None:
+        # Buckets which are full again don't limit their hosts anymore, the same as new ones.
+        idle_hosts = [host for host, bucket in self._host_buckets.items() if bucket.is_full()]
+        for host in idle_hosts:
+            del self._host_buckets[host]
+        self._idle.set()
+
+    async def _start_host_fetches(self, host: str) -> None:
+        queue = self._host_queues[host]
+        try:
+            while queue:
+                # Host bucket goes first, so waiting for a busy host doesn't waste global tokens.
+                await self._host_buckets[host].acquire()
+                await self._bucket.acquire()
+                await self._semaphore.acquire()
+                start_fetch = queue.popleft()
+                self._queue_slots.release()
+                try:
+                    await start_fetch()
+                except Exception as error:
+                    logger.error(f"Couldn't start fetch from [{host}]:", exc_info=error)
+                    self.release()
+        finally:
+            # Queues of cancelled tasks are already dropped, possibly replaced by new ones.
+            if self._host_tasks.get(host) is current_task():
+                del self._host_tasks[host]
+                del self._host_queues[host]
+
+
+def _get_host(feed_link: str) -> str:
+    try:
+        return URL(feed_link).host
+    except InvalidURL:
+        # Fetch of such link fails right away, it doesn't have to be limited per host.
+        return ""
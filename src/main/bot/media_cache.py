@@ -0,0 +1,201 @@
+"""
+Module handling cache of downloaded media, shared between all chats and retries.
+
+Media content is stored on disk, in files named by hash of their content,
+so the same media available under different links is stored only once.
+Media can be downloaded straight into a file in the cache directory and then moved into the cache,
+so it never has to be kept in memory as a whole.
+Cached media are returned as paths to their files, rather than their content.
+Index mapping links to content is kept only in memory.
+
+Cache also remembers Telegram "file_id" of already uploaded media,
+this way media can be sent again by reference, without downloading or uploading it again.
+
+Cache size is limited, least recently used media are removed first.
+Media older than configured TTL are removed as well.
+Media of prepared updates are pinned until they are sent,
+files of pinned media removed from the cache are deleted only once they are unpinned.
+Media can be pinned right when they are got or stored, so they can't be removed in between.
+
+Hashing and writing media files is done in a separate thread, so it doesn't block the event loop.
+Index is updated without awaiting in between, so concurrent calls always see it consistent.
+"""
+
+from asyncio import to_thread
+from collections import Counter, OrderedDict, defaultdict
+from hashlib import file_digest, sha256
+from pathlib import Path
+from re import fullmatch
+from tempfile import NamedTemporaryFile
+from time import monotonic
+from typing import IO, NamedTuple
+
+from loguru import logger
+
+_DOWNLOAD_PREFIX = ".download-"
+_DIGEST_PATTERN = r"[0-9a-f]{64}"
+
+
+class CachedMedia(NamedTuple):
+    content: bytes | None
+    media_type: str
+    file_id: str | None
+    path: Path | None = None
+
+
+class _ContentEntry(NamedTuple):
+    size: int
+    media_type: str
+    created_at: float
+    file_id: str | None = None
+
+
+class MediaCache:
+    """On-disk media cache with in-memory index, size-based LRU eviction and TTL."""
+
+    def __init__(self, directory: str, max_size: int, ttl: int):
+        self._directory = Path(directory)
+        self._max_size = max_size
+        self._ttl = ttl
+        self._size = 0
+        self._links: dict[str, str] = {}
+        self._digest_links: defaultdict[str, set[str]] = defaultdict(set)
+        self._contents: OrderedDict[str, _ContentEntry] = OrderedDict()
+        self._pins: Counter[str] = Counter()
+        # Files of pinned media already removed from the cache, deleted once they are unpinned.
+        self._removed_pinned: set[str] = set()
+
+    def initialize(self) -> None:
+        """
+        Create cache directory, removing any media left from previous runs.
+        Only files created by the cache are removed, anything else in the directory is kept.
+        """
+        logger.info(f"Initializing media cache in [{self._directory}]")
+        self._directory.mkdir(parents=True, exist_ok=True)
+        for stale_file in self._directory.iterdir():
+            if stale_file.is_file() and _is_cache_file(stale_file.name):
+                stale_file.unlink(missing_ok=True)
+
+    def get(self, link: str, pin: bool = False) -> CachedMedia | None:
+        """
+        Get cached media for a given link, with path to its file, optionally pinning it.
+        File is not needed when media was already uploaded to Telegram.
+        """
+        if (digest := self._links.get(link)) is None:
+            return None
+        if self._is_expired(self._contents[digest]):
+            self._remove(digest)
+            return None
+        self._contents.move_to_end(digest)
+        entry = self._contents[digest]
+        if entry.file_id:
+            return CachedMedia(None, entry.media_type, entry.file_id)
+        if not (path := self._path(digest)).exists():
+            self._remove(digest)
+            return None
+        media = CachedMedia(None, entry.media_type, None, path)
+        if pin:
+            self.pin(media)
+        return media
+
+    async def put(
+        self, link: str, content: bytes, media_type: str, pin: bool = False
+    ) -> CachedMedia | None:
+        """Store media downloaded from a given link."""
+        with self.create_file() as file:
+            await to_thread(file.write, content)
+        return await self.put_file(link, Path(file.name), media_type, pin)
+
+    def create_file(self) -> IO[bytes]:
+        """
+        Create a new file in the cache directory, where media can be downloaded.
+        File has to be added to the cache via "put_file" or removed afterward.
+        """
+        return NamedTemporaryFile(dir=self._directory, prefix=_DOWNLOAD_PREFIX, delete=False)
+
+    async def put_file(
+        self, link: str, file_path: Path, media_type: str, pin: bool = False
+    ) -> CachedMedia | None:
+        """
+        Move media downloaded from a given link into the cache, optionally pinning it.
+        Return cached media, or None if it's larger than the whole cache.
+        """
+        digest, size = await to_thread(_digest_file, file_path)
+        self._remove_expired()
+        if (previous_digest := self._links.get(link)) and previous_digest != digest:
+            self._digest_links[previous_digest].discard(link)
+        self._links[link] = digest
+        self._digest_links[digest].add(link)
+        if digest in self._contents:
+            file_path.unlink(missing_ok=True)
+            return self.get(link, pin)
+        if size > self._max_size:
+            logger.info(f"Media from [{link}] is larger than the whole cache, not storing it")
+            file_path.unlink(missing_ok=True)
+            self._remove(digest)
+            return None
+        self._removed_pinned.discard(digest)
+        file_path.replace(self._path(digest))
+        self._contents[digest] = _ContentEntry(size, media_type, monotonic())
+        self._size += size
+        media = CachedMedia(None, media_type, None, self._path(digest))
+        if pin:
+            self.pin(media)
+        self._remove_least_recently_used()
+        return media
+
+    def set_file_id(self, link: str, file_id: str) -> None:
+        """Store Telegram "file_id" for media already uploaded from a given link."""
+        if (digest := self._links.get(link)) and (entry := self._contents.get(digest)):
+            self._contents[digest] = entry._replace(file_id=file_id)
+
+    def pin(self, media: CachedMedia) -> None:
+        """Keep file of a given media on disk, even if it's removed from the cache meanwhile."""
+        if media.path is not None:
+            self._pins[media.path.name] += 1
+
+    def unpin(self, media: CachedMedia) -> None:
+        """Release file of a given media, deleting it if it was already removed from the cache."""
+        if media.path is None or (digest := media.path.name) not in self._pins:
+            return
+        self._pins[digest] -= 1
+        if self._pins[digest] > 0:
+            return
+        del self._pins[digest]
+        if digest in self._removed_pinned:
+            self._removed_pinned.discard(digest)
+            self._path(digest).unlink(missing_ok=True)
+
+    def _remove_expired(self) -> None:
+        expired = [digest for digest, entry in self._contents.items() if self._is_expired(entry)]
+        for digest in expired:
+            self._remove(digest)
+
+    def _is_expired(self, entry: _ContentEntry) -> bool:
+        return entry.created_at + self._ttl < monotonic()
+
+    def _remove_least_recently_used(self) -> None:
+        while self._size > self._max_size and self._contents:
+            self._remove(next(iter(self._contents)))
+
+    def _remove(self, digest: str) -> None:
+        for link in self._digest_links.pop(digest, set()):
+            self._links.pop(link, None)
+        if (entry := self._contents.pop(digest, None)) is not None:
+            self._size -= entry.size
+            if digest in self._pins:
+                self._removed_pinned.add(digest)
+            else:
+                self._path(digest).unlink(missing_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self._directory / digest
+
+
+def _digest_file(file_path: Path) -> tuple[str, int]:
+    with open(file_path, "rb") as file:
+        return file_digest(file, sha256).hexdigest(), file_path.stat().st_size
+
+
+def _is_cache_file(name: str) -> bool:
+    return name.startswith(_DOWNLOAD_PREFIX) or fullmatch(_DIGEST_PATTERN, name) is not None
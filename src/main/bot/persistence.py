@@ -0,0 +1,180 @@
+"""
+Module with bot persistence stored in the DB, keeping command states between bot restarts.
+
+Each chat data, user data, conversation state and inline keyboard is stored as a separate document,
+so only keys changed since the last update are written, instead of the whole persistence at once.
+Values are pickled, since they contain objects like named tuples and enums.
+
+Inline keyboards unused for longer than configured TTL are removed, both from the DB
+and from the bot's callback data cache, their buttons stop working afterward.
+
+Bot data isn't used by the bot, so it's not stored.
+"""
+
+import json
+import pickle
+from time import time
+from typing import Any
+
+from loguru import logger
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db.client import initialize_db
+from db.wrapper import (
+    get_all_persisted_data,
+    remove_persisted_data,
+    store_persisted_data,
+    update_persisted_access_times,
+)
+
+_USER_DATA = "user_data"
+_CHAT_DATA = "chat_data"
+_CONVERSATION = "conversation:{name}"
+_KEYBOARD = "keyboard"
+_CALLBACK_QUERY = "callback_query"
+
+# Keyboards, as their IDs, access times and button data, and keyboard IDs of callback queries.
+_CallbackData = tuple[list[tuple[str, float, dict[str, Any]]], dict[str, str]]
+_ConversationKey = tuple[int | str, ...]
+
+
+class DBPersistence(BasePersistence):
+    """Persistence writing only changed keys to the DB, with expiring callback data."""
+
+    def __init__(self, callback_data_ttl: float, update_interval: float = 60):
+        super().__init__(PersistenceInput(bot_data=False), update_interval)
+        self._callback_data_ttl = callback_data_ttl
+        # Already stored keyboards and callback queries, used to write only changed ones.
+        self._keyboard_access_times: dict[str, float] = {}
+        self._callback_queries: dict[str, str] = {}
+
+    async def get_user_data(self) -> dict[int, dict]:
+        # Persistence is loaded before the bot's "post_init", so DB has to be initialized here.
+        await initialize_db()
+        return await self._get_all_unpickled(_USER_DATA)
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return await self._get_all_unpickled(_CHAT_DATA)
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> _CallbackData | None:
+        time_cutoff = time() - self._callback_data_ttl
+        keyboards, expired_keyboards = [], []
+        async for keyboard_id, buttons, access_time in get_all_persisted_data(_KEYBOARD):
+            if access_time < time_cutoff or (button_data := _unpickle(buttons)) is None:
+                expired_keyboards.append(keyboard_id)
+                continue
+            keyboards.append((keyboard_id, access_time, button_data))
+            self._keyboard_access_times[keyboard_id] = access_time
+        async for query_id, keyboard_id, _ in get_all_persisted_data(_CALLBACK_QUERY):
+            if keyboard_id in self._keyboard_access_times:
+                self._callback_queries[query_id] = keyboard_id
+        logger.info(f"Loaded [{len(keyboards)}] keyboards, [{len(expired_keyboards)}] expired")
+        await remove_persisted_data(_KEYBOARD, expired_keyboards)
+        return keyboards, dict(self._callback_queries)
+
+    async def get_conversations(self, name: str) -> dict[_ConversationKey, object]:
+        conversations = await self._get_all_unpickled(_CONVERSATION.format(name=name))
+        return {tuple(json.loads(key)): state for key, state in conversations.items()}
+
+    async def update_conversation(
+        self, name: str, key: _ConversationKey, new_state: object | None
+    ) -> None:
+        kind, key = _CONVERSATION.format(name=name), json.dumps(key)
+        if new_state is None:
+            await remove_persisted_data(kind, [key])
+        else:
+            await store_persisted_data(kind, [(key, pickle.dumps(new_state), None)])
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await store_persisted_data(_USER_DATA, [(user_id, pickle.dumps(data), None)])
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await store_persisted_data(_CHAT_DATA, [(chat_id, pickle.dumps(data), None)])
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: _CallbackData) -> None:
+        keyboards, callback_queries = data
+        time_cutoff = time() - self._callback_data_ttl
+        access_times = {
+            keyboard_id: access_time
+            for keyboard_id, access_time, _ in keyboards
+            if access_time >= time_cutoff
+        }
+        # Buttons of a keyboard never change, so stored keyboards only need new access times.
+        new_keyboards = [
+            (keyboard_id, pickle.dumps(button_data), access_time)
+            for keyboard_id, access_time, button_data in keyboards
+            if keyboard_id in access_times and keyboard_id not in self._keyboard_access_times
+        ]
+        accessed_keyboards = [
+            (keyboard_id, access_time)
+            for keyboard_id, access_time in access_times.items()
+            if self._keyboard_access_times.get(keyboard_id, access_time) != access_time
+        ]
+        removed_keyboards = [
+            keyboard_id
+            for keyboard_id in self._keyboard_access_times
+            if keyboard_id not in access_times
+        ]
+        await store_persisted_data(_KEYBOARD, new_keyboards)
+        await update_persisted_access_times(_KEYBOARD, accessed_keyboards)
+        await remove_persisted_data(_KEYBOARD, removed_keyboards)
+        self._keyboard_access_times = access_times
+        await self._update_callback_queries(callback_queries)
+        if len(access_times) < len(keyboards):
+            logger.info(f"Removing [{len(keyboards) - len(access_times)}] expired keyboards")
+            self.bot.callback_data_cache.clear_callback_data(time_cutoff=time_cutoff)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await remove_persisted_data(_CHAT_DATA, [chat_id])
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await remove_persisted_data(_USER_DATA, [user_id])
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # All changes are already written when they're updated.
+        pass
+
+    async def _update_callback_queries(self, callback_queries: dict[str, str]) -> None:
+        new_queries = [
+            (query_id, keyboard_id, None)
+            for query_id, keyboard_id in callback_queries.items()
+            if self._callback_queries.get(query_id) != keyboard_id
+        ]
+        removed_queries = [
+            query_id for query_id in self._callback_queries if query_id not in callback_queries
+        ]
+        await store_persisted_data(_CALLBACK_QUERY, new_queries)
+        await remove_persisted_data(_CALLBACK_QUERY, removed_queries)
+        self._callback_queries = dict(callback_queries)
+
+    async def _get_all_unpickled(self, kind: str) -> dict[Any, Any]:
+        data = {}
+        async for key, value, _ in get_all_persisted_data(kind):
+            if (unpickled_value := _unpickle(value)) is not None:
+                data[key] = unpickled_value
+        logger.info(f"Loaded [{len(data)}] persisted [{kind}]")
+        return data
+
+
+def _unpickle(value: bytes) -> Any:
+    # Data stored by an older version of the bot may reference classes which don't exist anymore.
+    try:
+        return pickle.loads(value)
+    except (pickle.UnpicklingError, AttributeError, ImportError, EOFError, TypeError) as error:
+        logger.warning(f"Skipping persisted data which can't be loaded: {error}")
+        return None
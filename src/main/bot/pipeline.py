@@ -0,0 +1,69 @@
+"""
+Module with a single stage of handling updates, connected to other stages by a bounded queue.
+
+Each stage has its own workers, taking items from its queue and handling them.
+When the queue is full adding new items waits, so slower stages apply backpressure
+to the previous ones, instead of accumulating unbounded amount of work in memory.
+Errors when handling an item are logged and don't stop the worker.
+"""
+
+from asyncio import CancelledError, Queue, Task, create_task, gather
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class Stage(Generic[T]):
+    """Bounded queue of items, handled by a given number of asynchronous workers."""
+
+    def __init__(
+        self, name: str, handler: Callable[[T], Awaitable[None]], workers: int, queue_size: int
+    ):
+        self.name = name
+        self._handler = handler
+        self._workers_count = workers
+        self._queue: Queue[T] = Queue(queue_size)
+        self._workers: list[Task] = []
+        self._busy = 0
+        self._processed = 0
+
+    async def put(self, item: T) -> None:
+        """Add item to the queue, waiting if it's full."""
+        await self._queue.put(item)
+
+    def start(self) -> None:
+        """Start all workers, has to be called from a running event loop."""
+        logger.info(f"Starting [{self._workers_count}] workers of [{self.name}] stage")
+        self._workers = [create_task(self._work()) for _ in range(self._workers_count)]
+
+    async def stop(self) -> None:
+        """Stop all workers, items left in the queue are dropped."""
+        logger.info(f"Stopping [{self.name}] stage with [{self._queue.qsize()}] queued items")
+        for worker in self._workers:
+            worker.cancel()
+        await gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def metrics(self) -> str:
+        """Describe queue depth, busy workers and number of processed items."""
+        return (
+            f"[{self.name}] queue [{self._queue.qsize()}/{self._queue.maxsize}]"
+            f" busy [{self._busy}/{self._workers_count}] processed [{self._processed}]"
+        )
+
+    async def _work(self) -> None:
+        while True:
+            item = await self._queue.get()
+            self._busy += 1
+            try:
+                await self._handler(item)
+            except CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Unexpected error in [{self.name}] stage")
+            finally:
+                self._busy -= 1
+                self._processed += 1
+                self._queue.task_done()
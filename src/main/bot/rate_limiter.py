@@ -0,0 +1,108 @@
+"""
+Module limiting the rate of requests send by the bot, to avoid hitting Telegram flood limits.
+
+Requests are limited in total and for each chat separately, group chats have a lower limit.
+When Telegram responds with "RetryAfter" all requests are paused and the failed one is retried.
+
+Each request can have a priority passed via "rate_limit_args".
+Requests waiting for the same limit take turns ordered by priority, so bulk requests,
+like sending updates, go after interactive ones, like replies to commands,
+and users don't wait for the bot during large updates.
+
+Limits of chats which didn't send anything recently are removed,
+once the number of limited chats doubles since they were last removed.
+"""
+
+from asyncio import sleep
+from datetime import timedelta
+from enum import IntEnum
+from time import monotonic
+from typing import Any, Callable, Coroutine
+
+from loguru import logger
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from web.token_bucket import TokenBucket
+
+# Number of limited chats below which limits of idle chats aren't removed.
+_MIN_CHATS_TO_REMOVE_IDLE = 100
+
+
+class SendPriority(IntEnum):
+    INTERACTIVE = 0
+    BULK = 1
+
+
+class SendRateLimiter(BaseRateLimiter[SendPriority]):
+    """Rate limiter with overall and per chat limits, priorities and handling of "RetryAfter"."""
+
+    def __init__(self, overall_rate: float, chat_rate: float, group_rate: float, max_retries: int):
+        self._overall_bucket = TokenBucket(overall_rate, max(overall_rate, 1))
+        self._chat_rate = chat_rate
+        self._group_rate = group_rate
+        self._chat_buckets: dict[int | str, TokenBucket] = {}
+        self._group_buckets: dict[int | str, TokenBucket] = {}
+        self._chats_to_remove_idle = _MIN_CHATS_TO_REMOVE_IDLE
+        self._max_retries = max_retries
+        self._paused_until = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict[str, Any] | None]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: SendPriority | None,
+    ) -> bool | dict[str, Any] | None:
+        priority = SendPriority.INTERACTIVE if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+        for attempt in range(self._max_retries + 1):
+            await self._wait(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as error:
+                if attempt == self._max_retries:
+                    raise
+                retry_after = _get_seconds(error.retry_after)
+                logger.warning(f"[{chat_id}] Flood limit in [{endpoint}], pausing [{retry_after}]")
+                self._paused_until = max(self._paused_until, monotonic() + retry_after)
+
+    async def _wait(self, chat_id: int | str | None, priority: SendPriority) -> None:
+        if (pause := self._paused_until - monotonic()) > 0:
+            await sleep(pause)
+        if chat_id is not None:
+            await self._get_chat_bucket(chat_id).acquire(priority)
+        await self._overall_bucket.acquire(priority)
+
+    def _get_chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        # Group and channel IDs are negative, channels can also be referenced by their username.
+        if str(chat_id).startswith(("-", "@")):
+            buckets, rate = self._group_buckets, self._group_rate
+        else:
+            buckets, rate = self._chat_buckets, self._chat_rate
+        if (bucket := buckets.get(chat_id)) is None:
+            self._remove_idle_buckets()
+            bucket = buckets[chat_id] = TokenBucket(rate, max(rate, 1))
+        return bucket
+
+    def _remove_idle_buckets(self) -> None:
+        if len(self._chat_buckets) + len(self._group_buckets) < self._chats_to_remove_idle:
+            return
+        # Buckets which are full again don't limit their chats anymore, the same as new ones.
+        for buckets in (self._chat_buckets, self._group_buckets):
+            for chat_id in [chat_id for chat_id, bucket in buckets.items() if bucket.is_full()]:
+                del buckets[chat_id]
+        chats = len(self._chat_buckets) + len(self._group_buckets)
+        self._chats_to_remove_idle = max(2 * chats, _MIN_CHATS_TO_REMOVE_IDLE)
+
+
+def _get_seconds(retry_after: int | timedelta) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else retry_after
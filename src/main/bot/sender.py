@@ -9,35 +9,110 @@ This module will recognize and handle situations where:
  - there's only one media item (photo or video)
  - there are more than 10 media items, they will be split into multiple messages
 Only one media item will have a caption, so it's correctly displayed in chat.
+
+All messages are send with bulk priority, so replies to commands aren't delayed by updates.
+
+Updates can be prepared, with all their media downloaded, separately from being sent,
+so slow downloads and slow uploads can be handled by different workers.
+
+Media are downloaded in chunks straight into the media cache directory and uploaded
+from their files, so large videos are never kept in memory as a whole.
+Reduced images are written into their own files as well, removed once the update is released.
+
+Video dimensions are read from container headers,
+OpenCV is used only as a fallback, when it's installed, for unsupported containers.
+Resizing images and reading video dimensions is done when preparing an update,
+in a separate pool of processes or threads, so it doesn't block the event loop.
+Media of a prepared update are pinned in the cache, so their files aren't removed before sending,
+they have to be released via "release_update" once the update is sent or dropped.
+Media are pinned right when they are got from the cache or stored into it,
+media downloaded once for multiple updates are pinned once for each of them.
 """
 
+from asyncio import CancelledError, Task, create_task, gather, get_running_loop, shield
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from hashlib import sha256
 from http import HTTPStatus
+from importlib.util import find_spec
 from io import BytesIO
-from tempfile import NamedTemporaryFile
+from math import sqrt
+from multiprocessing import get_context
+from pathlib import Path
+from typing import IO, NamedTuple
 
-from cv2 import CAP_PROP_FRAME_HEIGHT, CAP_PROP_FRAME_WIDTH, VideoCapture
-from httpx import get
+from httpx import Response
 from loguru import logger
 from more_itertools import sliced
 from PIL import Image, UnidentifiedImageError
-from telegram import Bot, InputMediaPhoto, InputMediaVideo
-
+from telegram import InputFile, InputMediaPhoto, InputMediaVideo, Message
+from telegram.error import BadRequest
+from telegram.ext import ExtBot
+
+from bot.media_cache import CachedMedia, MediaCache
+from bot.rate_limiter import SendPriority
+from bot.video_probe import probe_video_dimensions
+from db.wrapper import get_stored_file_id, store_file_id
 from settings import (
     DEFAULT_IMAGE_PATH,
     MAX_MEDIA_ITEMS_PER_MESSAGE,
     MAX_MESSAGE_SIZE,
+    MEDIA_CACHE_MAX_SIZE,
+    MEDIA_CACHE_PATH,
+    MEDIA_CACHE_TTL,
+    MEDIA_EXECUTOR,
+    MEDIA_EXECUTOR_WORKERS,
+    MEDIA_MAX_CONNECTIONS,
+    MEDIA_MAX_CONNECTIONS_PER_HOST,
+    MEDIA_MAX_SIZE,
+    MEDIA_TIMEOUT,
     PIN_VIDEOS,
     RSS_FEEDS,
 )
+from web.client import LimitedClient
 
 DEFAULT_SENDER_TEXT_FORMAT = "By <b>{name}</b> on {type}"
 MAX_IMAGE_SIZE = 10_000_000
 MAX_IMAGE_DIMENSIONS = 10_000
-MAX_IMAGE_THUMBNAIL = (MAX_IMAGE_DIMENSIONS // 2, MAX_IMAGE_DIMENSIONS // 2)
+# Reduced image is encoded a bit smaller than required, so it usually fits after a single encode.
+_IMAGE_SIZE_MARGIN = 0.9
+_IMAGE_REDUCING_GAP = 2.0
+
+_OPENCV_AVAILABLE = find_spec("cv2") is not None
+
+
+def _create_media_executor() -> Executor:
+    if MEDIA_EXECUTOR == "process":
+        # Processes are spawned, rather than forked, since the bot is already running threads.
+        return ProcessPoolExecutor(MEDIA_EXECUTOR_WORKERS, mp_context=get_context("spawn"))
+    return ThreadPoolExecutor(MEDIA_EXECUTOR_WORKERS, thread_name_prefix="media")
+
+
+_media_executor = _create_media_executor()
+_client = LimitedClient(MEDIA_MAX_CONNECTIONS, MEDIA_MAX_CONNECTIONS_PER_HOST, MEDIA_TIMEOUT)
+_media_cache = MediaCache(MEDIA_CACHE_PATH, MEDIA_CACHE_MAX_SIZE, MEDIA_CACHE_TTL)
+_pending_downloads: dict[str, Task] = {}
+_download_waiters: Counter[str] = Counter()
+_default_image: CachedMedia | None = None
+_default_image_digest: str | None = None
+
+
+class PreparedMedia(NamedTuple):
+    link: str
+    media: CachedMedia
+    width: int | None = None
+    height: int | None = None
+    # File of an image reduced to the size accepted by Telegram, uploaded instead of the original.
+    trimmed_path: Path | None = None
+
 
+class PreparedUpdate(NamedTuple):
+    message: str
+    media: list[PreparedMedia]
 
-async def send_update(
-    bot: Bot,
+
+async def prepare_update(
     chat_id: int,
     feed_type: str,
     feed_name: str,
@@ -45,14 +120,56 @@ async def send_update(
     title: str,
     description: str,
     media_links: list[str] = None,
-) -> None:
+) -> PreparedUpdate:
+    """Format message and download all media of a single update, without sending it."""
+    logger.info(f"[{chat_id}] Preparing update [{feed_name}] [{feed_type}]")
     message = _format_message(chat_id, feed_type, feed_name, link, title, description)
-    if not media_links:
-        logger.info(f"[{chat_id}] Sending text only update [{feed_name}] [{feed_type}]")
-        await _send_text_message(bot, chat_id, message)
+    media = await _get_all_media(chat_id, media_links) if media_links else []
+    return PreparedUpdate(message, media)
+
+
+def release_update(update: PreparedUpdate) -> None:
+    """Allow removing media files of an already sent or dropped update from the cache."""
+    for prepared in update.media:
+        _release_media(prepared)
+
+
+async def send_prepared_update(bot: ExtBot, chat_id: int, update: PreparedUpdate) -> None:
+    """Send already prepared update, as a text message or as media groups."""
+    if not update.media:
+        logger.info(f"[{chat_id}] Sending text only update")
+        await _send_text_message(bot, chat_id, update.message)
     else:
-        logger.info(f"[{chat_id}] Sending update [{feed_name}] [{feed_type}]")
-        await _send_media_update(bot, chat_id, message, media_links)
+        logger.info(f"[{chat_id}] Sending update with [{len(update.media)}] media")
+        await _send_media_update(bot, chat_id, update.message, update.media)
+
+
+async def load_default_image(bot: ExtBot) -> None:
+    """
+    Load default image once, together with its Telegram file ID, if it was already uploaded.
+    File ID is stored in the DB by bot and image content digest,
+    so changing the image or the bot uploads it again.
+    Image content is kept as well, so it can be uploaded again if its file ID stops working.
+    """
+    global _default_image, _default_image_digest
+    if (image_content := _load_image_content(DEFAULT_IMAGE_PATH)) is None:
+        logger.info(f"No default image loaded from [{DEFAULT_IMAGE_PATH}]")
+        return
+    _default_image_digest = sha256(image_content).hexdigest()
+    file_id = await get_stored_file_id(bot.id, _default_image_digest)
+    logger.info(f"Loaded default image [{DEFAULT_IMAGE_PATH}] file ID [{file_id}]")
+    _default_image = CachedMedia(_trim_image(image_content), "image", file_id)
+
+
+def initialize_media_cache() -> None:
+    """Prepare directory for cache of downloaded media."""
+    _media_cache.initialize()
+
+
+async def close_media_client() -> None:
+    """Close all pooled connections used for downloading media and stop media processing workers."""
+    await _client.close()
+    _media_executor.shutdown(cancel_futures=True)
 
 
 def _format_message(
@@ -86,29 +203,111 @@ def _trim_message(chat_id: int, message: str, appended_size: int) -> str:
     return message
 
 
-async def _send_text_message(bot: Bot, chat_id: int, message: str) -> None:
-    if (default_image := _load_image(DEFAULT_IMAGE_PATH)) is None:
+async def _send_text_message(bot: ExtBot, chat_id: int, message: str) -> None:
+    global _default_image
+    if (default_image := _default_image) is None:
         logger.info(f"[{chat_id}] No default media, sending only text")
-        await bot.send_message(chat_id, message)
+        await bot.send_message(chat_id, message, rate_limit_args=SendPriority.BULK)
         return
     logger.info(f"[{chat_id}] Sending default image [{DEFAULT_IMAGE_PATH}]")
-    media_group = [(default_image.tobytes(), default_image.format)]
-    await _handle_attachment_group(bot, chat_id, media_group, message)
+    # Default image is uploaded only once, afterward it's always send by reference.
+    try:
+        sent_message = await _send_default_image(bot, chat_id, message, default_image)
+    except BadRequest as error:
+        if not default_image.file_id or "file" not in error.message.lower():
+            raise
+        logger.warning(f"[{chat_id}] Default image file ID is not valid, uploading it again")
+        default_image = _default_image = default_image._replace(file_id=None)
+        sent_message = await _send_default_image(bot, chat_id, message, default_image)
+    if not default_image.file_id and (file_id := _get_file_id(sent_message)):
+        await store_file_id(bot.id, _default_image_digest, file_id)
+        _default_image = default_image._replace(file_id=file_id)
+
+
+async def _send_default_image(
+    bot: ExtBot, chat_id: int, message: str, default_image: CachedMedia
+) -> Message:
+    return await bot.send_photo(
+        chat_id,
+        default_image.file_id or default_image.content,
+        caption=message,
+        rate_limit_args=SendPriority.BULK,
+    )
 
 
-def _load_image(image_path: str) -> Image.Image | None:
+def _load_image_content(image_path: str) -> bytes | None:
     try:
-        return Image.open(image_path)
+        with open(image_path, "rb") as image_file:
+            content = image_file.read()
+        Image.open(BytesIO(content)).verify()
+        return content
     except (FileNotFoundError, UnidentifiedImageError):
         return None
 
 
-async def _send_media_update(bot: Bot, chat_id: int, message: str, media_links: list[str]) -> None:
-    media = [data for link in media_links if (data := _get_media_content_and_type(link))]
+async def _get_all_media(chat_id: int, media_links: list[str]) -> list[PreparedMedia]:
+    # All media are downloaded concurrently, limits are handled by the HTTP client itself.
+    downloaded_media = await gather(
+        *[_get_media(link) for link in media_links], return_exceptions=True
+    )
+    media = [
+        (link, data)
+        for link, data in zip(media_links, downloaded_media)
+        if isinstance(data, CachedMedia)
+    ]
+    if errors := [error for error in downloaded_media if isinstance(error, BaseException)]:
+        for _, data in media:
+            _media_cache.unpin(data)
+        raise errors[0]
     if not media:
         logger.info(f"[{chat_id}] No media downloaded from [{media_links}]")
-        await _send_text_message(bot, chat_id, message)
-        return
+    prepared_media = await gather(
+        *[_prepare_media(link, data) for link, data in media], return_exceptions=True
+    )
+    if errors := [error for error in prepared_media if isinstance(error, BaseException)]:
+        # Already prepared media are released as well, so their files aren't left behind.
+        for (_, data), prepared in zip(media, prepared_media):
+            if isinstance(prepared, PreparedMedia):
+                _release_media(prepared)
+            else:
+                _media_cache.unpin(data)
+        raise errors[0]
+    return prepared_media
+
+
+async def _prepare_media(link: str, media: CachedMedia) -> PreparedMedia:
+    # Media already uploaded to Telegram are send by reference, without any additional processing.
+    if media.file_id:
+        return PreparedMedia(link, media)
+    loop = get_running_loop()
+    if _is_video(media.media_type):
+        width, height = await loop.run_in_executor(
+            _media_executor, _get_video_dimensions, media.path
+        )
+        return PreparedMedia(link, media, width, height)
+    # Reduced image is written into a new file, so its content isn't kept in memory.
+    with _media_cache.create_file() as file:
+        trimmed_path = Path(file.name)
+    is_trimmed = False
+    try:
+        is_trimmed = await loop.run_in_executor(
+            _media_executor, _trim_image_file, media.path, trimmed_path
+        )
+    finally:
+        if not is_trimmed:
+            trimmed_path.unlink(missing_ok=True)
+    return PreparedMedia(link, media, trimmed_path=trimmed_path if is_trimmed else None)
+
+
+def _release_media(prepared: PreparedMedia) -> None:
+    _media_cache.unpin(prepared.media)
+    if prepared.trimmed_path is not None:
+        prepared.trimmed_path.unlink(missing_ok=True)
+
+
+async def _send_media_update(
+    bot: ExtBot, chat_id: int, message: str, media: list[PreparedMedia]
+) -> None:
     media_groups = list(sliced(media, MAX_MEDIA_ITEMS_PER_MESSAGE))
     # Only the last group should have a message
     for media_group in media_groups[:-1]:
@@ -116,88 +315,219 @@ async def _send_media_update(bot: Bot, chat_id: int, message: str, media_links:
     await _handle_attachment_group(bot, chat_id, media_groups[-1], message)
 
 
-def _get_media_content_and_type(link: str) -> tuple[bytes, str] | None:
+async def _get_media(link: str) -> CachedMedia | None:
+    # Returned media are already pinned, they have to be unpinned once they aren't needed.
+    if cached_media := _media_cache.get(link, pin=True):
+        logger.info(f"Using cached media for [{link}]")
+        return cached_media
+    # The same media can be requested by multiple chats at once, it's downloaded only once.
+    if (download := _pending_downloads.get(link)) is None:
+        download = _pending_downloads[link] = create_task(_download_media(link))
+    _download_waiters[link] += 1
+    try:
+        return await shield(download)
+    except CancelledError:
+        # Finished download was already pinned for this waiter as well.
+        if not download.done():
+            _download_waiters[link] -= 1
+        elif not download.cancelled() and not download.exception() and download.result():
+            _media_cache.unpin(download.result())
+        raise
+
+
+async def _download_media(link: str) -> CachedMedia | None:
+    # Downloaded media are pinned once when stored and once more for every waiter when finished,
+    # no waiter can join after that, since the download is no longer pending.
+    media = None
+    try:
+        media = await _download_into_cache(link)
+        return media
+    finally:
+        _pending_downloads.pop(link, None)
+        waiters = _download_waiters.pop(link, 0)
+        if media is not None:
+            for _ in range(waiters):
+                _media_cache.pin(media)
+            _media_cache.unpin(media)
+
+
+async def _download_into_cache(link: str) -> CachedMedia | None:
     headers = {"user-agent": "rss-reader/1.0", "accept": "*/*"}
-    response = get(link, headers=headers, timeout=600)
-    if response.status_code != HTTPStatus.OK:
-        logger.warning(f"Could download media at [{link}], status code [{response.status_code}]")
-        return None
-    return response.content, response.headers["Content-Type"]
+    async with _client.stream(link, headers=headers) as response:
+        if response.status_code != HTTPStatus.OK:
+            logger.warning(
+                f"Could download media at [{link}], status code [{response.status_code}]"
+            )
+            return None
+        # Size is checked before downloading anything, if server reports it.
+        if int(response.headers.get("Content-Length") or 0) > MEDIA_MAX_SIZE:
+            logger.warning(f"Media at [{link}] is larger than [{MEDIA_MAX_SIZE}], skipping it")
+            return None
+        file = _media_cache.create_file()
+        file_path = Path(file.name)
+        try:
+            with file:
+                if not await _write_content(link, response, file):
+                    return None
+            media_type = response.headers["Content-Type"]
+            return await _media_cache.put_file(link, file_path, media_type, pin=True)
+        finally:
+            # File is already moved into the cache, unless its download failed.
+            file_path.unlink(missing_ok=True)
+
+
+async def _write_content(link: str, response: Response, file: IO[bytes]) -> bool:
+    size = 0
+    async for chunk in response.aiter_bytes():
+        if (size := size + len(chunk)) > MEDIA_MAX_SIZE:
+            logger.warning(f"Media at [{link}] is larger than [{MEDIA_MAX_SIZE}], skipping it")
+            return False
+        file.write(chunk)
+    return True
 
 
 async def _handle_attachment_group(
-    bot: Bot,
+    bot: ExtBot,
     chat_id: int,
-    media_group: list[tuple[bytes, str]],
+    media_group: list[PreparedMedia],
     message: str = None,
 ) -> None:
     # Technically single media elements don't have to be handled as media group,
     # but they can, so the same implementation can be used for both.
-    input_media_list = [_media_object(media, media_type) for media, media_type in media_group]
-    is_video_list = [isinstance(m, InputMediaVideo) for m in input_media_list]
+    is_video_list = [_is_video(prepared.media.media_type) for prepared in media_group]
     logger.info(f"{chat_id} Sending media group is_video={is_video_list}")
-    if len(input_media_list) == 1 and isinstance(video := input_media_list[0], InputMediaVideo):
-        # Workaround for videos with skewed aspect ratio.
-        await _handle_single_video(bot, chat_id, video, message)
+    # Files of media are opened only for the time of sending them.
+    with ExitStack() as files:
+        if len(media_group) == 1 and is_video_list[0]:
+            # Workaround for videos with skewed aspect ratio.
+            video = media_group[0]
+            sent_messages = [await _handle_single_video(bot, chat_id, video, files, message)]
+        else:
+            sent_messages = await bot.send_media_group(
+                chat_id,
+                [_media_object(prepared, files) for prepared in media_group],
+                caption=message,
+                write_timeout=180,
+                rate_limit_args=SendPriority.BULK,
+            )
+    _store_file_ids(media_group, sent_messages)
+
+
+def _media_object(prepared: PreparedMedia, files: ExitStack) -> InputMediaPhoto | InputMediaVideo:
+    # Media already uploaded to Telegram are send by reference, without any additional processing.
+    media = prepared.media
+    if _is_video(media.media_type):
+        video = media.file_id or _input_file(media.path, files, attach=True)
+        return InputMediaVideo(video, supports_streaming=True)
     else:
-        await bot.send_media_group(chat_id, input_media_list, caption=message, write_timeout=180)
+        path = prepared.trimmed_path or media.path
+        return InputMediaPhoto(media.file_id or _input_file(path, files, attach=True))
 
 
-def _media_object(media: bytes, media_type: str) -> InputMediaPhoto | InputMediaVideo:
-    if _is_video(media_type):
-        return InputMediaVideo(media, supports_streaming=True)
-    else:
-        return InputMediaPhoto(_trim_image(media))
+def _input_file(path: Path, files: ExitStack, attach: bool = False) -> InputFile:
+    # File handle isn't read upfront, so its content is streamed when it's uploaded.
+    file = files.enter_context(path.open("rb"))
+    return InputFile(file, filename=path.name, attach=attach, read_file_handle=False)
+
+
+def _store_file_ids(media_group: list[PreparedMedia], messages: list[Message]) -> None:
+    for prepared, message in zip(media_group, messages):
+        if not prepared.media.file_id and (file_id := _get_file_id(message)):
+            _media_cache.set_file_id(prepared.link, file_id)
+
+
+def _get_file_id(message: Message) -> str | None:
+    if message.video:
+        return message.video.file_id
+    elif message.photo:
+        return message.photo[-1].file_id
+    return None
 
 
 def _is_video(media_type: str) -> bool:
     return "video" in media_type.lower()
 
 
+def _trim_image_file(path: Path, trimmed_path: Path) -> bool:
+    content = path.read_bytes()
+    # Content is returned as it is, when the image doesn't have to be reduced.
+    if (trimmed_content := _trim_image(content)) is content:
+        return False
+    trimmed_path.write_bytes(trimmed_content)
+    return True
+
+
 def _trim_image(media: bytes) -> bytes:
     image = Image.open(BytesIO(media))
-    if (total_size := sum(image.size)) <= MAX_IMAGE_DIMENSIONS and len(media) <= MAX_IMAGE_SIZE:
+    image_format, (width, height) = image.format, image.size
+    if width + height <= MAX_IMAGE_DIMENSIONS and len(media) <= MAX_IMAGE_SIZE:
         return media
     logger.info("Reducing image size...")
-    if total_size > MAX_IMAGE_DIMENSIONS:
-        logger.info(f"Total dimensions too large, reducing to {MAX_IMAGE_THUMBNAIL}...")
-        # Technically image can have size larger than 5000 pixels,
-        # as long as sum of both dimensions is lower than 10000 pixels.
-        # However, this is the simplest solution and images up to 5000x5000 should be big enough.
-        image.thumbnail(MAX_IMAGE_THUMBNAIL)
-    image_bytes = BytesIO()
-    image.save(image_bytes, format=image.format)
-    image_raw = image_bytes.getvalue()
-    while (bytes_size := len(image_raw)) > MAX_IMAGE_SIZE:
-        max_dimension = max(image.size)
-        new_dimensions = (max_dimension // 2, max_dimension // 2)
-        logger.info(f"Total size ({bytes_size}) too large, reducing to {new_dimensions}...")
-        image.thumbnail(new_dimensions)
-        image_bytes.truncate(0)
-        image.save(image_bytes, format=image.format)
-        image_raw = image_bytes.getvalue()
-    return image_raw
+    # Encoded size is roughly proportional to the number of pixels,
+    # so target dimensions are calculated directly, instead of repeatedly halving them.
+    scale = min(MAX_IMAGE_DIMENSIONS / (width + height), _get_size_scale(len(media)))
+    while True:
+        target_size = max(int(width * scale), 1), max(int(height * scale), 1)
+        logger.info(f"Reducing image from {image.size} to {target_size}...")
+        # JPEG images are decoded at already reduced scale, other images are reduced
+        # by an integer factor before resampling, both are much faster than full resampling.
+        image.draft(image.mode, target_size)
+        image = image.resize(target_size, reducing_gap=_IMAGE_REDUCING_GAP)
+        width, height = image.size
+        image_bytes = BytesIO()
+        image.save(image_bytes, format=image_format)
+        if (bytes_size := image_bytes.tell()) <= MAX_IMAGE_SIZE:
+            return image_bytes.getvalue()
+        logger.info(f"Total size ({bytes_size}) still too large...")
+        scale = _get_size_scale(bytes_size)
+
+
+def _get_size_scale(bytes_size: int) -> float:
+    return min(sqrt(MAX_IMAGE_SIZE * _IMAGE_SIZE_MARGIN / bytes_size), 1)
 
 
 async def _handle_single_video(
-    bot: Bot,
+    bot: ExtBot,
     chat_id: int,
-    video: InputMediaVideo,
+    video: PreparedMedia,
+    files: ExitStack,
     message: str = None,
-) -> None:
-    with NamedTemporaryFile() as tmp_file:
-        tmp_file.write(video.media.input_file_content)
-        video_capture = VideoCapture(tmp_file.name)
-        width = int(video_capture.get(CAP_PROP_FRAME_WIDTH))
-        height = int(video_capture.get(CAP_PROP_FRAME_HEIGHT))
+) -> Message:
+    # Videos send by reference already have their dimensions stored by Telegram.
     sent_message = await bot.send_video(
         chat_id,
-        video.media,
-        width=width,
-        height=height,
+        video.media.file_id or _input_file(video.media.path, files),
+        width=video.width,
+        height=video.height,
         caption=message,
         supports_streaming=True,
         write_timeout=180,
+        rate_limit_args=SendPriority.BULK,
     )
     if PIN_VIDEOS:
-        await sent_message.pin()
+        await bot.pin_chat_message(
+            chat_id, sent_message.message_id, rate_limit_args=SendPriority.BULK
+        )
+    return sent_message
+
+
+def _get_video_dimensions(path: Path) -> tuple[int | None, int | None]:
+    with path.open("rb") as file:
+        if dimensions := probe_video_dimensions(file):
+            return dimensions
+    if not _OPENCV_AVAILABLE:
+        logger.info(f"Couldn't read video dimensions from [{path}]")
+        return None, None
+    logger.info(f"Reading video dimensions from [{path}] with OpenCV")
+    return _get_video_dimensions_with_opencv(path)
+
+
+def _get_video_dimensions_with_opencv(path: Path) -> tuple[int, int]:
+    # OpenCV is heavy to import, so it's imported only when it's actually needed.
+    from cv2 import CAP_PROP_FRAME_HEIGHT, CAP_PROP_FRAME_WIDTH, VideoCapture
+
+    video_capture = VideoCapture(str(path))
+    width = int(video_capture.get(CAP_PROP_FRAME_WIDTH))
+    height = int(video_capture.get(CAP_PROP_FRAME_HEIGHT))
+    video_capture.release()
+    return width, height
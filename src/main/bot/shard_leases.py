@@ -0,0 +1,93 @@
+"""
+Module splitting feed links between worker processes, using leases of shards stored in the DB.
+
+Each feed link belongs to one of a fixed number of shards, based on a stable hash of the link,
+so all workers agree on it without any coordination, and it doesn't change between restarts.
+Shards themselves are claimed by workers through lease documents, valid for a limited time.
+
+Each worker periodically:
+ - stores its heartbeat, so other workers know how many of them are alive
+ - renews leases of its shards, dropping ones which were claimed by others in the meantime
+ - releases shards above its fair share, when new workers were started
+ - claims unclaimed or expired shards, up to its fair share
+
+Leases of a worker which died expire after their TTL and are claimed by remaining workers,
+while a new worker gets shards released by others within a few heartbeats.
+Fair share is rounded up, so all shards are always claimed, even if they can't be split evenly.
+When leases can't be renewed, e.g. when DB is unreachable, worker stops checking its shards
+once they would expire, since they can be claimed by other workers afterward.
+"""
+
+from hashlib import sha256
+from math import ceil
+from time import time
+
+from loguru import logger
+
+from db.wrapper import (
+    claim_shard_lease,
+    create_shard_leases,
+    get_claimable_shards,
+    get_live_workers,
+    release_shard_leases,
+    remove_expired_worker_heartbeats,
+    remove_worker_heartbeat,
+    store_worker_heartbeat,
+)
+
+
+def get_shard(feed_link: str, shards: int) -> int:
+    """Get shard of a given feed link, the same in all processes."""
+    digest = sha256(feed_link.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+class ShardLeases:
+    """Leases of shards held by a single worker."""
+
+    def __init__(self, worker_id: str, shards: int, lease_ttl: float):
+        self._worker_id = worker_id
+        self._shards = shards
+        self._lease_ttl = lease_ttl
+        self._owned: set[int] = set()
+        self._expires_at = 0.0
+
+    def owns(self, feed_link: str) -> bool:
+        """Check whether a given feed link belongs to one of shards currently held."""
+        if time() >= self._expires_at:
+            return False
+        return get_shard(feed_link, self._shards) in self._owned
+
+    async def initialize(self) -> None:
+        """Create leases of all shards, if this is the first worker ever started."""
+        await create_shard_leases(self._shards)
+
+    async def heartbeat(self) -> None:
+        """Renew held leases and rebalance shards, based on the number of live workers."""
+        now = time()
+        expires_at = now + self._lease_ttl
+        await store_worker_heartbeat(self._worker_id, expires_at)
+        await remove_expired_worker_heartbeats(now)
+        for shard in sorted(self._owned):
+            if not await claim_shard_lease(shard, self._worker_id, now, expires_at):
+                logger.warning(f"[{self._worker_id}] Lost lease of shard [{shard}]")
+                self._owned.discard(shard)
+        fair_share = ceil(self._shards / max(len(await get_live_workers(now)), 1))
+        if len(self._owned) > fair_share:
+            released = sorted(self._owned)[fair_share:]
+            await release_shard_leases(released, self._worker_id)
+            self._owned.difference_update(released)
+        for shard in await get_claimable_shards(self._shards, now):
+            if len(self._owned) >= fair_share:
+                break
+            if await claim_shard_lease(shard, self._worker_id, now, expires_at):
+                self._owned.add(shard)
+        self._expires_at = expires_at
+        logger.info(f"[{self._worker_id}] Holding [{len(self._owned)}/{self._shards}] shards")
+
+    async def release(self) -> None:
+        """Release all held leases, so other workers can claim them right away."""
+        await release_shard_leases(sorted(self._owned), self._worker_id)
+        await remove_worker_heartbeat(self._worker_id)
+        self._owned.clear()
+        self._expires_at = 0.0
@@ -2,13 +2,14 @@
 Main bot module, which is responsible for:
  - creating the bot itself
  - configuring all command handlers
- - starting a job checking for all RSS updates
+ - starting a job checking for all RSS updates, or sending updates found by worker processes
+ - initializing and closing DB and HTTP clients within the bot's event loop
 
 All these actions are triggered by a single function.
 """
 
 from loguru import logger
-from telegram.ext import Application, ApplicationBuilder, Defaults, JobQueue, PicklePersistence
+from telegram.ext import Application, ApplicationBuilder, Defaults, JobQueue
 
 from bot.command.add import add_followup_handler, add_initial_handler
 from bot.command.cancel import cancel_command_handler
@@ -17,8 +18,32 @@ from bot.command.remove_all import remove_all_followup_handler, remove_all_initi
 from bot.command.start_help import start_help_command_handler
 from bot.command.subs.handler import subscriptions_followup_handler, subscriptions_initial_handler
 from bot.error_handler import handle_errors
-from bot.update_checker import check_for_all_updates
-from settings import LOOKUP_INITIAL_DELAY, LOOKUP_INTERVAL, PERSISTENCE_FILE, TOKEN
+from bot.persistence import DBPersistence
+from bot.rate_limiter import SendRateLimiter
+from bot.sender import close_media_client, initialize_media_cache, load_default_image
+from bot.update_checker import (
+    check_for_all_updates,
+    log_pipeline_metrics,
+    resume_outbox_updates,
+    send_outbox_updates,
+    start_update_pipeline,
+    stop_update_pipeline,
+)
+from db.client import close_db
+from feed.reader import close_feed_client
+from settings import (
+    CALLBACK_DATA_TTL,
+    LOOKUP_INITIAL_DELAY,
+    LOOKUP_INTERVAL,
+    PIPELINE_METRICS_INTERVAL,
+    SEND_CHAT_RATE,
+    SEND_GROUP_RATE_PER_MINUTE,
+    SEND_MAX_RETRIES,
+    SEND_OVERALL_RATE,
+    TOKEN,
+    WORKERS_ENABLED,
+    WORKERS_OUTBOX_INTERVAL,
+)
 
 _UPDATE_HANDLERS = [
     add_initial_handler(),
@@ -46,11 +71,36 @@ def _prepare_application() -> Application:
         .token(TOKEN)
         .defaults(Defaults("HTML"))
         .arbitrary_callback_data(True)
-        .persistence(PicklePersistence(PERSISTENCE_FILE))
+        .rate_limiter(_prepare_rate_limiter())
+        .persistence(DBPersistence(CALLBACK_DATA_TTL))
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
         .build()
     )
 
 
+def _prepare_rate_limiter() -> SendRateLimiter:
+    group_rate = SEND_GROUP_RATE_PER_MINUTE / 60
+    return SendRateLimiter(SEND_OVERALL_RATE, SEND_CHAT_RATE, group_rate, SEND_MAX_RETRIES)
+
+
+async def _post_init(application: Application) -> None:
+    # DB is already initialized by persistence, which is loaded before "post_init".
+    initialize_media_cache()
+    await load_default_image(application.bot)
+    start_update_pipeline(application.bot)
+    # Updates left from before a restart are sent right away, without waiting for any lookup.
+    application.job_queue.run_once(callback=resume_outbox_updates, when=0)
+
+
+async def _post_shutdown(_: Application) -> None:
+    await stop_update_pipeline()
+    logger.info("Closing HTTP clients...")
+    await close_feed_client()
+    await close_media_client()
+    await close_db()
+
+
 def _configure_handlers(application: Application) -> None:
     logger.info("Configuring handlers...")
     application.add_handlers(_UPDATE_HANDLERS)
@@ -58,9 +108,15 @@ def _configure_handlers(application: Application) -> None:
 
 
 def _start_checking_for_updates(job_queue: JobQueue) -> None:
-    logger.info("Starting checking for updates...")
-    job_queue.run_repeating(
-        callback=check_for_all_updates,
-        interval=LOOKUP_INTERVAL,
-        first=LOOKUP_INITIAL_DELAY,
-    )
+    if WORKERS_ENABLED:
+        # Feeds are checked by worker processes, which store new updates in outbox.
+        logger.info("Starting sending updates found by workers...")
+        job_queue.run_repeating(callback=send_outbox_updates, interval=WORKERS_OUTBOX_INTERVAL)
+    else:
+        logger.info("Starting checking for updates...")
+        job_queue.run_repeating(
+            callback=check_for_all_updates,
+            interval=LOOKUP_INTERVAL,
+            first=LOOKUP_INITIAL_DELAY,
+        )
+    job_queue.run_repeating(callback=log_pipeline_metrics, interval=PIPELINE_METRICS_INTERVAL)
@@ -3,104 +3,501 @@ Module responsible for checking for RSS updates.
 
 Information about which RSS items should be checked is extracted from a DB.
 
-Each item will then be scheduled for update in a separate job.
-Created jobs have staggered trigger times, to avoid bottlenecks,
-where too many simultaneous messages are send to a chat.
+Items are streamed from the DB sorted by feed, and grouped by their feed URL,
+so each unique feed is downloaded and parsed only once, even if it's subscribed in multiple chats.
+Feed types sharing the same URL are streamed together, merged by feed name,
+so subscriptions of the same feed URL are always adjacent.
+Each feed URL is checked only once it's due, based on an interval adapted to how often
+the feed is updated.
+Fetches are queued for each host separately and started as fast as the fetch scheduler allows,
+with a limited number of them running.
+A new check for all updates isn't started while the previous one is still running.
+
+New entries are then handled in separate stages, connected by bounded queues:
+fetching feeds, parsing entries, downloading media and sending updates.
+Each stage has its own workers, so one slow upload doesn't delay fetching other feeds,
+while full queues stop previous stages from piling up work.
+Queue depths of all stages are logged periodically, showing which stage is the bottleneck.
+
+Parsed entries are stored in a DB outbox before latest handled entries are updated,
+and removed from it only once they are sent, so each entry is sent at least once.
+Entries left in the outbox are sent again right after the bot is restarted,
+without fetching any feed.
+Entries which couldn't be sent, even without their media, are postponed with a growing delay
+and retried on following lookups, until they are dropped after too many failed attempts.
+
+Feeds can also be checked by separate worker processes, each checking only feeds from its shards.
+Workers run only fetching and parsing stages, storing parsed entries in the outbox,
+while the bot process periodically sends entries stored there, which aren't being sent already.
 
 Accessing DB, reading and parsing the RSS feed and sending updates to chats
 is handled in separate modules.
 """
 
+from asyncio import Lock
 from datetime import datetime
+from functools import partial
+from heapq import heappop, heappush
 from random import randrange
-from time import struct_time
+from time import struct_time, time
+from typing import Any, AsyncIterator, Callable, NamedTuple
 
 from feedparser.util import FeedParserDict
 from loguru import logger
-from telegram.ext import ContextTypes
+from telegram.error import Forbidden
+from telegram.ext import ContextTypes, ExtBot
 
-from bot.sender import send_update
-from db.wrapper import get_all_stored_data, update_stored_latest_data
-from feed.parser import parse_description, parse_link, parse_media_links, parse_title
-from feed.reader import feed_is_valid, get_data, get_not_handled_entries, get_parsed_feed
+from bot.error_handler import handle_send_error
+from bot.fetch_scheduler import FetchScheduler
+from bot.pipeline import Stage
+from bot.sender import PreparedUpdate, prepare_update, release_update, send_prepared_update
+from db.wrapper import (
+    get_all_outbox_updates,
+    get_all_stored_data,
+    get_feed_state,
+    postpone_outbox_update,
+    remove_outbox_update,
+    store_feed_schedule,
+    store_feed_validators,
+    store_outbox_updates,
+    update_all_stored_latest_data,
+)
+from feed.cadence import get_check_interval
+from feed.parser import ParsedEntry, parse_entry
+from feed.reader import (
+    feed_is_not_modified,
+    feed_is_valid,
+    get_data,
+    get_feed_link,
+    get_not_handled_entries,
+    get_parsed_feed,
+)
 from settings import (
-    LOOKUP_FEED_DELAY,
-    LOOKUP_FEED_DELAY_RANDOMNESS,
+    FETCH_CONCURRENCY,
+    FETCH_HOST_RATE,
+    FETCH_QUEUE_SIZE,
+    FETCH_RATE,
+    LOOKUP_INTERVAL,
     LOOKUP_INTERVAL_RANDOMNESS,
+    PIPELINE_MEDIA_WORKERS,
+    PIPELINE_OUTBOX_MAX_ATTEMPTS,
+    PIPELINE_OUTBOX_RETRY_DELAY,
+    PIPELINE_PARSE_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_SEND_WORKERS,
     QUIET_HOURS,
+    RSS_FEEDS,
 )
 
 
+class _FeedCheck(NamedTuple):
+    feed_link: str
+    subscriptions: list[tuple[int, str, str, str, struct_time]]
+    etag: str | None
+    modified: str | None
+    interval: float | None
+
+
+class _ChatUpdate(NamedTuple):
+    chat_id: int
+    feed_type: str
+    feed_name: str
+    # Latest ID the subscription was read with, it's updated only if it wasn't changed meanwhile.
+    latest_id: str
+    entries: list[FeedParserDict]
+
+
+class _FeedUpdate(NamedTuple):
+    feed_link: str
+    # HTTP validators are stored only once new entries are, so they aren't skipped after a crash.
+    etag: str | None
+    modified: str | None
+    updates: list[_ChatUpdate]
+
+
+class _ParsedChatUpdate(NamedTuple):
+    chat_id: int
+    feed_type: str
+    feed_name: str
+    # Each entry is paired with ID of its copy stored in outbox.
+    entries: list[tuple[Any, ParsedEntry]]
+
+
+class _PreparedChatUpdate(NamedTuple):
+    chat_id: int
+    feed_type: str
+    feed_name: str
+    # Errors when preparing an update are send to the chat, the same as errors when sending.
+    entries: list[tuple[Any, ParsedEntry, PreparedUpdate | Exception]]
+
+
+_fetch_scheduler = FetchScheduler(FETCH_CONCURRENCY, FETCH_RATE, FETCH_HOST_RATE, FETCH_QUEUE_SIZE)
+_check_lock = Lock()
+_bot: ExtBot | None = None
+_started_at = time()
+# IDs of outbox entries already queued for sending, so they aren't queued again from the outbox.
+_pending_outbox_ids: set[Any] = set()
+
+
 async def check_for_all_updates(context: ContextTypes.DEFAULT_TYPE) -> None:
     lookup_interval = randrange(max(LOOKUP_INTERVAL_RANDOMNESS, 1))  # randrange(1) always returns 0
     logger.info(f"Delaying checking for updates for [{lookup_interval}] seconds")
     context.job_queue.run_once(callback=_delayed_check_for_all_updates, when=lookup_interval)
 
 
-async def _delayed_check_for_all_updates(context: ContextTypes.DEFAULT_TYPE) -> None:
+async def _delayed_check_for_all_updates(_: ContextTypes.DEFAULT_TYPE) -> None:
+    await check_all_feeds()
+
+
+async def check_all_feeds(feed_filter: Callable[[str], bool] | None = None) -> None:
+    """Check all subscribed feeds, or only ones which links pass a given filter."""
     if datetime.now().hour in QUIET_HOURS:
         logger.info("Quiet hour, skipping checking for updates")
         return
-    logger.info("Starting checking for all updates")
-    delay = 0
-    for feed_data in get_all_stored_data():
-        # Checking for updates for feeds is done through a job queue so that async exceptions
-        # won't stop entire procedure.
-        context.job_queue.run_once(callback=_check_for_updates, when=delay, data=feed_data)
-        delay += LOOKUP_FEED_DELAY
-        delay += randrange(max(LOOKUP_FEED_DELAY_RANDOMNESS, 1))  # randrange(1) always returns 0
-
-
-async def _check_for_updates(context: ContextTypes.DEFAULT_TYPE) -> None:
-    chat_id, feed_type, feed_name, id, date = context.job.data
-    logger.info(f"[{chat_id}] Checking for updates for [{feed_name}] [{feed_type}]")
-    feed = get_parsed_feed(feed_type, feed_name)
-    if feed_is_valid(feed):
-        await _check_for_new_entries(context, chat_id, feed, feed_type, feed_name, id, date)
-    else:
-        logger.error(f"Feed for [{feed_name}] [{feed_type}] is not valid anymore")
-
-
-async def _check_for_new_entries(
-    context: ContextTypes.DEFAULT_TYPE,
-    chat_id: int,
+    if _check_lock.locked():
+        logger.warning("Previous check for all updates is still running, skipping this one")
+        return
+    async with _check_lock:
+        if _bot is not None:
+            # Only postponed entries are sent here, new entries are queued right after parsing.
+            await _send_outbox_updates(time(), postponed_only=True)
+        logger.info("Starting checking for all updates")
+        await _schedule_all_updates(feed_filter)
+        await _fetch_scheduler.wait_until_idle()
+        logger.info("Finished checking for all updates")
+
+
+async def _schedule_all_updates(feed_filter: Callable[[str], bool] | None) -> None:
+    # Subscriptions are streamed from the DB, each feed is scheduled only when it's due.
+    # Scheduling waits while too many fetches are queued, so only subscriptions of feeds
+    # waiting for their fetch, or being fetched, are kept in memory at once.
+    async for feed_link, subscriptions in _group_by_feed_link(_get_all_subscriptions()):
+        if feed_filter and not feed_filter(feed_link):
+            continue
+        etag, modified, interval, next_check = await get_feed_state(feed_link)
+        if not _is_due(next_check):
+            logger.info(f"Feed [{feed_link}] is not due yet, skipping it")
+            continue
+        # Slot taken when the fetch is started is released when it finishes, even if it failed.
+        feed_check = _FeedCheck(feed_link, subscriptions, etag, modified, interval)
+        await _fetch_scheduler.schedule(feed_link, partial(_fetch_stage.put, feed_check))
+
+
+def _is_due(next_check: float | None) -> bool:
+    # Feeds are checked only once per lookup, while their next check is stored after their fetch
+    # finishes, so it's usually slightly after the next lookup reaches them again.
+    # Feeds due before the middle of the next lookup interval are checked now, rather than
+    # a whole lookup later, so feeds with the minimal interval are checked on every lookup.
+    return not next_check or next_check - time() < LOOKUP_INTERVAL / 2
+
+
+async def _get_all_subscriptions() -> AsyncIterator[tuple[int, str, str, str, struct_time]]:
+    # Subscriptions of types sharing a link template are merged by name, so subscriptions
+    # of the same feed link stay adjacent, even when they are stored under different types.
+    link_templates: dict[str, list[str]] = {}
+    for feed_type, feed_data in sorted(RSS_FEEDS.items()):
+        link_templates.setdefault(feed_data["url"], []).append(feed_type)
+    for feed_types in link_templates.values():
+        if len(feed_types) == 1:
+            async for feed_data in get_all_stored_data(feed_types[0]):
+                yield feed_data
+        else:
+            streams = [get_all_stored_data(feed_type) for feed_type in feed_types]
+            async for feed_data in _merge_by_feed_name(streams):
+                yield feed_data
+
+
+async def _merge_by_feed_name(
+    streams: list[AsyncIterator[tuple[int, str, str, str, struct_time]]],
+) -> AsyncIterator[tuple[int, str, str, str, struct_time]]:
+    # Each stream is already sorted by feed name, only the first item of each is kept in memory.
+    heads = []
+    for index, stream in enumerate(streams):
+        if (feed_data := await anext(stream, None)) is not None:
+            heappush(heads, (feed_data[2], index, feed_data))
+    while heads:
+        _, index, feed_data = heappop(heads)
+        yield feed_data
+        if (next_feed_data := await anext(streams[index], None)) is not None:
+            heappush(heads, (next_feed_data[2], index, next_feed_data))
+
+
+async def _group_by_feed_link(
+    stored_data: AsyncIterator[tuple[int, str, str, str, struct_time]],
+) -> AsyncIterator[tuple[str, list[tuple[int, str, str, str, struct_time]]]]:
+    # Stored data is sorted by feed name, so subscriptions of the same feed are adjacent.
+    feed_link, subscriptions = None, []
+    async for feed_data in stored_data:
+        chat_id, feed_type, feed_name, _, _ = feed_data
+        if feed_type not in RSS_FEEDS:
+            logger.error(f"[{chat_id}] Unknown feed type [{feed_type}] for [{feed_name}]")
+            continue
+        if (next_feed_link := get_feed_link(feed_type, feed_name)) != feed_link and subscriptions:
+            yield feed_link, subscriptions
+            subscriptions = []
+        feed_link = next_feed_link
+        subscriptions.append(feed_data)
+    if subscriptions:
+        yield feed_link, subscriptions
+
+
+async def _check_for_updates(feed_check: _FeedCheck) -> None:
+    try:
+        await _check_feed_for_updates(*feed_check)
+    finally:
+        _fetch_scheduler.release()
+
+
+async def _check_feed_for_updates(
+    feed_link: str,
+    subscriptions: list[tuple[int, str, str, str, struct_time]],
+    etag: str | None,
+    modified: str | None,
+    interval: float | None,
+) -> None:
+    logger.info(f"Checking for updates for [{feed_link}] in [{len(subscriptions)}] chats")
+    # All subscriptions are grouped by link, so any of them can be used to get the feed.
+    _, feed_type, feed_name, _, _ = subscriptions[0]
+    feed = await get_parsed_feed(feed_type, feed_name, etag, modified)
+    if feed_is_not_modified(feed):
+        logger.info(f"Feed for [{feed_link}] was not modified")
+        await _schedule_next_check(feed_link, feed, interval, has_new_entries=False)
+        return
+    if not feed_is_valid(feed):
+        logger.error(f"Feed for [{feed_link}] is not valid anymore")
+        return
+    updates = [
+        (subscription, not_handled_feed_entries)
+        for subscription in subscriptions
+        if (not_handled_feed_entries := _get_new_entries(feed, *subscription))
+    ]
+    await _schedule_next_check(feed_link, feed, interval, has_new_entries=bool(updates))
+    if not updates:
+        await store_feed_validators(feed_link, feed.get("etag"), feed.get("modified"))
+        return
+    chat_updates = [
+        _ChatUpdate(chat_id, feed_type, feed_name, latest_id, not_handled_feed_entries)
+        for (chat_id, feed_type, feed_name, latest_id, _), not_handled_feed_entries in updates
+    ]
+    await _parse_stage.put(
+        _FeedUpdate(feed_link, feed.get("etag"), feed.get("modified"), chat_updates)
+    )
+
+
+async def _schedule_next_check(
+    feed_link: str, feed: FeedParserDict, interval: float | None, has_new_entries: bool
+) -> None:
+    interval = get_check_interval(feed, interval, has_new_entries)
+    await store_feed_schedule(feed_link, interval, time() + interval)
+
+
+def _get_new_entries(
     feed: FeedParserDict,
+    chat_id: int,
     feed_type: str,
     feed_name: str,
     latest_id: str,
     date: struct_time,
-) -> None:
+) -> list[FeedParserDict]:
     not_handled_feed_entries = get_not_handled_entries(feed, latest_id, date)
-    if not_handled_feed_entries:
-        await _handle_update(context, chat_id, feed_type, feed_name, not_handled_feed_entries)
-    else:
+    if not not_handled_feed_entries:
         logger.info(f"[{chat_id}] No new data for [{feed_name}] [{feed_type}]")
+    return not_handled_feed_entries
 
 
-async def _handle_update(
-    context: ContextTypes.DEFAULT_TYPE,
-    chat_id: int,
-    feed_type: str,
-    feed_name: str,
-    not_handled_feed_entries: list[FeedParserDict],
-) -> None:
+async def _parse_update(feed_update: _FeedUpdate) -> None:
+    updates = feed_update.updates
+    parsed_updates = list(zip(updates, _parse_entries(updates)))
+    # Entries are stored in outbox before latest data is updated, so a crash between these
+    # writes can only cause entries to be sent again, rather than being lost.
+    outbox_ids = iter(
+        await store_outbox_updates(
+            [
+                (update.chat_id, update.feed_type, update.feed_name, *entry)
+                for update, entries in parsed_updates
+                for entry in entries
+            ]
+        )
+    )
+    # Latest data for all chats is stored in a single bulk write, marking all new entries
+    # as handled before any of them is sent. Entries not sent before a crash aren't checked
+    # again, they're sent only because they're kept in the outbox until then.
+    updated = await update_all_stored_latest_data(
+        [
+            (
+                update.chat_id,
+                update.feed_type,
+                update.feed_name,
+                update.latest_id,
+                *get_data(update.entries[-1]),
+            )
+            for update in updates
+        ]
+    )
+    # Validators are stored last, otherwise the feed could respond with "304 Not Modified"
+    # after a crash, and entries which weren't stored yet would be skipped.
+    await store_feed_validators(feed_update.feed_link, feed_update.etag, feed_update.modified)
+    chat_updates = [
+        _ParsedChatUpdate(
+            update.chat_id,
+            update.feed_type,
+            update.feed_name,
+            [(next(outbox_ids), entry) for entry in entries],
+        )
+        for update, entries in parsed_updates
+    ]
+    # Subscriptions changed meanwhile were already handled by another process, e.g. a worker
+    # which held their shard before its lease expired. Their entries are dropped from outbox,
+    # although the bot process may already be sending them.
+    for chat_update, is_updated in zip(chat_updates, updated):
+        if not is_updated:
+            logger.warning(f"[{chat_update.chat_id}] Dropping entries handled by another process")
+            for outbox_id, _ in chat_update.entries:
+                await remove_outbox_update(outbox_id)
+    if _bot is None:
+        # Without a bot, stored entries are sent from the outbox by the bot process.
+        return
+    for chat_update, is_updated in zip(chat_updates, updated):
+        # Each chat is handled separately, so errors in one chat won't affect others.
+        if is_updated:
+            await _queue_for_sending(chat_update)
+
+
+def _parse_entries(updates: list[_ChatUpdate]) -> list[list[ParsedEntry]]:
+    # The same entries are usually new in multiple chats, each is parsed only once.
+    parsed_entries: dict[tuple[int, str], ParsedEntry] = {}
+    for _, feed_type, _, _, entries in updates:
+        for entry in entries:
+            if (key := (id(entry), feed_type)) not in parsed_entries:
+                parsed_entries[key] = parse_entry(entry, feed_type)
+    return [
+        [parsed_entries[id(entry), feed_type] for entry in entries]
+        for _, feed_type, _, _, entries in updates
+    ]
+
+
+async def resume_outbox_updates(_: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send again all updates left in outbox, stored before the bot was started."""
+    logger.info("Resuming sending updates left in outbox")
+    await _send_outbox_updates(_started_at)
+
+
+async def send_outbox_updates(_: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send all due updates stored in outbox by workers, which aren't being sent already."""
+    await _send_outbox_updates(time())
+
+
+async def _send_outbox_updates(created_before: float, postponed_only: bool = False) -> None:
+    update = None
+    outbox_updates = get_all_outbox_updates(created_before, postponed_only)
+    async for outbox_id, chat_id, feed_type, feed_name, *entry in outbox_updates:
+        if outbox_id in _pending_outbox_ids:
+            continue
+        # Outbox is sorted by chat, subsequent entries of the same feed are sent together.
+        if update is None or update[:3] != (chat_id, feed_type, feed_name):
+            if update is not None:
+                await _queue_for_sending(update)
+            update = _ParsedChatUpdate(chat_id, feed_type, feed_name, [])
+        update.entries.append((outbox_id, ParsedEntry(*entry)))
+    if update is not None:
+        await _queue_for_sending(update)
+
+
+async def _queue_for_sending(update: _ParsedChatUpdate) -> None:
+    _pending_outbox_ids.update(outbox_id for outbox_id, _ in update.entries)
+    await _media_stage.put(update)
+
+
+async def _prepare_update(update: _ParsedChatUpdate) -> None:
+    chat_id, feed_type, feed_name, entries = update
+    prepared_entries = [
+        (outbox_id, entry, await _prepare_entry(chat_id, feed_type, feed_name, entry))
+        for outbox_id, entry in entries
+    ]
+    await _send_stage.put(_PreparedChatUpdate(chat_id, feed_type, feed_name, prepared_entries))
+
+
+async def _prepare_entry(
+    chat_id: int, feed_type: str, feed_name: str, entry: ParsedEntry
+) -> PreparedUpdate | Exception:
+    try:
+        return await prepare_update(chat_id, feed_type, feed_name, *entry)
+    except Exception as error:
+        return error
+
+
+async def _send_update(update: _PreparedChatUpdate) -> None:
+    chat_id, feed_type, feed_name, entries = update
     logger.info(f"[{chat_id}] Handling update [{feed_name}] [{feed_type}]")
-    for entry in not_handled_feed_entries:
-        id, link, date = get_data(entry)
-        update_stored_latest_data(chat_id, feed_type, feed_name, id, link, date)
-        await _send_update(context, chat_id, feed_type, feed_name, entry)
+    try:
+        await _send_entries(chat_id, feed_type, feed_name, entries)
+    finally:
+        _pending_outbox_ids.difference_update(outbox_id for outbox_id, _, _ in entries)
+        for _, _, prepared_update in entries:
+            if not isinstance(prepared_update, Exception):
+                release_update(prepared_update)
 
 
-async def _send_update(
-    context: ContextTypes.DEFAULT_TYPE,
+async def _send_entries(
     chat_id: int,
     feed_type: str,
     feed_name: str,
-    entry: FeedParserDict,
+    entries: list[tuple[Any, ParsedEntry, PreparedUpdate | Exception]],
 ) -> None:
-    link = parse_link(entry)
-    title = parse_title(entry, feed_type)
-    description = parse_description(entry, feed_type)
-    media = parse_media_links(entry)
-    context.job.data = chat_id, feed_type, feed_name, link, title, description
-    await send_update(context.bot, chat_id, feed_type, feed_name, link, title, description, media)
+    for outbox_id, (link, title, description, _), prepared_update in entries:
+        try:
+            if isinstance(prepared_update, Exception):
+                raise prepared_update
+            await send_prepared_update(_bot, chat_id, prepared_update)
+        except Exception as error:
+            logger.warning(f"[{chat_id}] Error when sending update:", exc_info=error)
+            try:
+                await handle_send_error(
+                    _bot, error, chat_id, feed_type, feed_name, link, title, description
+                )
+            except Exception as fallback_error:
+                logger.warning(f"[{chat_id}] Error when sending fallback:", exc_info=fallback_error)
+                await _postpone_entry(chat_id, outbox_id, link)
+                continue
+            if type(error) is Forbidden:
+                return
+        await remove_outbox_update(outbox_id)
+
+
+async def _postpone_entry(chat_id: int, outbox_id: Any, link: str) -> None:
+    attempts = await postpone_outbox_update(outbox_id, PIPELINE_OUTBOX_RETRY_DELAY)
+    if attempts >= PIPELINE_OUTBOX_MAX_ATTEMPTS:
+        logger.error(f"[{chat_id}] Dropping update [{link}] after [{attempts}] failed attempts")
+        await remove_outbox_update(outbox_id)
+    elif attempts:
+        logger.info(f"[{chat_id}] Postponing update [{link}] after [{attempts}] failed attempts")
+
+
+_fetch_stage = Stage("fetch", _check_for_updates, FETCH_CONCURRENCY, PIPELINE_QUEUE_SIZE)
+_parse_stage = Stage("parse", _parse_update, PIPELINE_PARSE_WORKERS, PIPELINE_QUEUE_SIZE)
+_media_stage = Stage("media", _prepare_update, PIPELINE_MEDIA_WORKERS, PIPELINE_QUEUE_SIZE)
+_send_stage = Stage("send", _send_update, PIPELINE_SEND_WORKERS, PIPELINE_QUEUE_SIZE)
+_stages = [_fetch_stage, _parse_stage, _media_stage, _send_stage]
+
+
+def start_update_pipeline(bot: ExtBot | None) -> None:
+    """
+    Start workers of all stages of handling updates, sending updates via a given bot.
+    Without a bot, parsed updates are only stored in outbox, for the bot process to send them.
+    """
+    global _bot, _started_at
+    _bot = bot
+    _started_at = time()
+    for stage in _stages:
+        stage.start()
+
+
+async def stop_update_pipeline() -> None:
+    """Stop workers of all stages, starting from fetching feeds."""
+    _fetch_scheduler.cancel()
+    for stage in _stages:
+        await stage.stop()
+
+
+async def log_pipeline_metrics(_: ContextTypes.DEFAULT_TYPE) -> None:
+    logger.info(f"Update pipeline: {', '.join(stage.metrics() for stage in _stages)}")
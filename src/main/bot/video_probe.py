@@ -0,0 +1,170 @@
+"""
+Module reading dimensions of a video from its container headers.
+
+Supported containers are MP4/MOV (ISO base media file format) and WebM/Matroska.
+Only headers of relevant boxes or elements are read, everything else is skipped by seeking,
+so only a few KB are read, regardless of size of the video, or where its metadata is stored.
+Display dimensions are preferred, so videos with non-square pixels have correct aspect ratio.
+"""
+
+from struct import unpack, unpack_from
+from typing import BinaryIO
+
+_EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+
+_MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+_MP4_LEAF_READ_SIZE = 256
+
+_EBML_SEGMENT = 0x18538067
+_EBML_TRACKS = 0x1654AE6B
+_EBML_TRACK_ENTRY = 0xAE
+_EBML_TRACK_TYPE = 0x83
+_EBML_VIDEO = 0xE0
+_EBML_PIXEL_WIDTH = 0xB0
+_EBML_PIXEL_HEIGHT = 0xBA
+_EBML_DISPLAY_WIDTH = 0x54B0
+_EBML_DISPLAY_HEIGHT = 0x54BA
+_EBML_CONTAINERS = {_EBML_SEGMENT, _EBML_TRACKS, _EBML_TRACK_ENTRY, _EBML_VIDEO}
+_EBML_VIDEO_TRACK_TYPE = 1
+_EBML_UNKNOWN_SIZE = -1
+
+
+def probe_video_dimensions(file: BinaryIO) -> tuple[int, int] | None:
+    """Get width and height of a video from a seekable file, or None if they can't be read."""
+    file.seek(0, 2)
+    file_size = file.tell()
+    file.seek(0)
+    try:
+        if file.read(4) == _EBML_MAGIC:
+            return _probe_ebml(file, file_size)
+        return _probe_mp4(file, file_size)
+    except (ValueError, OSError):
+        return None
+
+
+def _probe_mp4(file: BinaryIO, file_size: int) -> tuple[int, int] | None:
+    tracks = []
+    _read_mp4_boxes(file, 0, file_size, tracks)
+    for track in tracks:
+        if track.get("handler") != b"vide":
+            continue
+        # Track header has display dimensions, sample description is used only without them.
+        for dimensions in (track.get("tkhd"), track.get("stsd")):
+            if dimensions and all(dimensions):
+                return dimensions
+    return None
+
+
+def _read_mp4_boxes(file: BinaryIO, start: int, end: int, tracks: list[dict]) -> None:
+    position = start
+    while position + 8 <= end:
+        file.seek(position)
+        size, box_type = unpack(">I4s", _read(file, 8))
+        header_size = 8
+        if size == 1:
+            (size,) = unpack(">Q", _read(file, 8))
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size:
+            raise ValueError(f"Invalid MP4 box size [{size}]")
+        payload_start, box_end = position + header_size, min(position + size, end)
+        if box_type == b"trak":
+            tracks.append({})
+        if box_type in _MP4_CONTAINERS:
+            _read_mp4_boxes(file, payload_start, box_end, tracks)
+        elif tracks and box_type in (b"tkhd", b"hdlr", b"stsd"):
+            payload = file.read(min(box_end - payload_start, _MP4_LEAF_READ_SIZE))
+            _parse_mp4_leaf(box_type, payload, tracks[-1])
+        position = box_end
+
+
+def _parse_mp4_leaf(box_type: bytes, payload: bytes, track: dict) -> None:
+    if box_type == b"tkhd" and payload:
+        # Version 1 has 64-bit creation and modification times and duration.
+        offset = 88 if payload[0] == 1 else 76
+        if len(payload) >= offset + 8:
+            width, height = unpack_from(">II", payload, offset)
+            # Values are 16.16 fixed-point numbers.
+            track["tkhd"] = width >> 16, height >> 16
+    elif box_type == b"hdlr" and len(payload) >= 12:
+        track["handler"] = payload[8:12]
+    elif box_type == b"stsd" and len(payload) >= 44:
+        # Width and height of the first visual sample entry.
+        track["stsd"] = unpack_from(">HH", payload, 40)
+
+
+def _probe_ebml(file: BinaryIO, file_size: int) -> tuple[int, int] | None:
+    file.seek(0)
+    tracks = []
+    _read_ebml_elements(file, 0, file_size, tracks)
+    for track in tracks:
+        if track.get(_EBML_TRACK_TYPE) == _EBML_VIDEO_TRACK_TYPE:
+            width = track.get(_EBML_DISPLAY_WIDTH) or track.get(_EBML_PIXEL_WIDTH)
+            height = track.get(_EBML_DISPLAY_HEIGHT) or track.get(_EBML_PIXEL_HEIGHT)
+            if width and height:
+                return width, height
+    return None
+
+
+def _read_ebml_elements(file: BinaryIO, start: int, end: int, tracks: list[dict]) -> bool:
+    """Read elements between given positions, return whether all tracks were already read."""
+    position = start
+    while position < end:
+        file.seek(position)
+        element_id = _read_ebml_id(file)
+        size = _read_ebml_size(file)
+        payload_start = file.tell()
+        if element_id == _EBML_TRACK_ENTRY:
+            tracks.append({})
+        if element_id in _EBML_CONTAINERS:
+            element_end = end if size == _EBML_UNKNOWN_SIZE else payload_start + size
+            if _read_ebml_elements(file, payload_start, min(element_end, end), tracks):
+                return True
+            if element_id == _EBML_TRACKS:
+                return True
+        elif size == _EBML_UNKNOWN_SIZE:
+            # Element of unknown size can't be skipped, tracks are always stored before them.
+            return True
+        elif tracks and element_id in (
+            _EBML_TRACK_TYPE,
+            _EBML_PIXEL_WIDTH,
+            _EBML_PIXEL_HEIGHT,
+            _EBML_DISPLAY_WIDTH,
+            _EBML_DISPLAY_HEIGHT,
+        ):
+            tracks[-1][element_id] = int.from_bytes(_read(file, size), "big")
+        if size == _EBML_UNKNOWN_SIZE:
+            return False
+        position = payload_start + size
+    return False
+
+
+def _read_ebml_id(file: BinaryIO) -> int:
+    first = _read(file, 1)[0]
+    length = _get_vint_length(first, 4)
+    # Element IDs keep their length marker.
+    return int.from_bytes(bytes([first]) + _read(file, length - 1), "big")
+
+
+def _read_ebml_size(file: BinaryIO) -> int:
+    first = _read(file, 1)[0]
+    length = _get_vint_length(first, 8)
+    value = first & (0xFF >> length)
+    for byte in _read(file, length - 1):
+        value = (value << 8) | byte
+    return _EBML_UNKNOWN_SIZE if value == (1 << (7 * length)) - 1 else value
+
+
+def _get_vint_length(first: int, max_length: int) -> int:
+    for length in range(1, max_length + 1):
+        if first & (0x80 >> (length - 1)):
+            return length
+    raise ValueError(f"Invalid EBML variable length integer [{first}]")
+
+
+def _read(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of file")
+    return data
@@ -0,0 +1,86 @@
+"""
+Module running a worker process, checking for updates only feeds from shards it holds.
+
+Worker doesn't connect to Telegram at all, parsed updates are stored in the DB outbox,
+from which the bot process sends them.
+Multiple workers can be started at once, feeds are split between them through shard leases,
+which are renewed in the background, independently of checking for updates.
+
+All these actions are triggered by a single function.
+"""
+
+from asyncio import CancelledError, create_task, current_task, get_running_loop, run, sleep
+from os import getpid
+from random import randrange
+from signal import SIGTERM
+from socket import gethostname
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from loguru import logger
+
+from bot.shard_leases import ShardLeases
+from bot.update_checker import (
+    check_all_feeds,
+    log_pipeline_metrics,
+    start_update_pipeline,
+    stop_update_pipeline,
+)
+from db.client import close_db, initialize_db
+from feed.reader import close_feed_client
+from settings import (
+    LOOKUP_INITIAL_DELAY,
+    LOOKUP_INTERVAL,
+    LOOKUP_INTERVAL_RANDOMNESS,
+    PIPELINE_METRICS_INTERVAL,
+    WORKERS_HEARTBEAT_INTERVAL,
+    WORKERS_LEASE_TTL,
+    WORKERS_SHARDS,
+)
+
+
+def run_worker() -> None:
+    run(_run_worker())
+
+
+async def _run_worker() -> None:
+    # SIGTERM is used to stop Docker containers, worker should release its leases then as well.
+    get_running_loop().add_signal_handler(SIGTERM, current_task().cancel)
+    worker_id = f"{gethostname()}-{getpid()}-{uuid4().hex[:8]}"
+    logger.info(f"Starting worker [{worker_id}]...")
+    await initialize_db()
+    leases = ShardLeases(worker_id, WORKERS_SHARDS, WORKERS_LEASE_TTL)
+    await leases.initialize()
+    await leases.heartbeat()
+    start_update_pipeline(None)
+    background_tasks = [
+        create_task(_repeat(leases.heartbeat, WORKERS_HEARTBEAT_INTERVAL)),
+        create_task(_repeat(_log_pipeline_metrics, PIPELINE_METRICS_INTERVAL)),
+    ]
+    try:
+        await sleep(LOOKUP_INITIAL_DELAY)
+        while True:
+            await check_all_feeds(leases.owns)
+            await sleep(LOOKUP_INTERVAL + randrange(max(LOOKUP_INTERVAL_RANDOMNESS, 1)))
+    except CancelledError:
+        logger.info(f"Stopping worker [{worker_id}]...")
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await stop_update_pipeline()
+        await leases.release()
+        await close_feed_client()
+        await close_db()
+
+
+async def _repeat(callback: Callable[[], Awaitable[None]], interval: float) -> None:
+    while True:
+        await sleep(interval)
+        try:
+            await callback()
+        except Exception as error:
+            logger.error("Error in worker background task:", exc_info=error)
+
+
+async def _log_pipeline_metrics() -> None:
+    await log_pipeline_metrics(None)
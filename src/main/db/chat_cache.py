@@ -0,0 +1,102 @@
+"""
+Module with in-process cache of data read from the DB for single chats.
+
+Cache is used by the "wrapper" module, so browsing subscriptions doesn't query the DB
+after the same data was read once.
+All writes to the DB go through the "wrapper" module as well, which updates or invalidates
+cached data of affected chats, so data written by this process is never served stale.
+
+Data of each chat is split into kinds, e.g. feed types or pages of feeds, which can be
+invalidated separately.
+Number of cached chats is limited, least recently used chats are removed first.
+Number of values of each kind cached for a chat is limited the same way.
+
+Every write to data of a chat changes its version, values read from the DB are cached
+only if the version didn't change while they were read, so a read racing with a write
+can't cache data older than the write.
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable
+
+MISSING = object()
+
+
+class _Chat:
+    """Cached values of a single chat, by kind, with a generation changed by every write."""
+
+    def __init__(self):
+        self.kinds: dict[str, OrderedDict[Hashable, Any]] = {}
+        self.generation = 0
+
+
+class ChatCache:
+    """LRU cache of data of separate chats."""
+
+    def __init__(self, max_chats: int, max_values: int):
+        self._max_chats = max_chats
+        self._max_values = max_values
+        self._chats: OrderedDict[int, _Chat] = OrderedDict()
+
+    def get(self, chat_id: int, kind: str, key: Hashable = None) -> Any:
+        """Get cached value, or MISSING if it's not cached."""
+        if (chat := self._chats.get(chat_id)) is None:
+            return MISSING
+        self._chats.move_to_end(chat_id)
+        if (values := chat.kinds.get(kind)) is None or key not in values:
+            return MISSING
+        values.move_to_end(key)
+        return values[key]
+
+    def version(self, chat_id: int) -> Hashable:
+        """Get current version of data of a chat, taken before reading a value from the DB."""
+        chat = self._get_chat(chat_id)
+        return chat, chat.generation
+
+    def put(
+        self, chat_id: int, kind: str, key: Hashable, value: Any, version: Hashable = None
+    ) -> None:
+        """
+        Cache a value, removing least recently used values and chats if there are too many.
+        Value read from the DB with a given version is cached only if the version didn't change,
+        value without a version is written by this process and changes the version instead.
+        """
+        if version is not None and version != self._current_version(chat_id):
+            return
+        chat = self._get_chat(chat_id)
+        if version is None:
+            chat.generation += 1
+        values = chat.kinds.setdefault(kind, OrderedDict())
+        values[key] = value
+        values.move_to_end(key)
+        while len(values) > self._max_values:
+            values.popitem(last=False)
+
+    def replace(self, chat_id: int, kind: str, key: Hashable, value: Any) -> None:
+        """Update an already cached value, without caching values which weren't read before."""
+        if (chat := self._chats.get(chat_id)) is None:
+            return
+        chat.generation += 1
+        if (values := chat.kinds.get(kind)) and key in values:
+            values[key] = value
+
+    def invalidate(self, chat_id: int, kind: str | None = None) -> None:
+        """Remove cached values of a given kind for a chat, or all its values without a kind."""
+        if kind is None:
+            self._chats.pop(chat_id, None)
+        elif (chat := self._chats.get(chat_id)) is not None:
+            chat.generation += 1
+            chat.kinds.pop(kind, None)
+
+    def _current_version(self, chat_id: int) -> Hashable | None:
+        if (chat := self._chats.get(chat_id)) is None:
+            return None
+        return chat, chat.generation
+
+    def _get_chat(self, chat_id: int) -> _Chat:
+        if (chat := self._chats.get(chat_id)) is None:
+            chat = self._chats[chat_id] = _Chat()
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self._max_chats:
+            self._chats.popitem(last=False)
+        return chat
@@ -1,5 +1,6 @@
 """
-Module wrapping a MongoDB client and functions modifying a collection within it.
+Module wrapping an asynchronous MongoDB client and functions modifying a collection within it.
+DB operations are awaited, so they don't block the event loop.
 
 Contains only DB-specific functions, none application-specific ones.
 Application-specific functions are in the "wrapper" module.
@@ -7,94 +8,196 @@ Application-specific functions are in the "wrapper" module.
 This way it should be simple to switch to a different DB altogether,
 only this module needs to be modified.
 
-Additionally, this module is also creating needed database, collection and index in the database.
+Additionally, this module is also creating needed database, collections and indexes in the database.
 """
 
 from typing import Any, Mapping
 
 from loguru import logger
-from pymongo import ASCENDING, MongoClient
-from pymongo.collection import Collection
-from pymongo.cursor import Cursor
-from pymongo.results import DeleteResult, InsertOneResult
-
-from settings import DB_FEEDS_NAME, DB_HOST, DB_NAME, DB_PORT
-
-_feeds_collection: Collection | None = None
-
-
-def initialize_db() -> None:
-    """Initialize MongoDB client, create relevant DB, collection and index."""
-    if _feeds_collection is not None:
+from pymongo import ASCENDING, AsyncMongoClient, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.cursor import AsyncCursor
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult
+
+from settings import (
+    DB_FEED_STATE_NAME,
+    DB_FEEDS_NAME,
+    DB_FILE_IDS_NAME,
+    DB_HOST,
+    DB_LEASES_NAME,
+    DB_NAME,
+    DB_OUTBOX_NAME,
+    DB_PERSISTENCE_NAME,
+    DB_PORT,
+)
+
+# Collection name, index keys and whether index is unique.
+_INDEXES = [
+    (
+        DB_FEEDS_NAME,
+        [("chat_id", ASCENDING), ("feed_name", ASCENDING), ("feed_type", ASCENDING)],
+        True,
+    ),
+    (
+        DB_FEEDS_NAME,
+        [("feed_type", ASCENDING), ("feed_name", ASCENDING), ("chat_id", ASCENDING)],
+        False,
+    ),
+    (
+        DB_FEEDS_NAME,
+        [("chat_id", ASCENDING), ("feed_type", ASCENDING), ("feed_name", ASCENDING)],
+        False,
+    ),
+    (DB_FEED_STATE_NAME, [("feed_link", ASCENDING)], True),
+    (DB_FILE_IDS_NAME, [("digest", ASCENDING)], True),
+    (DB_OUTBOX_NAME, [("chat_id", ASCENDING), ("created_at", ASCENDING)], False),
+    (DB_PERSISTENCE_NAME, [("kind", ASCENDING), ("key", ASCENDING)], True),
+    (DB_LEASES_NAME, [("kind", ASCENDING), ("key", ASCENDING)], True),
+]
+_COLLECTION_NAMES = [
+    DB_FEEDS_NAME,
+    DB_FEED_STATE_NAME,
+    DB_FILE_IDS_NAME,
+    DB_OUTBOX_NAME,
+    DB_PERSISTENCE_NAME,
+    DB_LEASES_NAME,
+]
+
+_client: AsyncMongoClient | None = None
+_collections: dict[str, AsyncCollection] = {}
+
+
+async def initialize_db() -> None:
+    """
+    Initialize MongoDB client, create relevant DB, collections and indexes.
+    Client is bound to the currently running event loop.
+    """
+    if _collections:
         logger.warning("DB already initialized!")
         return
     logger.info("Initializing DB...")
     _initialize_collections()
-    _create_indexes()
+    await _create_indexes()
+
+
+async def close_db() -> None:
+    """Close MongoDB client, DB can be initialized again afterward."""
+    global _client
+    if _client is not None:
+        logger.info("Closing DB...")
+        await _client.close()
+    _client = None
+    _collections.clear()
 
 
 def _initialize_collections() -> None:
-    database = MongoClient(DB_HOST, DB_PORT)[DB_NAME]
-    global _feeds_collection
-    _feeds_collection = database[DB_FEEDS_NAME]
+    global _client
+    _client = AsyncMongoClient(DB_HOST, DB_PORT)
+    database = _client[DB_NAME]
+    for name in _COLLECTION_NAMES:
+        _collections[name] = database[name]
 
 
-def _create_indexes() -> None:
+async def _create_indexes() -> None:
     logger.info("Creating DB indexes...")
-    feed_index = _feeds_collection.create_index(
-        keys=[("chat_id", ASCENDING), ("feed_name", ASCENDING), ("feed_type", ASCENDING)],
-        unique=True,
-    )
-    logger.info(f"Created indexes [{feed_index}]")
+    for collection, keys, unique in _INDEXES:
+        index = await _collections[collection].create_index(keys=keys, unique=unique)
+        logger.info(f"Created index [{index}] in [{collection}]")
 
 
-def insert_one(document: Mapping[str, Any], collection: str = DB_FEEDS_NAME) -> InsertOneResult:
+async def insert_one(
+    document: Mapping[str, Any], collection: str = DB_FEEDS_NAME
+) -> InsertOneResult:
     """Wrapper for "insert_one" DB function."""
     collection = _get_collection(collection)
     assert collection is not None, "DB is not initialized!"
-    return collection.insert_one(document)
+    return await collection.insert_one(document)
+
+
+async def insert_many(
+    documents: list[Mapping[str, Any]], collection: str = DB_FEEDS_NAME
+) -> InsertManyResult:
+    """Wrapper for ordered "insert_many" DB function."""
+    collection = _get_collection(collection)
+    assert collection is not None, "DB is not initialized!"
+    return await collection.insert_many(documents)
 
 
-def delete_many(db_filter: Mapping[str, Any], collection: str = DB_FEEDS_NAME) -> DeleteResult:
+async def delete_many(
+    db_filter: Mapping[str, Any], collection: str = DB_FEEDS_NAME
+) -> DeleteResult:
     """Wrapper for "delete_many" DB function."""
     collection = _get_collection(collection)
     assert collection is not None, "DB is not initialized!"
-    return collection.delete_many(db_filter)
+    return await collection.delete_many(db_filter)
 
 
-def update_one(
-    db_filter: Mapping[str, Any], update: Mapping[str, Any], collection: str = DB_FEEDS_NAME
+async def update_one(
+    db_filter: Mapping[str, Any],
+    update: Mapping[str, Any] | list[Mapping[str, Any]],
+    collection: str = DB_FEEDS_NAME,
+    upsert: bool = False,
 ) -> Any:
-    """Wrapper for "find_one_and_update" DB function."""
+    """
+    Wrapper for "find_one_and_update" DB function, returning document from before the update.
+    Update can be also given as an aggregation pipeline.
+    """
     collection = _get_collection(collection)
     assert collection is not None, "DB is not initialized!"
-    return collection.find_one_and_update(db_filter, update)
+    return await collection.find_one_and_update(db_filter, update, upsert=upsert)
 
 
-def find_many(db_filter: Mapping[str, Any] = None, collection: str = DB_FEEDS_NAME) -> Cursor:
-    """Wrapper for "find" DB function."""
+async def update_many(
+    updates: list[tuple[Mapping[str, Any], Mapping[str, Any]]],
+    collection: str = DB_FEEDS_NAME,
+    upsert: bool = False,
+) -> BulkWriteResult:
+    """Wrapper for unordered "bulk_write" DB function, with a list of "UpdateOne" operations."""
+    collection = _get_collection(collection)
+    assert collection is not None, "DB is not initialized!"
+    operations = [UpdateOne(db_filter, update, upsert=upsert) for db_filter, update in updates]
+    return await collection.bulk_write(operations, ordered=False)
+
+
+def find_many(
+    db_filter: Mapping[str, Any] = None,
+    collection: str = DB_FEEDS_NAME,
+    projection: Mapping[str, Any] = None,
+    sort: list[tuple[str, int]] = None,
+    limit: int = 0,
+) -> AsyncCursor:
+    """Wrapper for "find" DB function, returned cursor is iterated asynchronously."""
     collection = _get_collection(collection)
     assert collection is not None, "DB is not initialized!"
-    return collection.find(db_filter)
+    return collection.find(db_filter, projection=projection, sort=sort, limit=limit)
 
 
-def find_one(db_filter: Mapping[str, Any] = None, collection: str = DB_FEEDS_NAME) -> Cursor:
+async def find_one(
+    db_filter: Mapping[str, Any] = None, collection: str = DB_FEEDS_NAME
+) -> Mapping[str, Any] | None:
     """Wrapper for "find_one" DB function."""
     collection = _get_collection(collection)
     assert collection is not None, "DB is not initialized!"
-    return collection.find_one(db_filter)
+    return await collection.find_one(db_filter)
+
+
+async def distinct(
+    key: str, db_filter: Mapping[str, Any] = None, collection: str = DB_FEEDS_NAME
+) -> list[Any]:
+    """Wrapper for "distinct" DB function."""
+    collection = _get_collection(collection)
+    assert collection is not None, "DB is not initialized!"
+    return await collection.distinct(key, db_filter)
 
 
-def exists(db_filter: Mapping[str, Any], collection: str = DB_FEEDS_NAME) -> bool:
+async def exists(db_filter: Mapping[str, Any], collection: str = DB_FEEDS_NAME) -> bool:
     """Check if there are any documents from a given filter, using count_documents DB function."""
     collection = _get_collection(collection)
     assert collection is not None, "DB is not initialized!"
-    return bool(collection.count_documents(db_filter, limit=1))
+    return bool(await collection.count_documents(db_filter, limit=1))
 
 
-def _get_collection(name: str) -> Collection:
-    if name == DB_FEEDS_NAME:
-        return _feeds_collection
-    # This might be pointless with only one collection, but since the mechanism is already
-    # implemented, it might be useful in the future.
+def _get_collection(name: str) -> AsyncCollection | None:
+    if name in _COLLECTION_NAMES:
+        return _collections.get(name)
     raise ValueError(f"Unknown collection name: {name}")
@@ -1,66 +1,266 @@
 """
 Module handling application-specific DB functions.
+All functions are asynchronous, so DB access doesn't block the event loop.
 
 Contains only application-specific functions, none DB-specific ones.
 DB-specific functions are in the "client" module.
 
 This way it should be simple to switch to a different DB altogether,
 since this module won't have to be modified.
+
+Subscriptions read for single chats are cached in-process, keyed by chat ID,
+so browsing them interactively doesn't query the DB after the first view.
+Every function writing subscriptions updates or invalidates cached data of affected chats.
+Latest entries are updated by worker processes when they are enabled,
+so the bot reads them from the DB every time.
 """
 
-from collections import defaultdict
-from time import struct_time
+from re import escape
+from time import struct_time, time
+from typing import Any, AsyncIterator
+from uuid import uuid4
 
 from loguru import logger
+from pymongo import ASCENDING, DESCENDING
 from pymongo.results import DeleteResult
 
-from db.client import delete_many, exists, find_many, find_one, insert_one, update_one
+from db.chat_cache import MISSING, ChatCache
+from db.client import (
+    delete_many,
+    distinct,
+    exists,
+    find_many,
+    find_one,
+    insert_many,
+    insert_one,
+    update_many,
+    update_one,
+)
+from settings import (
+    DB_BATCH_SIZE,
+    DB_CHAT_CACHE_SIZE,
+    DB_CHAT_CACHE_VALUES,
+    DB_FEED_STATE_NAME,
+    DB_FILE_IDS_NAME,
+    DB_LEASES_NAME,
+    DB_OUTBOX_NAME,
+    DB_PERSISTENCE_NAME,
+    WORKERS_ENABLED,
+)
 
+_ALL_DATA_PROJECTION = {
+    "_id": False,
+    "chat_id": True,
+    "feed_type": True,
+    "feed_name": True,
+    "latest_id": True,
+    "latest_date": True,
+}
+_ALL_DATA_SORT = [("feed_type", ASCENDING), ("feed_name", ASCENDING), ("chat_id", ASCENDING)]
+_FEEDS_PAGE_PROJECTION = {"_id": False, "feed_type": True, "feed_name": True}
+_FEED_KEY_PROJECTION = {"_id": False, "chat_id": True, "feed_type": True, "feed_name": True}
+_FEEDS_PAGE_SORT = [("feed_name", ASCENDING), ("feed_type", ASCENDING)]
+_FEEDS_PAGE_REVERSED_SORT = [("feed_name", DESCENDING), ("feed_type", DESCENDING)]
+_OUTBOX_SORT = [("chat_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]
 
-def get_all_stored_data() -> list[tuple[int, str, str, str, struct_time]]:
-    """Returns all data stored in the DB."""
-    logger.info("Getting all data for all chats")
-    return [
-        (
-            document["chat_id"],
-            document["feed_type"],
-            document["feed_name"],
-            document["latest_id"],
-            _parse_date(document.get("latest_date")),
+# Kinds of lease documents, heartbeats of live workers and shards claimed by them.
+_WORKER_LEASE = "worker"
+_SHARD_LEASE = "shard"
+
+# Kinds of data cached for each chat.
+_TYPES = "types"
+_PAGES = "pages"
+_FEEDS = "feeds"
+
+_chat_cache = ChatCache(DB_CHAT_CACHE_SIZE, DB_CHAT_CACHE_VALUES)
+
+
+async def get_all_stored_data(
+    feed_type: str | None = None,
+) -> AsyncIterator[tuple[int, str, str, str, struct_time]]:
+    """
+    Stream all data stored in the DB, optionally only of a single feed type,
+    sorted by feed type and feed name.
+
+    Data is loaded lazily in batches, each batch is a separate, indexed query starting after
+    the last already loaded document, so no cursor is kept open between batches.
+    """
+    logger.info(f"Getting all data for all chats of type [{feed_type}]")
+    last_document = None
+    while True:
+        db_filter = _after_document_filter(last_document) if last_document else {}
+        if feed_type is not None:
+            db_filter["feed_type"] = feed_type
+        documents = find_many(
+            db_filter or None,
+            projection=_ALL_DATA_PROJECTION,
+            sort=_ALL_DATA_SORT,
+            limit=DB_BATCH_SIZE,
         )
-        for document in find_many()
-    ]
+        last_document = None
+        async for last_document in documents:
+            yield (
+                last_document["chat_id"],
+                last_document["feed_type"],
+                last_document["feed_name"],
+                last_document["latest_id"],
+                _parse_date(last_document.get("latest_date")),
+            )
+        if last_document is None:
+            return
 
 
-def get_stored_feed_type_to_names(chat_id: int) -> dict[str, list[str]]:
-    """Get all data for a given chat_id stored in the DB."""
-    logger.info(f"[{chat_id}] Getting data")
-    feed_type_to_names = defaultdict(list)
-    for document in find_many({"chat_id": chat_id}):
-        feed_type_to_names[document["feed_type"]].append(document["feed_name"])
-    return feed_type_to_names
+def _after_document_filter(document: dict[str, Any]) -> dict[str, Any]:
+    feed_type, feed_name, chat_id = (
+        document["feed_type"],
+        document["feed_name"],
+        document["chat_id"],
+    )
+    return {
+        "$or": [
+            {"feed_type": {"$gt": feed_type}},
+            {"feed_type": feed_type, "feed_name": {"$gt": feed_name}},
+            {"feed_type": feed_type, "feed_name": feed_name, "chat_id": {"$gt": chat_id}},
+        ]
+    }
 
 
-def get_latest_entry_data(chat_id: int, feed_type: str, feed_name: str) -> tuple[str, struct_time]:
-    """Return latest stored entry ID for given feed"""
-    logger.info(f"[{chat_id}] Getting latest entry ID for [{feed_type}] [{feed_name}]")
-    document = find_one({"chat_id": chat_id, "feed_type": feed_type, "feed_name": feed_name})
-    return document.get("latest_link"), _parse_date(document.get("latest_date"))
+async def get_stored_feed_types(chat_id: int) -> list[str]:
+    """Get sorted types of all feeds stored for a given chat."""
+    if (types := _chat_cache.get(chat_id, _TYPES)) is not MISSING:
+        return types
+    logger.info(f"[{chat_id}] Getting feed types")
+    version = _chat_cache.version(chat_id)
+    types = sorted(await distinct("feed_type", {"chat_id": chat_id}))
+    _chat_cache.put(chat_id, _TYPES, None, types, version)
+    return types
 
 
-def feed_is_already_stored(chat_id: int, feed_type: str, feed_name: str) -> bool:
+async def get_stored_feeds_page(
+    chat_id: int,
+    limit: int,
+    feed_type: str | None = None,
+    name_ranges: list[tuple[str, str | None]] = None,
+    after: tuple[str, str] | None = None,
+    before: tuple[str, str] | None = None,
+    name_prefix: str | None = None,
+) -> list[tuple[str, str]]:
+    """
+    Get a single page of feed types and names stored for a given chat, sorted by feed name.
+
+    Feeds can be limited to a single type and to names within given ranges,
+    each range starts with its first value and ends before its second one, if it's set.
+    Names can also be limited to ones starting with a given prefix, ignoring case.
+    Page starts after the (name, type) of the last feed of the previous page,
+    or ends before the (name, type) of the first feed of the next page.
+    Each page is a single indexed query, returning at most "limit" feeds.
+    """
+    page_key = (limit, feed_type, tuple(name_ranges or []), after, before, name_prefix)
+    if (feeds := _chat_cache.get(chat_id, _PAGES, page_key)) is not MISSING:
+        return feeds
+    version = _chat_cache.version(chat_id)
+    feeds = await _find_feeds_page(
+        chat_id, limit, feed_type, name_ranges, after, before, name_prefix
+    )
+    _chat_cache.put(chat_id, _PAGES, page_key, feeds, version)
+    return feeds
+
+
+async def _find_feeds_page(
+    chat_id: int,
+    limit: int,
+    feed_type: str | None,
+    name_ranges: list[tuple[str, str | None]] | None,
+    after: tuple[str, str] | None,
+    before: tuple[str, str] | None,
+    name_prefix: str | None,
+) -> list[tuple[str, str]]:
+    logger.info(
+        f"[{chat_id}] Getting feeds page type=[{feed_type}] after=[{after}] before=[{before}]"
+    )
+    db_filter = {"chat_id": chat_id}
+    if feed_type is not None:
+        db_filter["feed_type"] = feed_type
+    conditions = []
+    if name_ranges:
+        conditions.append({"$or": [_name_range_filter(*name_range) for name_range in name_ranges]})
+    if name_prefix:
+        conditions.append({"feed_name": {"$regex": f"^{escape(name_prefix)}", "$options": "i"}})
+    if after:
+        conditions.append(_feed_key_filter(after, "$gt"))
+    if before:
+        conditions.append(_feed_key_filter(before, "$lt"))
+    if conditions:
+        db_filter["$and"] = conditions
+    documents = find_many(
+        db_filter,
+        projection=_FEEDS_PAGE_PROJECTION,
+        sort=_FEEDS_PAGE_REVERSED_SORT if before else _FEEDS_PAGE_SORT,
+        limit=limit,
+    )
+    feeds = [(document["feed_type"], document["feed_name"]) async for document in documents]
+    # Page before a given feed is read backward, but it's still returned in ascending order.
+    return feeds[::-1] if before else feeds
+
+
+def _name_range_filter(start: str, end: str | None) -> dict[str, Any]:
+    return {"feed_name": {"$gte": start, "$lt": end} if end else {"$gte": start}}
+
+
+def _feed_key_filter(key: tuple[str, str], operator: str) -> dict[str, Any]:
+    feed_name, feed_type = key
+    return {
+        "$or": [
+            {"feed_name": {operator: feed_name}},
+            {"feed_name": feed_name, "feed_type": {operator: feed_type}},
+        ]
+    }
+
+
+async def get_latest_entry_data(
+    chat_id: int, feed_type: str, feed_name: str
+) -> tuple[str, struct_time]:
+    """Return latest stored entry link and date for given feed"""
+    if WORKERS_ENABLED:
+        return await _find_feed(chat_id, feed_type, feed_name) or (None, None)
+    return await _get_feed(chat_id, feed_type, feed_name) or (None, None)
+
+
+async def feed_is_already_stored(chat_id: int, feed_type: str, feed_name: str) -> bool:
     """Check if given feed is already stored in the DB."""
-    logger.info(f"[{chat_id}] Checking for [{feed_type}] [{feed_name}]")
-    return exists({"chat_id": chat_id, "feed_type": feed_type, "feed_name": feed_name})
+    return await _get_feed(chat_id, feed_type, feed_name) is not None
+
+
+async def _get_feed(chat_id: int, feed_type: str, feed_name: str) -> tuple[str, struct_time] | None:
+    # Both existence and latest entry of a feed are cached together, None for missing feeds.
+    # Cached latest entry is used only for existence when it's updated by workers.
+    if (feed := _chat_cache.get(chat_id, _FEEDS, (feed_type, feed_name))) is not MISSING:
+        return feed
+    version = _chat_cache.version(chat_id)
+    feed = await _find_feed(chat_id, feed_type, feed_name)
+    _chat_cache.put(chat_id, _FEEDS, (feed_type, feed_name), feed, version)
+    return feed
+
+
+async def _find_feed(
+    chat_id: int, feed_type: str, feed_name: str
+) -> tuple[str, struct_time] | None:
+    logger.info(f"[{chat_id}] Getting latest entry data for [{feed_type}] [{feed_name}]")
+    document = await find_one({"chat_id": chat_id, "feed_type": feed_type, "feed_name": feed_name})
+    if not document:
+        return None
+    return document.get("latest_link"), _parse_date(document.get("latest_date"))
 
 
-def chat_has_stored_feeds(chat_id: int) -> bool:
+async def chat_has_stored_feeds(chat_id: int) -> bool:
     """Check if given chat has any data stored in the DB."""
+    if (types := _chat_cache.get(chat_id, _TYPES)) is not MISSING:
+        return bool(types)
     logger.info(f"[{chat_id}] Checking if chat has any feeds")
-    return exists({"chat_id": chat_id})
+    return await exists({"chat_id": chat_id})
 
 
-def store_feed_data(
+async def store_feed_data(
     chat_id: int,
     feed_name: str,
     feed_type: str,
@@ -78,38 +278,380 @@ def store_feed_data(
         "latest_link": latest_link,
         "latest_date": latest_date,
     }
-    insert_result = insert_one(document)
+    insert_result = await insert_one(document)
     logger.info(f"[{chat_id}] Insert acknowledged=[{insert_result.acknowledged}]")
+    _invalidate_listed_feeds(chat_id)
+    _chat_cache.put(chat_id, _FEEDS, (feed_type, feed_name), (latest_link, latest_date))
 
 
-def update_stored_latest_data(
+async def update_all_stored_latest_data(
+    latest_data: list[tuple[int, str, str, str, str, str, struct_time]],
+) -> list[bool]:
+    """
+    Update latest data for multiple feeds in the DB, using a single bulk write.
+    Each feed consists of chat ID, feed type, feed name, latest ID it was read with,
+    and new latest ID, link and date.
+    Feed is updated only if its latest ID wasn't changed since it was read, e.g. by another worker.
+    Return whether each feed was updated, in the same order.
+    """
+    logger.info(f"Updating latest item data for [{len(latest_data)}] feeds")
+    # Feeds updated by this write are marked with its token, so they can be told apart from
+    # feeds updated meanwhile by another process to the same latest ID.
+    token = uuid4().hex
+    result = await update_many([_latest_data_update(*data, token) for data in latest_data])
+    logger.info(f"Update acknowledged=[{result.acknowledged}] count=[{result.matched_count}]")
+    if result.matched_count == len(latest_data):
+        updated = [True] * len(latest_data)
+    else:
+        updated = await _find_updated_feeds(latest_data, token)
+    for data, is_updated in zip(latest_data, updated):
+        chat_id, feed_type, feed_name, _, _, latest_link, latest_date = data
+        if is_updated:
+            _chat_cache.replace(chat_id, _FEEDS, (feed_type, feed_name), (latest_link, latest_date))
+    return updated
+
+
+def _latest_data_update(
     chat_id: int,
     feed_type: str,
     feed_name: str,
+    previous_id: str,
     latest_id: str,
     latest_link: str,
     latest_date: struct_time,
-) -> None:
-    """Update "latest_id" for a given feed in the DB."""
-    logger.info(f"[{chat_id}] Updating latest item ID [{feed_type}] [{feed_name}] [{latest_id}]")
-    update_one(
-        {"chat_id": chat_id, "feed_type": feed_type, "feed_name": feed_name},
-        {"$set": {"latest_id": latest_id, "latest_link": latest_link, "latest_date": latest_date}},
+    token: str,
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    return (
+        {
+            "chat_id": chat_id,
+            "feed_type": feed_type,
+            "feed_name": feed_name,
+            "latest_id": previous_id,
+        },
+        {
+            "$set": {
+                "latest_id": latest_id,
+                "latest_link": latest_link,
+                "latest_date": latest_date,
+                "latest_token": token,
+            }
+        },
     )
 
 
-def remove_stored_feed(chat_id: int, feed_type: str, feed_name: str) -> None:
+async def _find_updated_feeds(
+    latest_data: list[tuple[int, str, str, str, str, str, struct_time]], token: str
+) -> list[bool]:
+    chat_ids = list({chat_id for chat_id, *_ in latest_data})
+    documents = find_many(
+        {"chat_id": {"$in": chat_ids}, "latest_token": token}, projection=_FEED_KEY_PROJECTION
+    )
+    updated_keys = {
+        (document["chat_id"], document["feed_type"], document["feed_name"])
+        async for document in documents
+    }
+    return [
+        (chat_id, feed_type, feed_name) in updated_keys
+        for chat_id, feed_type, feed_name, *_ in latest_data
+    ]
+
+
+async def get_feed_state(
+    feed_link: str,
+) -> tuple[str | None, str | None, float | None, float | None]:
+    """
+    Return stored state of a given feed link:
+    HTTP validators (ETag and Last-Modified), check interval and timestamp of the next check.
+    """
+    logger.info(f"Getting state for [{feed_link}]")
+    document = await find_one({"feed_link": feed_link}, collection=DB_FEED_STATE_NAME) or {}
+    return (
+        document.get("etag"),
+        document.get("modified"),
+        document.get("interval"),
+        document.get("next_check"),
+    )
+
+
+async def store_feed_validators(feed_link: str, etag: str | None, modified: str | None) -> None:
+    """Store HTTP validators (ETag and Last-Modified) for a given feed link."""
+    logger.info(f"Storing validators for [{feed_link}] etag=[{etag}] modified=[{modified}]")
+    await update_one(
+        {"feed_link": feed_link},
+        {"$set": {"etag": etag, "modified": modified}},
+        collection=DB_FEED_STATE_NAME,
+        upsert=True,
+    )
+
+
+async def store_feed_schedule(feed_link: str, interval: float, next_check: float) -> None:
+    """Store check interval and timestamp of the next check for a given feed link."""
+    logger.info(f"Storing schedule for [{feed_link}] interval=[{interval}]")
+    await update_one(
+        {"feed_link": feed_link},
+        {"$set": {"interval": interval, "next_check": next_check}},
+        collection=DB_FEED_STATE_NAME,
+        upsert=True,
+    )
+
+
+async def get_stored_file_id(bot_id: int, digest: str) -> str | None:
+    """
+    Return Telegram file ID of a file with a given content digest, already uploaded by a given bot.
+    File IDs are valid only for the bot which uploaded the file, so they're stored per bot.
+    """
+    logger.info(f"Getting file ID for [{digest}] uploaded by [{bot_id}]")
+    document = await find_one({"digest": _file_key(bot_id, digest)}, collection=DB_FILE_IDS_NAME)
+    return (document or {}).get("file_id")
+
+
+async def store_file_id(bot_id: int, digest: str, file_id: str) -> None:
+    """Store Telegram file ID of a file with a given content digest, uploaded by a given bot."""
+    logger.info(f"Storing file ID for [{digest}] uploaded by [{bot_id}]")
+    await update_one(
+        {"digest": _file_key(bot_id, digest)},
+        {"$set": {"file_id": file_id}},
+        collection=DB_FILE_IDS_NAME,
+        upsert=True,
+    )
+
+
+async def remove_stored_feed(chat_id: int, feed_type: str, feed_name: str) -> None:
     """Remove given feed from the DB."""
     logger.info(f"[{chat_id}] Deleting [{feed_type}] [{feed_name}]")
-    result = delete_many({"chat_id": chat_id, "feed_type": feed_type, "feed_name": feed_name})
+    result = await delete_many({"chat_id": chat_id, "feed_type": feed_type, "feed_name": feed_name})
     _log_delete_result(chat_id, result)
+    _invalidate_listed_feeds(chat_id)
+    _chat_cache.put(chat_id, _FEEDS, (feed_type, feed_name), None)
 
 
-def remove_stored_chat_data(chat_id: int) -> None:
+async def remove_stored_chat_data(chat_id: int) -> None:
     """Remove all data for a given chat from the DB."""
     logger.info(f"[{chat_id}] Deleting all data for chat")
-    result_feeds = delete_many({"chat_id": chat_id})
+    result_feeds = await delete_many({"chat_id": chat_id})
     _log_delete_result(chat_id, result_feeds)
+    _chat_cache.invalidate(chat_id)
+    result_outbox = await delete_many({"chat_id": chat_id}, collection=DB_OUTBOX_NAME)
+    _log_delete_result(chat_id, result_outbox)
+
+
+async def store_outbox_updates(
+    updates: list[tuple[int, str, str, str, str | None, str | None, list[str]]],
+) -> list[Any]:
+    """
+    Store parsed updates waiting to be sent, all in a single bulk insert.
+    Each update consists of chat ID, feed type, feed name, link, title, description and media links.
+    Return IDs of stored updates, in the same order.
+    """
+    logger.info(f"Storing [{len(updates)}] updates in outbox")
+    created_at = time()
+    documents = [
+        {
+            "chat_id": chat_id,
+            "feed_type": feed_type,
+            "feed_name": feed_name,
+            "created_at": created_at,
+            "link": link,
+            "title": title,
+            "description": description,
+            "media_links": media_links,
+            "attempts": 0,
+            "next_attempt_at": created_at,
+        }
+        for chat_id, feed_type, feed_name, link, title, description, media_links in updates
+    ]
+    result = await insert_many(documents, collection=DB_OUTBOX_NAME)
+    return result.inserted_ids
+
+
+async def get_all_outbox_updates(
+    created_before: float, postponed_only: bool = False
+) -> AsyncIterator[tuple[Any, int, str, str, str, str | None, str | None, list[str]]]:
+    """
+    Stream all updates stored in outbox before a given timestamp, sorted by chat and creation time.
+    Only updates which are due are returned, optionally only ones postponed after failed attempts.
+    Each update consists of its ID, chat ID, feed type, feed name, link, title, description
+    and media links.
+    """
+    logger.info("Getting all updates from outbox")
+    db_filter = {
+        "created_at": {"$lt": created_before},
+        "next_attempt_at": {"$not": {"$gt": time()}},
+    }
+    if postponed_only:
+        db_filter["attempts"] = {"$gt": 0}
+    documents = find_many(db_filter, collection=DB_OUTBOX_NAME, sort=_OUTBOX_SORT)
+    async for document in documents:
+        yield (
+            document["_id"],
+            document["chat_id"],
+            document["feed_type"],
+            document["feed_name"],
+            document["link"],
+            document.get("title"),
+            document.get("description"),
+            document.get("media_links", []),
+        )
+
+
+async def remove_outbox_update(outbox_id: Any) -> None:
+    """Remove already sent update from outbox."""
+    await delete_many({"_id": outbox_id}, collection=DB_OUTBOX_NAME)
+
+
+async def postpone_outbox_update(outbox_id: Any, retry_delay: float) -> int:
+    """
+    Postpone update from outbox which couldn't be sent, delay is doubled with every failed attempt.
+    Return number of failed attempts, including this one, or 0 if update isn't in outbox anymore.
+    """
+    # Both fields are computed in a single atomic update, from the previous number of attempts.
+    attempts = {"$ifNull": ["$attempts", 0]}
+    delay = {"$multiply": [retry_delay, {"$pow": [2, attempts]}]}
+    update = [
+        {
+            "$set": {
+                "attempts": {"$add": [attempts, 1]},
+                "next_attempt_at": {"$add": [time(), delay]},
+            }
+        }
+    ]
+    document = await update_one({"_id": outbox_id}, update, collection=DB_OUTBOX_NAME)
+    return document.get("attempts", 0) + 1 if document else 0
+
+
+async def get_all_persisted_data(kind: str) -> AsyncIterator[tuple[Any, Any, float | None]]:
+    """Stream all bot persistence data of a given kind, as keys, data and their access times."""
+    logger.info(f"Getting all persisted [{kind}]")
+    async for document in find_many({"kind": kind}, collection=DB_PERSISTENCE_NAME):
+        yield document["key"], document["data"], document.get("access_time")
+
+
+async def store_persisted_data(kind: str, data: list[tuple[Any, Any, float | None]]) -> None:
+    """
+    Store bot persistence data of a given kind, given as keys, data and their access times.
+    Only given keys are written, all in a single bulk write.
+    """
+    if not data:
+        return
+    logger.info(f"Storing [{len(data)}] persisted [{kind}]")
+    updates = [
+        ({"kind": kind, "key": key}, {"$set": {"data": value, "access_time": access_time}})
+        for key, value, access_time in data
+    ]
+    await update_many(updates, collection=DB_PERSISTENCE_NAME, upsert=True)
+
+
+async def update_persisted_access_times(kind: str, access_times: list[tuple[Any, float]]) -> None:
+    """Update only access times of already stored bot persistence data, in a single bulk write."""
+    if not access_times:
+        return
+    updates = [
+        ({"kind": kind, "key": key}, {"$set": {"access_time": access_time}})
+        for key, access_time in access_times
+    ]
+    await update_many(updates, collection=DB_PERSISTENCE_NAME)
+
+
+async def remove_persisted_data(kind: str, keys: list[Any]) -> None:
+    """Remove bot persistence data of a given kind with given keys."""
+    if not keys:
+        return
+    logger.info(f"Removing [{len(keys)}] persisted [{kind}]")
+    await delete_many({"kind": kind, "key": {"$in": keys}}, collection=DB_PERSISTENCE_NAME)
+
+
+async def store_worker_heartbeat(worker_id: str, expires_at: float) -> None:
+    """Mark a given worker as alive until a given timestamp."""
+    await update_one(
+        {"kind": _WORKER_LEASE, "key": worker_id},
+        {"$set": {"expires_at": expires_at}},
+        collection=DB_LEASES_NAME,
+        upsert=True,
+    )
+
+
+async def remove_worker_heartbeat(worker_id: str) -> None:
+    """Remove heartbeat of a stopped worker, so others don't wait for it to expire."""
+    await delete_many({"kind": _WORKER_LEASE, "key": worker_id}, collection=DB_LEASES_NAME)
+
+
+async def remove_expired_worker_heartbeats(now: float) -> None:
+    """Remove heartbeats of workers which stopped without removing them, e.g. crashed."""
+    await delete_many(
+        {"kind": _WORKER_LEASE, "expires_at": {"$lte": now}}, collection=DB_LEASES_NAME
+    )
+
+
+async def get_live_workers(now: float) -> list[str]:
+    """Return IDs of all workers which heartbeats haven't expired at a given timestamp."""
+    return await distinct(
+        "key", {"kind": _WORKER_LEASE, "expires_at": {"$gt": now}}, collection=DB_LEASES_NAME
+    )
+
+
+async def create_shard_leases(shards: int) -> None:
+    """Create unclaimed leases for a given number of shards, keeping already existing ones."""
+    updates = [
+        (
+            {"kind": _SHARD_LEASE, "key": shard},
+            {"$setOnInsert": {"owner": None, "expires_at": 0}},
+        )
+        for shard in range(shards)
+    ]
+    await update_many(updates, collection=DB_LEASES_NAME, upsert=True)
+
+
+async def get_claimable_shards(shards: int, now: float) -> list[int]:
+    """Return shards which leases are unclaimed or expired at a given timestamp."""
+    documents = find_many(
+        {"kind": _SHARD_LEASE, "key": {"$lt": shards}, "expires_at": {"$lte": now}},
+        collection=DB_LEASES_NAME,
+        projection={"_id": False, "key": True},
+        sort=[("key", ASCENDING)],
+    )
+    return [document["key"] async for document in documents]
+
+
+async def claim_shard_lease(shard: int, owner: str, now: float, expires_at: float) -> bool:
+    """
+    Claim or renew a lease of a given shard until a given timestamp.
+    Lease is claimed only if it's already owned by a given owner, unclaimed or expired,
+    so only a single owner can hold it at a time. Return whether lease was claimed.
+    """
+    document = await update_one(
+        {
+            "kind": _SHARD_LEASE,
+            "key": shard,
+            "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}],
+        },
+        {"$set": {"owner": owner, "expires_at": expires_at}},
+        collection=DB_LEASES_NAME,
+    )
+    return document is not None
+
+
+async def release_shard_leases(shards: list[int], owner: str) -> None:
+    """Release leases of given shards held by a given owner, so others can claim them."""
+    if not shards:
+        return
+    logger.info(f"Releasing leases of [{len(shards)}] shards held by [{owner}]")
+    updates = [
+        (
+            {"kind": _SHARD_LEASE, "key": shard, "owner": owner},
+            {"$set": {"owner": None, "expires_at": 0}},
+        )
+        for shard in shards
+    ]
+    await update_many(updates, collection=DB_LEASES_NAME)
+
+
+def _file_key(bot_id: int, digest: str) -> str:
+    return f"{bot_id}:{digest}"
+
+
+def _invalidate_listed_feeds(chat_id: int) -> None:
+    _chat_cache.invalidate(chat_id, _TYPES)
+    _chat_cache.invalidate(chat_id, _PAGES)
 
 
 def _parse_date(raw_date: list[int]) -> struct_time:
@@ -0,0 +1,56 @@
+"""
+Module calculating how often a given feed should be checked for updates.
+
+Interval is based on how often entries were published in the feed,
+it grows for feeds without any new entries and respects caching hints send by the server,
+either "ttl" element of the RSS feed or "max-age" from "Cache-Control" header.
+Final interval is always kept between configured minimum and maximum.
+"""
+
+from calendar import timegm
+from re import IGNORECASE, compile
+from statistics import median
+
+from feedparser.util import FeedParserDict
+
+from settings import FEED_IDLE_BACKOFF, FEED_MAX_INTERVAL, FEED_MIN_INTERVAL
+
+MAX_ENTRIES_FOR_CADENCE = 20
+
+_MAX_AGE_PATTERN = compile(r"max-age\s*=\s*(\d+)", IGNORECASE)
+
+
+def get_check_interval(
+    feed: FeedParserDict, previous_interval: float | None, has_new_entries: bool
+) -> float:
+    """Get interval in seconds after which given feed should be checked again."""
+    interval = _get_publish_interval(feed) or previous_interval or FEED_MIN_INTERVAL
+    if not has_new_entries and previous_interval:
+        interval = max(interval, previous_interval * FEED_IDLE_BACKOFF)
+    interval = max(interval, _get_cache_hint(feed))
+    return min(max(interval, FEED_MIN_INTERVAL), FEED_MAX_INTERVAL)
+
+
+def _get_publish_interval(feed: FeedParserDict) -> float | None:
+    dates = [date for entry in feed.get("entries", []) if (date := entry.get("published_parsed"))]
+    timestamps = sorted((timegm(date) for date in dates), reverse=True)[:MAX_ENTRIES_FOR_CADENCE]
+    gaps = [newer - older for newer, older in zip(timestamps, timestamps[1:]) if newer > older]
+    return median(gaps) if gaps else None
+
+
+def _get_cache_hint(feed: FeedParserDict) -> float:
+    # RSS "ttl" element is defined in minutes.
+    ttl = _parse_number(feed.get("feed", {}).get("ttl"))
+    ttl_hint = ttl * 60 if ttl else 0
+    cache_control = feed.get("headers", {}).get("cache-control", "")
+    max_age = (
+        _parse_number(match.group(1)) if (match := _MAX_AGE_PATTERN.search(cache_control)) else 0
+    )
+    return max(ttl_hint, max_age or 0)
+
+
+def _parse_number(value: str | None) -> int | None:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
@@ -5,17 +5,60 @@ Extracted information contains:
  - link to the item
  - description, which will be used as an update's message
  - links to photos and videos
+
+Entry summary is parsed as HTML only once, both description and media links are extracted
+from the same parsed tree.
+When "lxml" is installed it's used as a faster HTML parser.
+
+All filters of a feed type are compiled at startup into a single regular expression,
+so each field is filtered in a single pass, regardless of number of filters.
+Empty filters are skipped, since they would match everywhere.
 """
 
-from functools import reduce
-from typing import Any
+from importlib.util import find_spec
+from re import Pattern, compile, escape
+from typing import Any, NamedTuple
 
 from bs4 import BeautifulSoup
 from feedparser.util import FeedParserDict
+from loguru import logger
 
 from settings import RSS_FEEDS
 
 ATTRS_FOR_DESCRIPTION = ["title", "alt"]
+MEDIA_TAGS = ["img", "source"]
+
+_HTML_PARSER = "lxml" if find_spec("lxml") else "html.parser"
+
+
+class ParsedEntry(NamedTuple):
+    link: str
+    title: str | None
+    description: str | None
+    media_links: list[str]
+
+
+class _ParsedSummary(NamedTuple):
+    description: str | None
+    media_links: list[str]
+
+
+class _Filter(NamedTuple):
+    pattern: str
+    regex: bool = False
+    ignore_case: bool = False
+
+
+def parse_entry(entry: FeedParserDict, feed_type: str) -> ParsedEntry:
+    """Parse all data from a given entry, parsing its summary only once."""
+    summary_is_needed = RSS_FEEDS[feed_type].get("show_description") or "media_content" not in entry
+    summary = _parse_summary(entry.get("summary")) if summary_is_needed else None
+    return ParsedEntry(
+        parse_link(entry),
+        parse_title(entry, feed_type),
+        _parse_description(summary, feed_type),
+        _parse_media_links(entry, summary),
+    )
 
 
 def parse_link(entry: FeedParserDict) -> str:
@@ -23,38 +66,88 @@ def parse_link(entry: FeedParserDict) -> str:
 
 
 def parse_description(entry: FeedParserDict, feed_type: str) -> str | None:
-    if not (feed_params := RSS_FEEDS[feed_type]).get("show_description") or not entry.summary:
-        return None
-    description = _get_description_from_summary(entry.summary)
-    return _filter_text(description, feed_params)
+    return _parse_description(_parse_summary(entry.summary), feed_type)
 
 
 def parse_title(entry: FeedParserDict, feed_type: str) -> str:
-    if (feed_params := RSS_FEEDS[feed_type]).get("show_title") and (title := entry.title):
-        return f"<b>{_filter_text(title, feed_params).strip()}</b>"
+    if RSS_FEEDS[feed_type].get("show_title") and (title := entry.title):
+        return f"<b>{_filter_text(title, feed_type).strip()}</b>"
 
 
-def _get_description_from_summary(summary: str) -> str | None:
-    bs = BeautifulSoup(summary, "html.parser")
-    return bs.get_text().strip() or next(
+def parse_media_links(entry: FeedParserDict) -> list[str]:
+    return _parse_media_links(entry, _parse_summary(entry.get("summary")))
+
+
+def _parse_description(summary: _ParsedSummary, feed_type: str) -> str | None:
+    feed_params = RSS_FEEDS[feed_type]
+    if not feed_params.get("show_description") or not summary or summary.description is None:
+        return None
+    return _filter_text(summary.description, feed_type)
+
+
+def _parse_media_links(entry: FeedParserDict, summary: _ParsedSummary | None) -> list[str]:
+    if "media_content" in entry:
+        return [media["url"] for media in entry.media_content if "url" in media]
+    return summary.media_links if summary else []
+
+
+def _parse_summary(summary: str | None) -> _ParsedSummary | None:
+    if not summary:
+        return None
+    bs = BeautifulSoup(summary, _HTML_PARSER)
+    attribute_texts = {}
+    media_links = []
+    # Single walk through all tags collects both fallback description and media links.
+    for tag in bs.find_all(True):
+        for attribute in ATTRS_FOR_DESCRIPTION:
+            if attribute not in attribute_texts and tag.has_attr(attribute):
+                attribute_texts[attribute] = tag.get(attribute).strip()
+        if tag.name in MEDIA_TAGS and (media_link := tag.get("src")):
+            media_links.append(media_link)
+    description = bs.get_text().strip() or next(
         (
-            matching_tag.get(attribute).strip()
+            attribute_texts[attribute]
             for attribute in ATTRS_FOR_DESCRIPTION
-            if (matching_tag := bs.find(lambda tag: tag.has_attr(attribute)))
+            if attribute in attribute_texts
         ),
         None,
     )
+    return _ParsedSummary(description, media_links)
 
 
-def _filter_text(text: str, feed_params: dict[str, Any]) -> str:
-    filters = feed_params.get("filters", [])
-    return reduce(lambda text, filter: text.replace(filter, ""), filters, text)
+def _filter_text(text: str, feed_type: str) -> str:
+    if (filters := _FILTERS.get(feed_type)) is None:
+        return text
+    return filters.sub("", text)
 
 
-def parse_media_links(entry: FeedParserDict) -> list[str]:
-    if "media_content" in entry:
-        return [media["url"] for media in entry.media_content if "url" in media]
-    media_source = BeautifulSoup(entry.summary, "html.parser")
-    media_elements = media_source.find_all(["img", "source"])
-    media_links = [media.get("src") for media in media_elements]
-    return [link for link in media_links if link]
+def _compile_all_filters(rss_feeds: dict[str, dict[str, Any]]) -> dict[str, Pattern]:
+    compiled_filters = {}
+    for feed_type, feed_params in rss_feeds.items():
+        filters = [_to_filter(filter) for filter in feed_params.get("filters") or []]
+        if empty_filters := [filter for filter in filters if not filter.pattern]:
+            logger.warning(f"Skipping [{len(empty_filters)}] empty filters of [{feed_type}]")
+            filters = [filter for filter in filters if filter.pattern]
+        if filters:
+            compiled_filters[feed_type] = _compile_filters(filters)
+    return compiled_filters
+
+
+def _to_filter(filter: str | dict[str, Any]) -> _Filter:
+    if isinstance(filter, str):
+        return _Filter(filter)
+    return _Filter(filter["pattern"], bool(filter.get("regex")), bool(filter.get("ignore_case")))
+
+
+def _compile_filters(filters: list[_Filter]) -> Pattern:
+    # Longer plain strings go first, so they are removed whole when they contain shorter ones.
+    ordered_filters = sorted(filters, key=lambda filter: filter.regex or -len(filter.pattern))
+    alternatives = []
+    for pattern, regex, ignore_case in ordered_filters:
+        alternative = pattern if regex else escape(pattern)
+        alternatives.append(f"(?i:{alternative})" if ignore_case else f"(?:{alternative})")
+    return compile("|".join(alternatives))
+
+
+# Filters of all configured feed types are compiled at startup, so invalid patterns fail early.
+_FILTERS = _compile_all_filters(RSS_FEEDS)
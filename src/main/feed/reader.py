@@ -1,22 +1,100 @@
 """
 Module handling all RSS requests.
+
+Feeds are downloaded asynchronously through a pooled HTTP client,
+only parsing already downloaded content is done by feedparser, in a separate worker pool.
+This way neither network nor parsing blocks the main event loop.
 """
 
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
 from itertools import takewhile
 from time import struct_time
 
-from feedparser import parse
+from feedparser import USER_AGENT, parse
+from feedparser.http import ACCEPT_HEADER
 from feedparser.util import FeedParserDict
+from httpx import HTTPError, InvalidURL, Response
 from loguru import logger
 
-from settings import RSS_FEEDS
+from settings import (
+    RSS_FEEDS,
+    RSS_MAX_CONNECTIONS,
+    RSS_MAX_CONNECTIONS_PER_HOST,
+    RSS_PARSER_WORKERS,
+    RSS_TIMEOUT,
+)
+from web.client import LimitedClient
+
+_client = LimitedClient(RSS_MAX_CONNECTIONS, RSS_MAX_CONNECTIONS_PER_HOST, RSS_TIMEOUT)
+_parser_executor = ThreadPoolExecutor(RSS_PARSER_WORKERS, thread_name_prefix="feed-parser")
+
+
+def get_feed_link(feed_type: str, feed_name: str) -> str:
+    """Get URL for given feed type and feed name, based on RSS links YAML."""
+    return RSS_FEEDS[feed_type]["url"].format(source_pattern=feed_name)
 
 
-def get_parsed_feed(feed_type: str, feed_name: str) -> FeedParserDict:
-    """Parse given feed type and feed name into FeedParserDict, based on URL from RSS links YAML."""
-    feed_link = RSS_FEEDS[feed_type]["url"].format(source_pattern=feed_name)
+async def get_parsed_feed(
+    feed_type: str,
+    feed_name: str,
+    etag: str | None = None,
+    modified: str | None = None,
+) -> FeedParserDict:
+    """
+    Parse given feed type and feed name into FeedParserDict, based on URL from RSS links YAML.
+
+    Optional "etag" and "modified" validators are send with the request,
+    so the server can respond with 304 when the feed didn't change.
+    New validators are available in "etag" and "modified" fields of the returned feed.
+    """
+    feed_link = get_feed_link(feed_type, feed_name)
     logger.info(f"Parsed [{feed_name}][{feed_type}] to link [{feed_link}]")
-    return parse(feed_link)
+    try:
+        response = await _client.get(feed_link, headers=_prepare_headers(etag, modified))
+    except (HTTPError, InvalidURL) as error:
+        # Invalid URL, e.g. from a feed name with special characters, is handled the same
+        # as a feed which can't be downloaded, so it's reported as not existing.
+        logger.warning(f"Could not download feed [{feed_link}]: [{error!r}]")
+        return FeedParserDict(href=feed_link, status=None, entries=[], bozo=1, bozo_exception=error)
+    if response.status_code == HTTPStatus.NOT_MODIFIED:
+        return FeedParserDict(
+            href=feed_link, status=response.status_code, headers=response.headers, entries=[]
+        )
+    feed = await _parse_response(response)
+    feed["href"] = feed_link
+    feed["status"] = response.status_code
+    feed["etag"] = response.headers.get("etag")
+    feed["modified"] = response.headers.get("last-modified")
+    return feed
+
+
+async def close_feed_client() -> None:
+    """Close all pooled connections used for downloading feeds."""
+    await _client.close()
+
+
+def _prepare_headers(etag: str | None, modified: str | None) -> dict[str, str]:
+    headers = {"user-agent": USER_AGENT, "accept": ACCEPT_HEADER}
+    if etag:
+        headers["if-none-match"] = etag
+    if modified:
+        headers["if-modified-since"] = modified
+    return headers
+
+
+async def _parse_response(response: Response) -> FeedParserDict:
+    # Content location is used by feedparser to resolve relative links in the feed.
+    response_headers = {"content-location": str(response.url), **response.headers}
+    parse_content = partial(parse, response.content, response_headers=response_headers)
+    return await get_running_loop().run_in_executor(_parser_executor, parse_content)
+
+
+def feed_is_not_modified(feed: FeedParserDict) -> bool:
+    """Check whether server responded that the feed didn't change since the last request."""
+    return feed.get("status") == 304
 
 
 def feed_is_valid(feed: FeedParserDict) -> bool:
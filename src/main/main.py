@@ -1,20 +1,37 @@
 """
-Main module, configures logging, initialized the DB and starts the bot.
+Main module, configures logging and starts the bot, or a worker process checking for updates.
+DB is initialized by the bot or worker itself, within its event loop.
 """
 
+from argparse import ArgumentParser
 from logging.handlers import RotatingFileHandler
 
 from loguru import logger
 
 from bot.telegram_bot import run_bot
-from db.client import initialize_db
+from bot.worker import run_worker
 from settings import BACKUP_COUNT, LOG_PATH, MAX_BYTES
 
 
 def _main() -> None:
+    mode = _parse_arguments()
     _configure_logging()
-    initialize_db()
-    run_bot()
+    if mode == "worker":
+        run_worker()
+    else:
+        run_bot()
+
+
+def _parse_arguments() -> str:
+    parser = ArgumentParser(description="RSS reader Telegram bot")
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        choices=["bot", "worker"],
+        default="bot",
+        help="run the bot itself, or a worker process only checking feeds from its shards",
+    )
+    return parser.parse_args().mode
 
 
 def _configure_logging() -> None:
@@ -37,21 +37,60 @@ def _load_config(*keys: str) -> Any:
 # telegram
 TOKEN = _load_config("telegram", "token")
 ALLOWED_USERNAMES = _load_config("telegram", "allowed_usernames")
-PERSISTENCE_FILE = _load_config("telegram", "persistence_file")
+CALLBACK_DATA_TTL = _load_config("telegram", "callback_data_ttl")
+SUBSCRIPTIONS_PAGE_SIZE = _load_config("telegram", "subscriptions_page_size")
 
 # telegram updates
 LOOKUP_INTERVAL = _load_config("telegram", "updates", "lookup_interval")
 LOOKUP_INTERVAL_RANDOMNESS = _load_config("telegram", "updates", "lookup_interval_randomness")
 LOOKUP_INITIAL_DELAY = _load_config("telegram", "updates", "lookup_initial_delay")
-LOOKUP_FEED_DELAY = _load_config("telegram", "updates", "lookup_feed_delay")
-LOOKUP_FEED_DELAY_RANDOMNESS = _load_config("telegram", "updates", "lookup_feed_delay_randomness")
+FETCH_CONCURRENCY = _load_config("telegram", "updates", "fetch_concurrency")
+FETCH_RATE = _load_config("telegram", "updates", "fetch_rate")
+FETCH_HOST_RATE = _load_config("telegram", "updates", "fetch_host_rate")
+FETCH_QUEUE_SIZE = _load_config("telegram", "updates", "fetch_queue_size")
 QUIET_HOURS = _load_config("telegram", "updates", "quiet_hours")
+FEED_MIN_INTERVAL = _load_config("telegram", "updates", "min_feed_interval")
+FEED_MAX_INTERVAL = _load_config("telegram", "updates", "max_feed_interval")
+FEED_IDLE_BACKOFF = _load_config("telegram", "updates", "feed_idle_backoff")
 
 # telegram messages
 MAX_MESSAGE_SIZE = _load_config("telegram", "messages", "max_message_size")
 MAX_MEDIA_ITEMS_PER_MESSAGE = _load_config("telegram", "messages", "max_media_items_per_message")
 PIN_VIDEOS = _load_config("telegram", "messages", "pin_videos")
 DEFAULT_IMAGE_PATH = _load_config("telegram", "messages", "default_image_path")
+MEDIA_MAX_CONNECTIONS = _load_config("telegram", "messages", "media_max_connections")
+MEDIA_MAX_CONNECTIONS_PER_HOST = _load_config(
+    "telegram", "messages", "media_max_connections_per_host"
+)
+MEDIA_TIMEOUT = _load_config("telegram", "messages", "media_timeout")
+MEDIA_MAX_SIZE = _load_config("telegram", "messages", "media_max_size")
+MEDIA_CACHE_PATH = _load_config("telegram", "messages", "media_cache_path")
+MEDIA_CACHE_MAX_SIZE = _load_config("telegram", "messages", "media_cache_max_size")
+MEDIA_CACHE_TTL = _load_config("telegram", "messages", "media_cache_ttl")
+MEDIA_EXECUTOR = _load_config("telegram", "messages", "media_executor")
+MEDIA_EXECUTOR_WORKERS = _load_config("telegram", "messages", "media_executor_workers")
+
+# telegram update pipeline
+PIPELINE_PARSE_WORKERS = _load_config("telegram", "pipeline", "parse_workers")
+PIPELINE_MEDIA_WORKERS = _load_config("telegram", "pipeline", "media_workers")
+PIPELINE_SEND_WORKERS = _load_config("telegram", "pipeline", "send_workers")
+PIPELINE_QUEUE_SIZE = _load_config("telegram", "pipeline", "queue_size")
+PIPELINE_METRICS_INTERVAL = _load_config("telegram", "pipeline", "metrics_interval")
+PIPELINE_OUTBOX_RETRY_DELAY = _load_config("telegram", "pipeline", "outbox_retry_delay")
+PIPELINE_OUTBOX_MAX_ATTEMPTS = _load_config("telegram", "pipeline", "outbox_max_attempts")
+
+# telegram workers
+WORKERS_ENABLED = _load_config("telegram", "workers", "enabled")
+WORKERS_SHARDS = _load_config("telegram", "workers", "shards")
+WORKERS_LEASE_TTL = _load_config("telegram", "workers", "lease_ttl")
+WORKERS_HEARTBEAT_INTERVAL = _load_config("telegram", "workers", "heartbeat_interval")
+WORKERS_OUTBOX_INTERVAL = _load_config("telegram", "workers", "outbox_interval")
+
+# telegram rate limits
+SEND_OVERALL_RATE = _load_config("telegram", "rate_limits", "overall_per_second")
+SEND_CHAT_RATE = _load_config("telegram", "rate_limits", "chat_per_second")
+SEND_GROUP_RATE_PER_MINUTE = _load_config("telegram", "rate_limits", "group_per_minute")
+SEND_MAX_RETRIES = _load_config("telegram", "rate_limits", "max_retries")
 
 # logging
 LOG_PATH = _load_config("logging", "log_path")
@@ -62,8 +101,20 @@ BACKUP_COUNT = _load_config("logging", "backup_count")
 DB_HOST = _load_config("database", "host")
 DB_PORT = _load_config("database", "port")
 DB_NAME = _load_config("database", "name")
+DB_BATCH_SIZE = _load_config("database", "batch_size")
+DB_CHAT_CACHE_SIZE = _load_config("database", "chat_cache_size")
+DB_CHAT_CACHE_VALUES = _load_config("database", "chat_cache_values")
 DB_FEEDS_NAME = _load_config("database", "feeds_name")
+DB_FEED_STATE_NAME = _load_config("database", "feed_state_name")
+DB_FILE_IDS_NAME = _load_config("database", "file_ids_name")
+DB_OUTBOX_NAME = _load_config("database", "outbox_name")
+DB_PERSISTENCE_NAME = _load_config("database", "persistence_name")
+DB_LEASES_NAME = _load_config("database", "leases_name")
 
 # rss
+RSS_MAX_CONNECTIONS = _load_config("rss", "max_connections")
+RSS_MAX_CONNECTIONS_PER_HOST = _load_config("rss", "max_connections_per_host")
+RSS_TIMEOUT = _load_config("rss", "timeout")
+RSS_PARSER_WORKERS = _load_config("rss", "parser_workers")
 with open(_load_config("rss", "feeds_yaml_filename"), "r") as feeds_yml:
     RSS_FEEDS = {name: data for name, data in safe_load(feeds_yml).items() if "url" in data}
@@ -0,0 +1,77 @@
+"""
+Module wrapping a pooled asynchronous HTTP client.
+
+All requests made through a single client share the same connection pool.
+Number of simultaneous requests is limited both in total and for each host separately,
+additional requests wait until one of the previous ones is finished.
+Limits of hosts are removed once they have no requests in progress or waiting.
+"""
+
+from asyncio import Semaphore
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Mapping
+
+from httpx import URL, AsyncClient, Limits, Response
+from loguru import logger
+
+
+class LimitedClient:
+    """Pooled "httpx.AsyncClient" with limits of simultaneous requests in total and per host."""
+
+    def __init__(self, max_connections: int, max_connections_per_host: int, timeout: float):
+        self._max_connections = max_connections
+        self._max_connections_per_host = max_connections_per_host
+        self._timeout = timeout
+        self._client: AsyncClient | None = None
+        self._semaphore = Semaphore(max_connections)
+        self._host_semaphores: dict[str, Semaphore] = {}
+        self._host_requests: Counter[str] = Counter()
+
+    async def get(self, url: str, headers: Mapping[str, str] = None) -> Response:
+        """Send GET request, waiting until both total and per host limits allow it."""
+        async with self._limit(url):
+            return await self._get_client().get(url, headers=headers)
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: Mapping[str, str] = None) -> AsyncIterator[Response]:
+        """
+        Send GET request with streamed response, waiting until both limits allow it.
+        Response body isn't loaded, it can be read in chunks within the context.
+        """
+        async with self._limit(url):
+            async with self._get_client().stream("GET", url, headers=headers) as response:
+                yield response
+
+    async def close(self) -> None:
+        """Close all pooled connections, client will be recreated on the next request."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _limit(self, url: str) -> AsyncIterator[None]:
+        host = URL(url).host
+        if (host_semaphore := self._host_semaphores.get(host)) is None:
+            host_semaphore = self._host_semaphores[host] = Semaphore(self._max_connections_per_host)
+        self._host_requests[host] += 1
+        try:
+            async with self._semaphore, host_semaphore:
+                yield
+        finally:
+            # Semaphore without any requests is the same as a new one.
+            self._host_requests[host] -= 1
+            if not self._host_requests[host]:
+                del self._host_requests[host]
+                del self._host_semaphores[host]
+
+    def _get_client(self) -> AsyncClient:
+        # Client is created lazily, so it's bound to the event loop actually sending requests.
+        if self._client is None:
+            logger.info(f"Creating HTTP client with [{self._max_connections}] connections")
+            self._client = AsyncClient(
+                limits=Limits(max_connections=self._max_connections),
+                timeout=self._timeout,
+                follow_redirects=True,
+            )
+        return self._client
@@ -0,0 +1,80 @@
+"""
+Module with a token bucket, limiting how often an action can be taken.
+
+Bucket is refilled with a constant rate, up to its capacity,
+so short bursts are allowed, while the long-term rate stays limited.
+Callers waiting for tokens are kept in a heap ordered by their priority,
+so more important actions aren't delayed by less important ones waiting longer.
+"""
+
+from asyncio import Event, sleep
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import monotonic
+from typing import NamedTuple
+
+
+class _Waiter(NamedTuple):
+    priority: int
+    order: int
+    woken: Event
+
+
+class TokenBucket:
+    """Asynchronous token bucket, refilled with "rate" tokens per second, up to "capacity"."""
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = monotonic()
+        self._waiters: list[_Waiter] = []
+        self._waiters_order = count()
+
+    async def acquire(self, priority: int = 0) -> None:
+        """
+        Take a single token, waiting until one is available.
+        Only the first waiting caller takes tokens, lower priority values go first,
+        callers with the same priority keep their order, so none of them is starved.
+        """
+        waiter = _Waiter(priority, next(self._waiters_order), Event())
+        heappush(self._waiters, waiter)
+        try:
+            while (wait_time := self._take_as(waiter)) != 0:
+                if wait_time is None:
+                    waiter.woken.clear()
+                    await waiter.woken.wait()
+                else:
+                    await sleep(wait_time)
+        finally:
+            self._remove_waiter(waiter)
+
+    def is_full(self) -> bool:
+        """Check whether bucket was refilled up to its capacity, so it's the same as a new one."""
+        self._refill()
+        return not self._waiters and self._tokens >= self._capacity
+
+    def _take_as(self, waiter: _Waiter) -> float | None:
+        return self._take() if self._waiters[0] is waiter else None
+
+    def _remove_waiter(self, waiter: _Waiter) -> None:
+        if self._waiters[0] is waiter:
+            heappop(self._waiters)
+        else:
+            # Only cancelled callers leave before they come first.
+            self._waiters.remove(waiter)
+            heapify(self._waiters)
+        if self._waiters:
+            self._waiters[0].woken.set()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def _take(self) -> float:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self._rate
@@ -0,0 +1,43 @@
+from asyncio import run
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from telegram.error import BadRequest, Forbidden
+
+from bot.error_handler import handle_errors, handle_send_error
+
+CHAT_ID = 1
+FEED_TYPE = "FEED_TYPE"
+FEED_NAME = "FEED_NAME"
+LINK = "LINK"
+TITLE = "TITLE"
+DESCRIPTION = "DESCRIPTION"
+
+
+@patch("bot.error_handler.remove_stored_chat_data", new_callable=AsyncMock)
+def test_job_errors_are_only_logged(remove_stored_chat_data_mock) -> None:
+    context = MagicMock(error=ValueError("error"))
+    context.job.data = None
+    context.bot.send_message = AsyncMock()
+    run(handle_errors(None, context))
+    context.bot.send_message.assert_not_awaited()
+    remove_stored_chat_data_mock.assert_not_awaited()
+
+
+@patch("bot.error_handler.send_prepared_update", new_callable=AsyncMock)
+@patch("bot.error_handler.remove_stored_chat_data", new_callable=AsyncMock)
+def test_chat_data_is_removed_when_bot_is_blocked(remove_stored_chat_data_mock, send_mock) -> None:
+    error = Forbidden("blocked")
+    run(handle_send_error(MagicMock(), error, CHAT_ID, FEED_TYPE, FEED_NAME, LINK, TITLE, ""))
+    remove_stored_chat_data_mock.assert_awaited_once_with(CHAT_ID)
+    send_mock.assert_not_awaited()
+
+
+@patch("bot.error_handler.prepare_update", new_callable=AsyncMock)
+@patch("bot.error_handler.send_prepared_update", new_callable=AsyncMock)
+def test_update_is_resent_without_media(send_mock, prepare_mock) -> None:
+    bot, error = MagicMock(), BadRequest("error")
+    run(handle_send_error(bot, error, CHAT_ID, FEED_TYPE, FEED_NAME, LINK, TITLE, DESCRIPTION))
+    *update_data, description = prepare_mock.await_args.args
+    assert [CHAT_ID, FEED_TYPE, FEED_NAME, LINK, TITLE] == update_data
+    assert "error" in description and DESCRIPTION in description
+    send_mock.assert_awaited_once_with(bot, CHAT_ID, prepare_mock.return_value)
@@ -0,0 +1,119 @@
+from asyncio import create_task, run, sleep, wait_for
+from time import monotonic
+from unittest.mock import AsyncMock, patch
+
+from bot.fetch_scheduler import FetchScheduler
+
+FEED_LINK_1 = "https://host.one/feed_1"
+FEED_LINK_2 = "https://host.one/feed_2"
+FEED_LINK_3 = "https://host.two/feed"
+
+
+@patch("bot.fetch_scheduler.TokenBucket")
+def test_buckets_are_shared_per_host(token_bucket_mock) -> None:
+    async def schedule_all() -> None:
+        scheduler = FetchScheduler(10, 5, 1, 10)
+        for feed_link in [FEED_LINK_1, FEED_LINK_2, FEED_LINK_3]:
+            await scheduler.schedule(feed_link, AsyncMock())
+        await sleep(0.01)
+
+    token_bucket_mock.return_value.acquire = lambda: sleep(0)
+    run(schedule_all())
+    # One global bucket and one bucket for each host.
+    assert 3 == token_bucket_mock.call_count
+
+
+def test_concurrency_is_limited() -> None:
+    async def schedule_above_limit() -> None:
+        scheduler = FetchScheduler(1, 100, 100, 10)
+        start_1, start_2 = AsyncMock(), AsyncMock()
+        await scheduler.schedule(FEED_LINK_1, start_1)
+        await scheduler.schedule(FEED_LINK_3, start_2)
+        await sleep(0.01)
+        start_1.assert_awaited_once()
+        start_2.assert_not_awaited()
+        scheduler.release()
+        await sleep(0.01)
+        start_2.assert_awaited_once()
+
+    run(schedule_above_limit())
+
+
+def test_busy_host_does_not_delay_other_hosts() -> None:
+    async def schedule_busy_host() -> None:
+        scheduler = FetchScheduler(10, 100, 1, 10)
+        busy_host_starts = [AsyncMock() for _ in range(5)]
+        for start in busy_host_starts:
+            await scheduler.schedule(FEED_LINK_1, start)
+        other_host_start = AsyncMock()
+        await scheduler.schedule(FEED_LINK_3, other_host_start)
+        await sleep(0.01)
+        other_host_start.assert_awaited_once()
+        # Only a single fetch of the busy host is allowed per second.
+        assert 1 == sum(start.await_count for start in busy_host_starts)
+        scheduler.cancel()
+
+    run(schedule_busy_host())
+
+
+def test_scheduling_waits_while_queue_is_full() -> None:
+    async def schedule_above_queue_size() -> None:
+        scheduler = FetchScheduler(1, 100, 100, 1)
+        await scheduler.schedule(FEED_LINK_1, AsyncMock())
+        await sleep(0.01)
+        # The first fetch is already running, the second one waits for it in the queue.
+        await scheduler.schedule(FEED_LINK_3, AsyncMock())
+        scheduling = create_task(scheduler.schedule(FEED_LINK_2, AsyncMock()))
+        await sleep(0.01)
+        assert not scheduling.done()
+        scheduler.release()
+        await wait_for(scheduling, 0.01)
+        scheduler.cancel()
+
+    run(schedule_above_queue_size())
+
+
+def test_wait_until_idle() -> None:
+    async def wait_for_queued_fetches() -> None:
+        scheduler = FetchScheduler(2, 100, 100, 10)
+        await scheduler.wait_until_idle()
+        await scheduler.schedule(FEED_LINK_1, AsyncMock())
+        waiting = create_task(scheduler.wait_until_idle())
+        await sleep(0.01)
+        assert not waiting.done()
+        scheduler.release()
+        await wait_for(waiting, 0.01)
+
+    run(wait_for_queued_fetches())
+
+
+def test_cancel_drops_queued_fetches() -> None:
+    async def cancel_queued_fetches() -> None:
+        scheduler = FetchScheduler(1, 100, 100, 10)
+        start_1, start_2 = AsyncMock(), AsyncMock()
+        await scheduler.schedule(FEED_LINK_1, start_1)
+        await scheduler.schedule(FEED_LINK_3, start_2)
+        await sleep(0.01)
+        scheduler.cancel()
+        scheduler.release()
+        await wait_for(scheduler.wait_until_idle(), 0.01)
+        start_2.assert_not_awaited()
+
+    run(cancel_queued_fetches())
+
+
+def test_idle_host_buckets_are_removed() -> None:
+    async def fetch_twice() -> list[str]:
+        scheduler = FetchScheduler(10, 100, 1, 10)
+        await scheduler.schedule(FEED_LINK_1, AsyncMock())
+        await sleep(0.01)
+        scheduler.release()
+        await scheduler.wait_until_idle()
+        with patch("web.token_bucket.monotonic", return_value=monotonic() + 10):
+            await scheduler.schedule(FEED_LINK_3, AsyncMock())
+            await sleep(0.01)
+            scheduler.release()
+        return list(scheduler._host_buckets)
+
+    # Bucket of the first host was refilled since, bucket of the second one was just used.
+    assert ["host.two"] == run(fetch_twice())
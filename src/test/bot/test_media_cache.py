@@ -0,0 +1,140 @@
+from asyncio import run
+from pathlib import Path
+from unittest.mock import patch
+
+from pytest import fixture
+
+from bot.media_cache import CachedMedia, MediaCache
+
+LINK_1 = "LINK_1"
+LINK_2 = "LINK_2"
+LINK_3 = "LINK_3"
+CONTENT_1 = b"CONTENT_1"
+CONTENT_2 = b"CONTENT_2"
+MEDIA_TYPE = "image/png"
+FILE_ID = "FILE_ID"
+MAX_SIZE = len(CONTENT_1) + len(CONTENT_2)
+TTL = 100
+
+
+@fixture
+def cache(tmp_path: Path) -> MediaCache:
+    cache = MediaCache(str(tmp_path), MAX_SIZE, TTL)
+    cache.initialize()
+    return cache
+
+
+def test_initialize_removes_stale_files(tmp_path: Path) -> None:
+    (tmp_path / ("0" * 64)).write_bytes(CONTENT_1)
+    (tmp_path / ".download-stale").write_bytes(CONTENT_2)
+    MediaCache(str(tmp_path), MAX_SIZE, TTL).initialize()
+    assert [] == list(tmp_path.iterdir())
+
+
+def test_initialize_keeps_unrelated_files(tmp_path: Path) -> None:
+    (tmp_path / "unrelated").write_bytes(CONTENT_1)
+    (tmp_path / "directory").mkdir()
+    MediaCache(str(tmp_path), MAX_SIZE, TTL).initialize()
+    assert {"unrelated", "directory"} == {path.name for path in tmp_path.iterdir()}
+
+
+def test_get_missing_media(cache: MediaCache) -> None:
+    assert cache.get(LINK_1) is None
+
+
+def test_put_and_get_media(cache: MediaCache) -> None:
+    run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    cached_media = cache.get(LINK_1)
+    assert MEDIA_TYPE == cached_media.media_type
+    assert cached_media.content is None
+    assert cached_media.file_id is None
+    assert CONTENT_1 == cached_media.path.read_bytes()
+
+
+def test_put_downloaded_file(cache: MediaCache, tmp_path: Path) -> None:
+    with cache.create_file() as file:
+        file.write(CONTENT_1)
+    cached_media = run(cache.put_file(LINK_1, Path(file.name), MEDIA_TYPE))
+    assert cached_media == cache.get(LINK_1)
+    assert CONTENT_1 == cached_media.path.read_bytes()
+    assert [cached_media.path] == list(tmp_path.iterdir())
+
+
+def test_same_content_is_stored_once(cache: MediaCache, tmp_path: Path) -> None:
+    run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    run(cache.put(LINK_2, CONTENT_1, MEDIA_TYPE))
+    assert 1 == len(list(tmp_path.iterdir()))
+    assert cache.get(LINK_1) == cache.get(LINK_2)
+
+
+def test_file_id_is_shared_between_links_with_same_content(cache: MediaCache) -> None:
+    run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    run(cache.put(LINK_2, CONTENT_1, MEDIA_TYPE))
+    cache.set_file_id(LINK_1, FILE_ID)
+    assert CachedMedia(None, MEDIA_TYPE, FILE_ID) == cache.get(LINK_2)
+
+
+def test_least_recently_used_media_is_removed(cache: MediaCache, tmp_path: Path) -> None:
+    run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    run(cache.put(LINK_2, CONTENT_2, MEDIA_TYPE))
+    cache.get(LINK_1)
+    run(cache.put(LINK_3, b"CONTENT_3", MEDIA_TYPE))
+    assert cache.get(LINK_1) is not None
+    assert cache.get(LINK_2) is None
+    assert cache.get(LINK_3) is not None
+    assert 2 == len(list(tmp_path.iterdir()))
+
+
+def test_media_larger_than_cache_is_not_stored(cache: MediaCache, tmp_path: Path) -> None:
+    run(cache.put(LINK_1, CONTENT_1 * 3, MEDIA_TYPE))
+    assert cache.get(LINK_1) is None
+    assert [] == list(tmp_path.iterdir())
+
+
+def test_expired_media_is_removed(cache: MediaCache, tmp_path: Path) -> None:
+    with patch("bot.media_cache.monotonic", return_value=0):
+        run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    with patch("bot.media_cache.monotonic", return_value=TTL + 1):
+        assert cache.get(LINK_1) is None
+    assert [] == list(tmp_path.iterdir())
+
+
+def test_pinned_media_file_is_kept_until_unpinned(cache: MediaCache, tmp_path: Path) -> None:
+    pinned_media = run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    cache.pin(pinned_media)
+    run(cache.put(LINK_2, CONTENT_2, MEDIA_TYPE))
+    run(cache.put(LINK_3, b"CONTENT_3", MEDIA_TYPE))
+    assert cache.get(LINK_1) is None
+    assert CONTENT_1 == pinned_media.path.read_bytes()
+    cache.unpin(pinned_media)
+    assert not pinned_media.path.exists()
+    assert 2 == len(list(tmp_path.iterdir()))
+
+
+def test_media_pinned_multiple_times(cache: MediaCache) -> None:
+    pinned_media = run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    cache.pin(pinned_media)
+    cache.pin(pinned_media)
+    run(cache.put(LINK_2, CONTENT_1 * 2, MEDIA_TYPE))
+    cache.unpin(pinned_media)
+    assert pinned_media.path.exists()
+    cache.unpin(pinned_media)
+    assert not pinned_media.path.exists()
+
+
+def test_unpinned_media_stays_in_cache(cache: MediaCache) -> None:
+    pinned_media = run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    cache.pin(pinned_media)
+    cache.unpin(pinned_media)
+    assert pinned_media == cache.get(LINK_1)
+    assert pinned_media.path.exists()
+
+
+def test_media_stored_again_while_pinned_is_kept(cache: MediaCache) -> None:
+    pinned_media = run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    cache.pin(pinned_media)
+    run(cache.put(LINK_2, CONTENT_1 * 2, MEDIA_TYPE))
+    run(cache.put(LINK_1, CONTENT_1, MEDIA_TYPE))
+    cache.unpin(pinned_media)
+    assert pinned_media == cache.get(LINK_1)
+    assert pinned_media.path.exists()
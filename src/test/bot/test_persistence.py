@@ -0,0 +1,98 @@
+import pickle
+from asyncio import run
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from pytest import fixture
+from telegram.ext import ExtBot
+
+from bot.persistence import DBPersistence
+
+TTL = 100
+NOW = 1000
+BUTTONS = {"BUTTON": "DATA"}
+CONVERSATION_KEY = (1, 2)
+STATE = "STATE"
+
+
+def persisted_data(*documents: tuple) -> MagicMock:
+    async def get_all_persisted_data(kind: str):
+        for document in documents:
+            if document[0] == kind:
+                yield document[1:]
+
+    return MagicMock(side_effect=get_all_persisted_data)
+
+
+@fixture(autouse=True)
+def wrapper_mocks():
+    with (
+        patch("bot.persistence.time", return_value=NOW),
+        patch("bot.persistence.store_persisted_data", new_callable=AsyncMock) as store_mock,
+        patch("bot.persistence.update_persisted_access_times", new_callable=AsyncMock) as access,
+        patch("bot.persistence.remove_persisted_data", new_callable=AsyncMock) as remove_mock,
+    ):
+        yield store_mock, access, remove_mock
+
+
+@fixture
+def persistence() -> DBPersistence:
+    persistence = DBPersistence(TTL)
+    persistence.set_bot(MagicMock(spec=ExtBot))
+    return persistence
+
+
+def test_get_callback_data_skips_expired_keyboards(persistence: DBPersistence, wrapper_mocks):
+    _, _, remove_mock = wrapper_mocks
+    documents = persisted_data(
+        ("keyboard", "VALID", pickle.dumps(BUTTONS), NOW - TTL),
+        ("keyboard", "EXPIRED", pickle.dumps(BUTTONS), NOW - TTL - 1),
+        ("callback_query", "QUERY_1", "VALID", None),
+        ("callback_query", "QUERY_2", "EXPIRED", None),
+    )
+    with patch("bot.persistence.get_all_persisted_data", documents):
+        keyboards, callback_queries = run(persistence.get_callback_data())
+    assert [("VALID", NOW - TTL, BUTTONS)] == keyboards
+    assert {"QUERY_1": "VALID"} == callback_queries
+    remove_mock.assert_any_await("keyboard", ["EXPIRED"])
+
+
+def test_update_callback_data_writes_only_changes(persistence: DBPersistence, wrapper_mocks):
+    store_mock, access_mock, remove_mock = wrapper_mocks
+    run(persistence.update_callback_data(([("OLD", NOW, BUTTONS), ("GONE", NOW, BUTTONS)], {})))
+    store_mock.reset_mock()
+    keyboards = [("OLD", NOW + 1, BUTTONS), ("NEW", NOW, BUTTONS)]
+    run(persistence.update_callback_data((keyboards, {"QUERY": "NEW"})))
+    store_mock.assert_any_await("keyboard", [("NEW", pickle.dumps(BUTTONS), NOW)])
+    store_mock.assert_any_await("callback_query", [("QUERY", "NEW", None)])
+    access_mock.assert_awaited_with("keyboard", [("OLD", NOW + 1)])
+    remove_mock.assert_any_await("keyboard", ["GONE"])
+
+
+def test_update_callback_data_removes_expired_keyboards(persistence: DBPersistence, wrapper_mocks):
+    store_mock, _, _ = wrapper_mocks
+    run(persistence.update_callback_data(([("EXPIRED", NOW - TTL - 1, BUTTONS)], {})))
+    store_mock.assert_any_await("keyboard", [])
+    persistence.bot.callback_data_cache.clear_callback_data.assert_called_once_with(
+        time_cutoff=NOW - TTL
+    )
+
+
+def test_conversation_is_stored_and_loaded(persistence: DBPersistence, wrapper_mocks):
+    store_mock, _, remove_mock = wrapper_mocks
+    run(persistence.update_conversation("NAME", CONVERSATION_KEY, STATE))
+    store_mock.assert_awaited_once_with(
+        "conversation:NAME", [("[1, 2]", pickle.dumps(STATE), None)]
+    )
+    documents = persisted_data(("conversation:NAME", "[1, 2]", pickle.dumps(STATE), None))
+    with patch("bot.persistence.get_all_persisted_data", documents):
+        assert {CONVERSATION_KEY: STATE} == run(persistence.get_conversations("NAME"))
+    run(persistence.update_conversation("NAME", CONVERSATION_KEY, None))
+    remove_mock.assert_awaited_once_with("conversation:NAME", ["[1, 2]"])
+
+
+def test_data_which_cant_be_unpickled_is_skipped(persistence: DBPersistence):
+    documents = persisted_data(
+        ("chat_data", 1, b"INVALID", None), ("chat_data", 2, pickle.dumps({}), None)
+    )
+    with patch("bot.persistence.get_all_persisted_data", documents):
+        assert {2: {}} == run(persistence.get_chat_data())
@@ -0,0 +1,75 @@
+from asyncio import run, sleep, wait_for
+
+from pytest import raises
+
+from bot.pipeline import Stage
+
+ITEMS = [1, 2, 3]
+
+
+def test_items_are_handled() -> None:
+    handled = []
+
+    async def handle(item: int) -> None:
+        handled.append(item)
+
+    async def handle_all() -> None:
+        stage = Stage("test", handle, 2, 10)
+        stage.start()
+        for item in ITEMS:
+            await stage.put(item)
+        await sleep(0.01)
+        await stage.stop()
+
+    run(handle_all())
+    assert ITEMS == sorted(handled)
+
+
+def test_errors_do_not_stop_workers() -> None:
+    handled = []
+
+    async def handle(item: int) -> None:
+        if item == ITEMS[0]:
+            raise ValueError(item)
+        handled.append(item)
+
+    async def handle_all() -> None:
+        stage = Stage("test", handle, 1, 10)
+        stage.start()
+        for item in ITEMS:
+            await stage.put(item)
+        await sleep(0.01)
+        await stage.stop()
+
+    run(handle_all())
+    assert ITEMS[1:] == handled
+
+
+def test_put_waits_when_queue_is_full() -> None:
+    async def handle(_: int) -> None:
+        await sleep(1)
+
+    async def fill_queue() -> None:
+        stage = Stage("test", handle, 1, 1)
+        await stage.put(ITEMS[0])
+        with raises(TimeoutError):
+            await wait_for(stage.put(ITEMS[1]), 0.01)
+
+    run(fill_queue())
+
+
+def test_metrics() -> None:
+    async def handle(_: int) -> None:
+        await sleep(1)
+
+    async def get_metrics() -> str:
+        stage = Stage("test", handle, 2, 5)
+        stage.start()
+        for item in ITEMS:
+            await stage.put(item)
+        await sleep(0.01)
+        metrics = stage.metrics()
+        await stage.stop()
+        return metrics
+
+    assert "[test] queue [1/5] busy [2/2] processed [0]" == run(get_metrics())
@@ -0,0 +1,90 @@
+from asyncio import create_task, gather, run, sleep
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+from pytest import raises
+from telegram.error import RetryAfter
+
+from bot.rate_limiter import SendPriority, SendRateLimiter
+from web.token_bucket import TokenBucket
+
+CHAT_ID = 123
+GROUP_CHAT_ID = -123
+ENDPOINT = "sendMessage"
+RESULT = {"ok": True}
+RETRY_AFTER = timedelta(seconds=5)
+
+
+def rate_limiter(max_retries: int = 1) -> SendRateLimiter:
+    return SendRateLimiter(1000, 1000, 1000, max_retries)
+
+
+async def process(
+    limiter: SendRateLimiter,
+    callback: AsyncMock,
+    chat_id: int | None = CHAT_ID,
+    priority: SendPriority | None = None,
+):
+    return await limiter.process_request(callback, (), {}, ENDPOINT, {"chat_id": chat_id}, priority)
+
+
+def test_process_request() -> None:
+    callback = AsyncMock(return_value=RESULT)
+    assert RESULT == run(process(rate_limiter(), callback))
+    callback.assert_awaited_once()
+
+
+@patch("bot.rate_limiter.sleep", new_callable=AsyncMock)
+def test_request_is_retried_after_flood_limit(sleep_mock) -> None:
+    callback = AsyncMock(side_effect=[RetryAfter(RETRY_AFTER), RESULT])
+    assert RESULT == run(process(rate_limiter(), callback))
+    assert 2 == callback.await_count
+    assert 0 < sleep_mock.call_args.args[0] <= RETRY_AFTER.total_seconds()
+
+
+@patch("bot.rate_limiter.sleep", new_callable=AsyncMock)
+def test_flood_limit_is_raised_after_max_retries(_) -> None:
+    callback = AsyncMock(side_effect=RetryAfter(RETRY_AFTER))
+    with raises(RetryAfter):
+        run(process(rate_limiter(max_retries=2), callback))
+    assert 3 == callback.await_count
+
+
+def test_group_chats_have_separate_limits() -> None:
+    limiter = rate_limiter()
+    assert limiter._get_chat_bucket(CHAT_ID) is limiter._get_chat_bucket(CHAT_ID)
+    assert limiter._get_chat_bucket(CHAT_ID) is not limiter._get_chat_bucket(GROUP_CHAT_ID)
+    assert limiter._get_chat_bucket(GROUP_CHAT_ID) is limiter._group_buckets[GROUP_CHAT_ID]
+    assert limiter._get_chat_bucket("@channel") is limiter._group_buckets["@channel"]
+
+
+def test_interactive_requests_go_before_bulk_ones() -> None:
+    async def send_requests() -> list[str]:
+        limiter = rate_limiter()
+        limiter._overall_bucket = TokenBucket(100, 1)
+        sent = []
+
+        def callback(name: str) -> AsyncMock:
+            return AsyncMock(side_effect=lambda: sent.append(name))
+
+        first = create_task(process(limiter, callback("first")))
+        await sleep(0)
+        bulk = create_task(process(limiter, callback("bulk"), GROUP_CHAT_ID, SendPriority.BULK))
+        await sleep(0)
+        interactive = create_task(process(limiter, callback("interactive"), GROUP_CHAT_ID))
+        await gather(first, bulk, interactive)
+        return sent
+
+    assert ["first", "interactive", "bulk"] == run(send_requests())
+
+
+@patch("bot.rate_limiter._MIN_CHATS_TO_REMOVE_IDLE", 3)
+@patch("web.token_bucket.monotonic", return_value=0)
+def test_idle_chat_buckets_are_removed(_) -> None:
+    limiter = rate_limiter()
+    run(limiter._get_chat_bucket(CHAT_ID).acquire())
+    limiter._get_chat_bucket(GROUP_CHAT_ID)
+    limiter._get_chat_bucket(CHAT_ID + 1)
+    limiter._get_chat_bucket(CHAT_ID + 2)
+    assert [CHAT_ID, CHAT_ID + 2] == list(limiter._chat_buckets)
+    assert {} == limiter._group_buckets
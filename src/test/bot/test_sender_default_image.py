@@ -0,0 +1,78 @@
+from asyncio import run
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from pytest import fixture, raises
+from telegram.error import BadRequest
+
+import bot.sender as sender
+from bot.media_cache import CachedMedia
+from bot.sender import _send_text_message, load_default_image
+
+BOT_ID = 1
+CHAT_ID = 2
+MESSAGE = "MESSAGE"
+CONTENT = b"CONTENT"
+DIGEST = "DIGEST"
+FILE_ID = "FILE_ID"
+NEW_FILE_ID = "NEW_FILE_ID"
+
+
+def sent_message(file_id: str) -> MagicMock:
+    message = MagicMock(video=None)
+    message.photo[-1].file_id = file_id
+    return message
+
+
+@fixture
+def bot() -> MagicMock:
+    bot = MagicMock(id=BOT_ID)
+    bot.send_photo = AsyncMock(return_value=sent_message(NEW_FILE_ID))
+    return bot
+
+
+@fixture
+def store_file_id_mock():
+    with (
+        patch("bot.sender._default_image_digest", DIGEST),
+        patch("bot.sender.store_file_id", new_callable=AsyncMock) as store_file_id_mock,
+    ):
+        yield store_file_id_mock
+
+
+@patch("bot.sender._trim_image", side_effect=lambda content: content)
+@patch("bot.sender._load_image_content", return_value=CONTENT)
+@patch("bot.sender.get_stored_file_id", new_callable=AsyncMock, return_value=FILE_ID)
+def test_default_image_file_id_is_loaded_for_bot(get_stored_file_id_mock, *_) -> None:
+    with patch("bot.sender._default_image", None):
+        run(load_default_image(MagicMock(id=BOT_ID)))
+        assert CachedMedia(CONTENT, "image", FILE_ID) == sender._default_image
+    assert BOT_ID == get_stored_file_id_mock.await_args.args[0]
+
+
+def test_default_image_is_uploaded_once(bot: MagicMock, store_file_id_mock) -> None:
+    with patch("bot.sender._default_image", CachedMedia(CONTENT, "image", None)):
+        run(_send_text_message(bot, CHAT_ID, MESSAGE))
+        run(_send_text_message(bot, CHAT_ID, MESSAGE))
+    assert CONTENT == bot.send_photo.await_args_list[0].args[1]
+    assert NEW_FILE_ID == bot.send_photo.await_args_list[1].args[1]
+    store_file_id_mock.assert_awaited_once_with(BOT_ID, DIGEST, NEW_FILE_ID)
+
+
+def test_invalid_file_id_is_uploaded_again(bot: MagicMock, store_file_id_mock) -> None:
+    bot.send_photo.side_effect = [
+        BadRequest("Wrong file identifier/http url specified"),
+        sent_message(NEW_FILE_ID),
+    ]
+    with patch("bot.sender._default_image", CachedMedia(CONTENT, "image", FILE_ID)):
+        run(_send_text_message(bot, CHAT_ID, MESSAGE))
+    assert [FILE_ID, CONTENT] == [call.args[1] for call in bot.send_photo.await_args_list]
+    store_file_id_mock.assert_awaited_once_with(BOT_ID, DIGEST, NEW_FILE_ID)
+
+
+def test_other_errors_are_not_retried(bot: MagicMock, store_file_id_mock) -> None:
+    bot.send_photo.side_effect = BadRequest("Can't parse entities")
+    with patch("bot.sender._default_image", CachedMedia(CONTENT, "image", FILE_ID)):
+        with raises(BadRequest):
+            run(_send_text_message(bot, CHAT_ID, MESSAGE))
+    bot.send_photo.assert_awaited_once()
+    store_file_id_mock.assert_not_awaited()
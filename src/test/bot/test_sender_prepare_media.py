@@ -0,0 +1,131 @@
+from asyncio import gather, run
+from pathlib import Path
+from unittest.mock import AsyncMock, call, patch
+
+from pytest import raises
+
+from bot.media_cache import CachedMedia, MediaCache
+from bot.sender import (
+    PreparedMedia,
+    PreparedUpdate,
+    _get_all_media,
+    _get_media,
+    _prepare_media,
+    release_update,
+)
+
+LINK = "LINK"
+OTHER_LINK = "OTHER_LINK"
+FILE_ID = "FILE_ID"
+CONTENT = b"CONTENT"
+# Other content of the same size, so storing it removes the first one from the cache.
+OTHER_CONTENT = b"TNETNOC"
+TRIMMED_CONTENT = b"TRIMMED_CONTENT"
+PATH = Path("PATH")
+
+
+@patch("bot.sender._media_executor", None)
+def test_uploaded_media_is_not_processed() -> None:
+    media = CachedMedia(None, "video/mp4", FILE_ID)
+    with patch("bot.sender._get_video_dimensions") as get_video_dimensions_mock:
+        assert PreparedMedia(LINK, media) == run(_prepare_media(LINK, media))
+    get_video_dimensions_mock.assert_not_called()
+
+
+@patch("bot.sender._media_executor", None)
+@patch("bot.sender._get_video_dimensions", return_value=(640, 480))
+def test_video_dimensions_are_read(get_video_dimensions_mock) -> None:
+    media = CachedMedia(None, "video/mp4", None, PATH)
+    assert PreparedMedia(LINK, media, 640, 480) == run(_prepare_media(LINK, media))
+    get_video_dimensions_mock.assert_called_once_with(PATH)
+
+
+@patch("bot.sender._media_executor", None)
+@patch("bot.sender._trim_image", return_value=TRIMMED_CONTENT)
+def test_image_is_trimmed_into_file(trim_image_mock, tmp_path: Path) -> None:
+    path = tmp_path / "image"
+    path.write_bytes(CONTENT)
+    media = CachedMedia(None, "image/png", None, path)
+    with patch("bot.sender._media_cache", MediaCache(str(tmp_path), 100, 100)):
+        prepared_media = run(_prepare_media(LINK, media))
+    assert media == prepared_media.media
+    assert TRIMMED_CONTENT == prepared_media.trimmed_path.read_bytes()
+    trim_image_mock.assert_called_once_with(CONTENT)
+    release_update(PreparedUpdate("MESSAGE", [prepared_media]))
+    assert [path] == list(tmp_path.iterdir())
+
+
+@patch("bot.sender._media_executor", None)
+@patch("bot.sender._trim_image", side_effect=lambda content: content)
+def test_image_not_trimmed_is_uploaded_from_cache(_, tmp_path: Path) -> None:
+    path = tmp_path / "image"
+    path.write_bytes(CONTENT)
+    media = CachedMedia(None, "image/png", None, path)
+    with patch("bot.sender._media_cache", MediaCache(str(tmp_path), 100, 100)):
+        assert PreparedMedia(LINK, media) == run(_prepare_media(LINK, media))
+    assert [path] == list(tmp_path.iterdir())
+
+
+@patch("bot.sender._media_cache")
+@patch("bot.sender._get_media", new_callable=AsyncMock)
+def test_prepared_media_are_pinned_until_released(get_media_mock, media_cache_mock) -> None:
+    media = CachedMedia(None, "video/mp4", None, PATH)
+    get_media_mock.return_value = media
+    with patch("bot.sender._prepare_media", return_value=PreparedMedia(LINK, media)):
+        prepared_media = run(_get_all_media(1, [LINK]))
+    media_cache_mock.unpin.assert_not_called()
+    release_update(PreparedUpdate("MESSAGE", prepared_media))
+    media_cache_mock.unpin.assert_called_once_with(media)
+
+
+@patch("bot.sender._media_cache")
+@patch("bot.sender._get_media", new_callable=AsyncMock)
+def test_media_are_unpinned_when_preparing_fails(get_media_mock, media_cache_mock) -> None:
+    media = CachedMedia(None, "image/png", None, PATH)
+    get_media_mock.return_value = media
+    with patch("bot.sender._prepare_media", side_effect=ValueError("error")), raises(ValueError):
+        run(_get_all_media(1, [LINK, LINK]))
+    assert [call(media), call(media)] == media_cache_mock.unpin.call_args_list
+
+
+@patch("bot.sender._media_cache")
+@patch("bot.sender._get_media", new_callable=AsyncMock)
+def test_media_are_unpinned_when_downloading_fails(get_media_mock, media_cache_mock) -> None:
+    media = CachedMedia(None, "image/png", None, PATH)
+    get_media_mock.side_effect = [media, ValueError("error")]
+    with raises(ValueError):
+        run(_get_all_media(1, [LINK, OTHER_LINK]))
+    media_cache_mock.unpin.assert_called_once_with(media)
+
+
+def test_cached_media_are_pinned_when_got(tmp_path: Path) -> None:
+    media_cache = MediaCache(str(tmp_path), len(CONTENT), 100)
+    run(media_cache.put(LINK, CONTENT, "image/png"))
+    with patch("bot.sender._media_cache", media_cache):
+        media = run(_get_media(LINK))
+    run(media_cache.put(OTHER_LINK, OTHER_CONTENT, "image/png"))
+    assert CONTENT == media.path.read_bytes()
+    media_cache.unpin(media)
+    assert not media.path.exists()
+
+
+def test_shared_download_is_pinned_for_every_waiter(tmp_path: Path) -> None:
+    media_cache = MediaCache(str(tmp_path), len(CONTENT), 100)
+
+    async def download_into_cache(link: str) -> CachedMedia:
+        return await media_cache.put(link, CONTENT, "image/png", pin=True)
+
+    async def get_media_twice() -> list[CachedMedia]:
+        return list(await gather(_get_media(LINK), _get_media(LINK)))
+
+    with (
+        patch("bot.sender._media_cache", media_cache),
+        patch("bot.sender._download_into_cache", side_effect=download_into_cache) as download_mock,
+    ):
+        first_media, second_media = run(get_media_twice())
+    download_mock.assert_called_once_with(LINK)
+    run(media_cache.put(OTHER_LINK, OTHER_CONTENT, "image/png"))
+    media_cache.unpin(first_media)
+    assert second_media.path.exists()
+    media_cache.unpin(second_media)
+    assert not second_media.path.exists()
@@ -0,0 +1,48 @@
+from io import BytesIO
+from os import urandom
+from unittest.mock import patch
+
+from PIL import Image
+from pytest import mark
+
+from bot.sender import _trim_image
+
+MAX_IMAGE_SIZE = 100_000
+MAX_IMAGE_DIMENSIONS = 1_000
+
+
+def encoded_image(size: tuple[int, int], image_format: str) -> bytes:
+    # Random pixels don't compress, so the encoded size depends on dimensions.
+    image = Image.frombytes("RGB", size, urandom(size[0] * size[1] * 3))
+    image_bytes = BytesIO()
+    image.save(image_bytes, format=image_format)
+    return image_bytes.getvalue()
+
+
+@patch("bot.sender.MAX_IMAGE_SIZE", MAX_IMAGE_SIZE)
+@patch("bot.sender.MAX_IMAGE_DIMENSIONS", MAX_IMAGE_DIMENSIONS)
+def test_small_image_is_not_changed() -> None:
+    image = encoded_image((100, 100), "PNG")
+    assert image == _trim_image(image)
+
+
+@patch("bot.sender.MAX_IMAGE_SIZE", MAX_IMAGE_SIZE * 100)
+@patch("bot.sender.MAX_IMAGE_DIMENSIONS", MAX_IMAGE_DIMENSIONS)
+@mark.parametrize(argnames="image_format", argvalues=["PNG", "JPEG"])
+def test_image_with_too_large_dimensions(image_format: str) -> None:
+    trimmed_image = Image.open(BytesIO(_trim_image(encoded_image((900, 300), image_format))))
+    assert MAX_IMAGE_DIMENSIONS >= sum(trimmed_image.size)
+    assert 3 == round(trimmed_image.width / trimmed_image.height)
+    assert image_format == trimmed_image.format
+
+
+@patch("bot.sender.MAX_IMAGE_SIZE", MAX_IMAGE_SIZE)
+@patch("bot.sender.MAX_IMAGE_DIMENSIONS", MAX_IMAGE_DIMENSIONS * 10)
+@mark.parametrize(argnames="image_format", argvalues=["PNG", "JPEG"])
+def test_image_with_too_large_size(image_format: str) -> None:
+    image = encoded_image((800, 600), image_format)
+    with patch.object(Image.Image, "save", autospec=True, side_effect=Image.Image.save) as save:
+        trimmed_image = _trim_image(image)
+    assert MAX_IMAGE_SIZE >= len(trimmed_image)
+    assert 2 >= save.call_count
+    assert image_format == Image.open(BytesIO(trimmed_image)).format
@@ -0,0 +1,104 @@
+from asyncio import run
+from unittest.mock import AsyncMock, patch
+
+from pytest import fixture
+
+from bot.shard_leases import ShardLeases, get_shard
+
+WORKER_ID = "WORKER_ID"
+SHARDS = 4
+TTL = 60
+NOW = 1000
+
+
+@fixture(autouse=True)
+def wrapper_mocks():
+    with (
+        patch("bot.shard_leases.time", return_value=NOW),
+        patch("bot.shard_leases.store_worker_heartbeat", new_callable=AsyncMock) as heartbeat,
+        patch("bot.shard_leases.remove_expired_worker_heartbeats", new_callable=AsyncMock),
+        patch("bot.shard_leases.remove_worker_heartbeat", new_callable=AsyncMock),
+        patch("bot.shard_leases.get_live_workers", new_callable=AsyncMock) as live_workers,
+        patch("bot.shard_leases.get_claimable_shards", new_callable=AsyncMock) as claimable,
+        patch("bot.shard_leases.claim_shard_lease", new_callable=AsyncMock) as claim,
+        patch("bot.shard_leases.release_shard_leases", new_callable=AsyncMock) as release,
+    ):
+        live_workers.return_value = [WORKER_ID]
+        claimable.return_value = list(range(SHARDS))
+        claim.return_value = True
+        yield heartbeat, live_workers, claimable, claim, release
+
+
+@fixture
+def leases() -> ShardLeases:
+    return ShardLeases(WORKER_ID, SHARDS, TTL)
+
+
+def link_in_shard(shard: int) -> str:
+    return next(link for i in range(1000) if get_shard(link := f"LINK_{i}", SHARDS) == shard)
+
+
+def test_shard_is_stable_and_in_range() -> None:
+    shards = [get_shard(f"LINK_{i}", SHARDS) for i in range(100)]
+    assert shards == [get_shard(f"LINK_{i}", SHARDS) for i in range(100)]
+    assert set(range(SHARDS)) == set(shards)
+
+
+def test_single_worker_claims_all_shards(leases: ShardLeases, wrapper_mocks) -> None:
+    heartbeat_mock, *_ = wrapper_mocks
+    run(leases.heartbeat())
+    heartbeat_mock.assert_awaited_once_with(WORKER_ID, NOW + TTL)
+    assert all(leases.owns(link_in_shard(shard)) for shard in range(SHARDS))
+
+
+def test_worker_claims_only_fair_share(leases: ShardLeases, wrapper_mocks) -> None:
+    _, live_workers_mock, _, claim_mock, _ = wrapper_mocks
+    live_workers_mock.return_value = [WORKER_ID, "OTHER_WORKER"]
+    run(leases.heartbeat())
+    assert 2 == claim_mock.await_count
+    assert leases.owns(link_in_shard(0))
+    assert leases.owns(link_in_shard(1))
+    assert not leases.owns(link_in_shard(2))
+
+
+def test_shards_claimed_by_others_are_skipped(leases: ShardLeases, wrapper_mocks) -> None:
+    *_, claim_mock, _ = wrapper_mocks
+    claim_mock.side_effect = lambda shard, *_: shard != 0
+    run(leases.heartbeat())
+    assert not leases.owns(link_in_shard(0))
+    assert leases.owns(link_in_shard(1))
+
+
+def test_shards_are_released_when_workers_are_added(leases: ShardLeases, wrapper_mocks) -> None:
+    _, live_workers_mock, claimable_mock, _, release_mock = wrapper_mocks
+    run(leases.heartbeat())
+    live_workers_mock.return_value = [WORKER_ID, "OTHER_WORKER"]
+    claimable_mock.return_value = []
+    run(leases.heartbeat())
+    release_mock.assert_awaited_once_with([2, 3], WORKER_ID)
+    assert leases.owns(link_in_shard(1))
+    assert not leases.owns(link_in_shard(3))
+
+
+def test_lost_leases_are_dropped(leases: ShardLeases, wrapper_mocks) -> None:
+    *_, claimable_mock, claim_mock, _ = wrapper_mocks
+    run(leases.heartbeat())
+    claimable_mock.return_value = []
+    claim_mock.side_effect = lambda shard, *_: shard != 0
+    run(leases.heartbeat())
+    assert not leases.owns(link_in_shard(0))
+    assert leases.owns(link_in_shard(1))
+
+
+def test_shards_are_not_owned_after_leases_expire(leases: ShardLeases) -> None:
+    run(leases.heartbeat())
+    with patch("bot.shard_leases.time", return_value=NOW + TTL):
+        assert not leases.owns(link_in_shard(0))
+
+
+def test_release_all_shards(leases: ShardLeases, wrapper_mocks) -> None:
+    *_, release_mock = wrapper_mocks
+    run(leases.heartbeat())
+    run(leases.release())
+    release_mock.assert_awaited_once_with(list(range(SHARDS)), WORKER_ID)
+    assert not leases.owns(link_in_shard(0))
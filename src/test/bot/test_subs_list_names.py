@@ -0,0 +1,74 @@
+from asyncio import run
+from unittest.mock import AsyncMock, patch
+
+from pytest import mark
+
+from bot.command.subs.list_names import _load_page, _name_ranges
+from bot.command.subs.view import SubscriptionsView
+
+CHAT_ID = 1
+PAGE_SIZE = 2
+TYPES = ["TYPE_1", "TYPE_2"]
+FEED_1 = ("TYPE_1", "NAME_1")
+FEED_2 = ("TYPE_1", "NAME_2")
+FEED_3 = ("TYPE_1", "NAME_3")
+VIEW = SubscriptionsView(0, TYPES, type_id=0)
+
+
+@mark.parametrize(
+    ("view", "expected_ranges"),
+    [
+        (VIEW, []),
+        (VIEW._replace(letter="b"), [("B", "C"), ("b", "c")]),
+        (VIEW._replace(letter="#"), [("", "A"), ("[", "a"), ("{", None)]),
+        (
+            SubscriptionsView(0, TYPES, query="a1bc"),
+            [("A1B", "A1C"), ("A1b", "A1c"), ("a1B", "a1C"), ("a1b", "a1c")],
+        ),
+        (SubscriptionsView(0, TYPES, query="#"), [("#", "$")]),
+    ],
+)
+def test_name_ranges(view: SubscriptionsView, expected_ranges: list) -> None:
+    assert expected_ranges == _name_ranges(view)
+
+
+@patch("bot.command.subs.list_names.SUBSCRIPTIONS_PAGE_SIZE", PAGE_SIZE)
+@patch("bot.command.subs.list_names.get_stored_feeds_page", new_callable=AsyncMock)
+def test_load_first_page(get_page_mock: AsyncMock) -> None:
+    get_page_mock.return_value = [FEED_1, FEED_2, FEED_3]
+    view = run(_load_page(CHAT_ID, VIEW))
+    assert (FEED_1, FEED_2) == view.feeds
+    assert not view.has_previous
+    assert view.has_next
+    get_page_mock.assert_awaited_once_with(
+        CHAT_ID, PAGE_SIZE + 1, "TYPE_1", [], None, None, name_prefix=None
+    )
+
+
+@patch("bot.command.subs.list_names.SUBSCRIPTIONS_PAGE_SIZE", PAGE_SIZE)
+@patch("bot.command.subs.list_names.get_stored_feeds_page", new_callable=AsyncMock)
+def test_load_last_page(get_page_mock: AsyncMock) -> None:
+    get_page_mock.return_value = [FEED_3]
+    view = run(_load_page(CHAT_ID, VIEW, after=("NAME_2", "TYPE_1")))
+    assert (FEED_3,) == view.feeds
+    assert view.has_previous
+    assert not view.has_next
+
+
+@patch("bot.command.subs.list_names.SUBSCRIPTIONS_PAGE_SIZE", PAGE_SIZE)
+@patch("bot.command.subs.list_names.get_stored_feeds_page", new_callable=AsyncMock)
+def test_load_previous_page(get_page_mock: AsyncMock) -> None:
+    get_page_mock.return_value = [FEED_1, FEED_2, FEED_3]
+    view = run(_load_page(CHAT_ID, VIEW, before=("NAME_4", "TYPE_1")))
+    assert (FEED_2, FEED_3) == view.feeds
+    assert view.has_previous
+    assert view.has_next
+
+
+@patch("bot.command.subs.list_names.get_stored_feeds_page", new_callable=AsyncMock)
+def test_load_search_page_of_all_types(get_page_mock: AsyncMock) -> None:
+    get_page_mock.return_value = []
+    run(_load_page(CHAT_ID, SubscriptionsView(0, TYPES, query="NAME")))
+    assert get_page_mock.call_args.args[2] is None
+    assert [("NAM", "NAN"), ("NAm", "NAn")] == get_page_mock.call_args.args[3][:2]
+    assert "NAME" == get_page_mock.call_args.kwargs["name_prefix"]
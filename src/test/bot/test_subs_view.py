@@ -0,0 +1,60 @@
+from asyncio import run
+from unittest.mock import AsyncMock, MagicMock
+
+from bot.command.subs.query_data import NamesData, TypesData
+from bot.command.subs.view import SubscriptionsView, create_view, resolve_view
+
+TYPES = ["TYPE_1", "TYPE_2"]
+SEARCH_QUERY = "QUERY"
+EXPECTED_VIEW = SubscriptionsView(0, TYPES)
+
+
+def context_mock() -> MagicMock:
+    context = MagicMock()
+    context.chat_data = {}
+    return context
+
+
+def query_mock(data) -> AsyncMock:
+    query = AsyncMock()
+    query.data = data
+    return query
+
+
+def test_create_view() -> None:
+    context = context_mock()
+    assert EXPECTED_VIEW == create_view(context, TYPES)
+
+
+def test_create_search_view() -> None:
+    context = context_mock()
+    assert EXPECTED_VIEW._replace(query=SEARCH_QUERY) == create_view(context, TYPES, SEARCH_QUERY)
+
+
+def test_create_view_replaces_previous_view() -> None:
+    context = context_mock()
+    create_view(context, TYPES)
+    assert 1 == create_view(context, TYPES).id
+
+
+def test_resolve_current_view() -> None:
+    context = context_mock()
+    create_view(context, TYPES)
+    query = query_mock(NamesData(0, 1))
+    assert EXPECTED_VIEW == run(resolve_view(query, context))
+    query.edit_message_text.assert_not_called()
+
+
+def test_resolve_outdated_view() -> None:
+    context = context_mock()
+    create_view(context, TYPES)
+    create_view(context, TYPES)
+    query = query_mock(TypesData(0))
+    assert run(resolve_view(query, context)) is None
+    query.edit_message_text.assert_awaited_once()
+
+
+def test_resolve_view_from_unknown_data() -> None:
+    query = query_mock({"TYPE": ["NAME"]})
+    assert run(resolve_view(query, context_mock())) is None
+    query.edit_message_text.assert_awaited_once()
@@ -0,0 +1,404 @@
+from asyncio import run
+from typing import AsyncIterator
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+from feedparser import FeedParserDict
+from pytest import fixture
+from telegram.error import BadRequest, Forbidden
+
+from bot.update_checker import (
+    _ChatUpdate,
+    _check_feed_for_updates,
+    _FeedUpdate,
+    _get_all_subscriptions,
+    _group_by_feed_link,
+    _parse_update,
+    _ParsedChatUpdate,
+    _pending_outbox_ids,
+    _PreparedChatUpdate,
+    _schedule_all_updates,
+    _schedule_next_check,
+    _send_update,
+    check_all_feeds,
+    resume_outbox_updates,
+)
+from db.wrapper import get_all_stored_data
+from feed.parser import ParsedEntry
+
+LOOKUP_INTERVAL = 3600
+CHAT_ID = 1
+FEED_TYPE = "FEED_TYPE"
+FEED_NAME = "FEED_NAME"
+FEED_LINK = "https://feed.link/FEED_NAME"
+SUBSCRIPTION = (CHAT_ID, FEED_TYPE, FEED_NAME, "LATEST_ID", None)
+ENTRY_1 = FeedParserDict(id="ID_1", link="LINK_1", published_parsed=None)
+ENTRY_2 = FeedParserDict(id="ID_2", link="LINK_2", published_parsed=None)
+PARSED_ENTRY_1 = ParsedEntry("LINK_1", "TITLE_1", "DESCRIPTION_1", [])
+PARSED_ENTRY_2 = ParsedEntry("LINK_2", "TITLE_2", "DESCRIPTION_2", [])
+PREPARED_UPDATE = MagicMock()
+
+
+def stored_data(*subscriptions: tuple) -> MagicMock:
+    async def get_all_stored_data(*_):
+        for subscription in subscriptions:
+            yield subscription
+
+    return MagicMock(side_effect=get_all_stored_data)
+
+
+@fixture(autouse=True)
+def feeds():
+    rss_feeds = {FEED_TYPE: {"url": "https://feed.link/{source_pattern}"}}
+    with (
+        patch("bot.update_checker.RSS_FEEDS", rss_feeds),
+        patch("feed.reader.RSS_FEEDS", rss_feeds),
+        patch("bot.update_checker.LOOKUP_INTERVAL", LOOKUP_INTERVAL),
+    ):
+        yield
+
+
+def documents(*subscriptions: tuple) -> AsyncIterator[dict]:
+    async def cursor():
+        for chat_id, feed_type, feed_name in subscriptions:
+            yield {
+                "chat_id": chat_id,
+                "feed_type": feed_type,
+                "feed_name": feed_name,
+                "latest_id": "",
+            }
+
+    return cursor()
+
+
+async def collect_groups(subscriptions: AsyncIterator[tuple]) -> list[tuple[str, list[int]]]:
+    return [
+        (feed_link, [chat_id for chat_id, *_ in group])
+        async for feed_link, group in _group_by_feed_link(subscriptions)
+    ]
+
+
+@fixture(autouse=True)
+def pending_outbox_ids():
+    yield
+    _pending_outbox_ids.clear()
+
+
+@fixture
+def pipeline_mocks():
+    with (
+        patch("bot.update_checker._bot", MagicMock()),
+        patch("bot.update_checker._media_stage", MagicMock(put=AsyncMock())) as media_stage,
+        patch("bot.update_checker.send_prepared_update", new_callable=AsyncMock) as send,
+        patch("bot.update_checker.handle_send_error", new_callable=AsyncMock) as handle_error,
+        patch("bot.update_checker.remove_outbox_update", new_callable=AsyncMock) as remove,
+        patch("bot.update_checker.release_update"),
+        patch("bot.update_checker.postpone_outbox_update", AsyncMock(return_value=1)) as postpone,
+    ):
+        yield media_stage.put, send, handle_error, remove, postpone
+
+
+def outbox_updates(*updates: tuple) -> MagicMock:
+    async def get_all_outbox_updates(*_):
+        for update in updates:
+            yield update
+
+    return MagicMock(side_effect=get_all_outbox_updates)
+
+
+@fixture
+def fetch_mock():
+    """Fetches of feeds, with their state stored in memory instead of the DB."""
+    state = {}
+
+    async def get_feed_state(_: str):
+        return None, None, state.get("interval"), state.get("next_check")
+
+    async def store_feed_schedule(_: str, interval: float, next_check: float):
+        state.update(interval=interval, next_check=next_check)
+
+    with (
+        patch("bot.update_checker.get_all_stored_data", stored_data(SUBSCRIPTION)),
+        patch("bot.update_checker.get_feed_state", side_effect=get_feed_state),
+        patch("bot.update_checker.store_feed_schedule", side_effect=store_feed_schedule),
+        patch("bot.update_checker._fetch_scheduler") as fetch_scheduler,
+    ):
+        fetch_scheduler.schedule = AsyncMock()
+        yield fetch_scheduler.schedule
+
+
+def run_lookup(fetch_mock: MagicMock, started_at: float, fetched_at: float, interval: float):
+    fetches = fetch_mock.call_count
+    with patch("bot.update_checker.time", return_value=started_at):
+        run(_schedule_all_updates(None))
+    if fetch_mock.call_count == fetches:
+        return
+    # Next check is stored only once the feed is fetched.
+    with (
+        patch("bot.update_checker.time", return_value=fetched_at),
+        patch("bot.update_checker.get_check_interval", return_value=interval),
+    ):
+        run(_schedule_next_check(FEED_LINK, FeedParserDict(), None, has_new_entries=False))
+
+
+def test_feed_with_lookup_interval_is_checked_on_every_lookup(fetch_mock) -> None:
+    run_lookup(fetch_mock, 0, 10, LOOKUP_INTERVAL)
+    run_lookup(fetch_mock, LOOKUP_INTERVAL, LOOKUP_INTERVAL + 10, LOOKUP_INTERVAL)
+    run_lookup(fetch_mock, 2 * LOOKUP_INTERVAL, 2 * LOOKUP_INTERVAL + 10, LOOKUP_INTERVAL)
+    assert 3 == fetch_mock.call_count
+
+
+def test_feed_with_longer_interval_skips_lookups(fetch_mock) -> None:
+    run_lookup(fetch_mock, 0, 10, 2 * LOOKUP_INTERVAL)
+    run_lookup(fetch_mock, LOOKUP_INTERVAL, LOOKUP_INTERVAL + 10, 2 * LOOKUP_INTERVAL)
+    run_lookup(fetch_mock, 2 * LOOKUP_INTERVAL, 2 * LOOKUP_INTERVAL + 10, 2 * LOOKUP_INTERVAL)
+    assert 2 == fetch_mock.call_count
+
+
+def test_only_feeds_passing_filter_are_scheduled(fetch_mock) -> None:
+    run(_schedule_all_updates(lambda feed_link: feed_link != FEED_LINK))
+    fetch_mock.assert_not_called()
+
+
+@patch("bot.update_checker.parse_entry", side_effect=[PARSED_ENTRY_1, PARSED_ENTRY_2])
+def test_outbox_is_stored_before_latest_data(_, pipeline_mocks) -> None:
+    media_put_mock, *_ = pipeline_mocks
+    writes = MagicMock()
+    writes.store_outbox_updates = AsyncMock(return_value=["OUTBOX_1", "OUTBOX_2"])
+    writes.update_all_stored_latest_data = AsyncMock(return_value=[True])
+    writes.store_feed_validators = AsyncMock()
+    updates = [_ChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, "ID_0", [ENTRY_1, ENTRY_2])]
+    with (
+        patch("bot.update_checker.store_outbox_updates", writes.store_outbox_updates),
+        patch(
+            "bot.update_checker.update_all_stored_latest_data", writes.update_all_stored_latest_data
+        ),
+        patch("bot.update_checker.store_feed_validators", writes.store_feed_validators),
+    ):
+        run(_parse_update(_FeedUpdate(FEED_LINK, "ETAG", "MODIFIED", updates)))
+    assert [
+        call.store_outbox_updates(
+            [
+                (CHAT_ID, FEED_TYPE, FEED_NAME, *PARSED_ENTRY_1),
+                (CHAT_ID, FEED_TYPE, FEED_NAME, *PARSED_ENTRY_2),
+            ]
+        ),
+        call.update_all_stored_latest_data(
+            [(CHAT_ID, FEED_TYPE, FEED_NAME, "ID_0", "ID_2", "LINK_2", None)]
+        ),
+        call.store_feed_validators(FEED_LINK, "ETAG", "MODIFIED"),
+    ] == writes.mock_calls
+    entries = [("OUTBOX_1", PARSED_ENTRY_1), ("OUTBOX_2", PARSED_ENTRY_2)]
+    media_put_mock.assert_awaited_once_with(
+        _ParsedChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, entries)
+    )
+
+
+@patch("bot.update_checker.parse_entry", side_effect=[PARSED_ENTRY_1, PARSED_ENTRY_2])
+@patch("bot.update_checker.store_outbox_updates", AsyncMock(return_value=["OUTBOX_1", "OUTBOX_2"]))
+@patch("bot.update_checker.update_all_stored_latest_data", AsyncMock(return_value=[False, True]))
+@patch("bot.update_checker.store_feed_validators", AsyncMock())
+def test_entries_handled_by_another_process_are_dropped(_, pipeline_mocks) -> None:
+    media_put_mock, _, _, remove_mock, _ = pipeline_mocks
+    updates = [
+        _ChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, "ID_0", [ENTRY_1]),
+        _ChatUpdate(2, FEED_TYPE, FEED_NAME, "ID_0", [ENTRY_2]),
+    ]
+    run(_parse_update(_FeedUpdate(FEED_LINK, None, None, updates)))
+    remove_mock.assert_awaited_once_with("OUTBOX_1")
+    media_put_mock.assert_awaited_once_with(
+        _ParsedChatUpdate(2, FEED_TYPE, FEED_NAME, [("OUTBOX_2", PARSED_ENTRY_2)])
+    )
+
+
+def test_entry_is_removed_from_outbox_after_it_is_sent(pipeline_mocks) -> None:
+    _, send_mock, handle_error_mock, remove_mock, _ = pipeline_mocks
+    _pending_outbox_ids.add("OUTBOX_1")
+    entries = [("OUTBOX_1", PARSED_ENTRY_1, PREPARED_UPDATE)]
+    run(_send_update(_PreparedChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, entries)))
+    send_mock.assert_awaited_once()
+    handle_error_mock.assert_not_awaited()
+    remove_mock.assert_awaited_once_with("OUTBOX_1")
+    assert not _pending_outbox_ids
+
+
+@patch("bot.update_checker.PIPELINE_OUTBOX_RETRY_DELAY", 60)
+def test_entry_is_postponed_when_it_is_not_sent(pipeline_mocks) -> None:
+    _, send_mock, handle_error_mock, remove_mock, postpone_mock = pipeline_mocks
+    send_mock.side_effect = [BadRequest("error"), None]
+    handle_error_mock.side_effect = BadRequest("fallback error")
+    postpone_mock.return_value = 1
+    entries = [
+        ("OUTBOX_1", PARSED_ENTRY_1, PREPARED_UPDATE),
+        ("OUTBOX_2", PARSED_ENTRY_2, PREPARED_UPDATE),
+    ]
+    run(_send_update(_PreparedChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, entries)))
+    postpone_mock.assert_awaited_once_with("OUTBOX_1", 60)
+    # Following entries are still sent.
+    remove_mock.assert_awaited_once_with("OUTBOX_2")
+
+
+@patch("bot.update_checker.PIPELINE_OUTBOX_MAX_ATTEMPTS", 3)
+def test_entry_is_dropped_after_max_attempts(pipeline_mocks) -> None:
+    _, send_mock, handle_error_mock, remove_mock, postpone_mock = pipeline_mocks
+    send_mock.side_effect = BadRequest("error")
+    handle_error_mock.side_effect = BadRequest("fallback error")
+    postpone_mock.return_value = 3
+    entries = [("OUTBOX_1", PARSED_ENTRY_1, PREPARED_UPDATE)]
+    run(_send_update(_PreparedChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, entries)))
+    postpone_mock.assert_awaited_once()
+    remove_mock.assert_awaited_once_with("OUTBOX_1")
+
+
+def test_sending_stops_when_bot_is_blocked(pipeline_mocks) -> None:
+    _, send_mock, handle_error_mock, remove_mock, _ = pipeline_mocks
+    error = Forbidden("blocked")
+    send_mock.side_effect = error
+    entries = [
+        ("OUTBOX_1", PARSED_ENTRY_1, PREPARED_UPDATE),
+        ("OUTBOX_2", PARSED_ENTRY_2, PREPARED_UPDATE),
+    ]
+    run(_send_update(_PreparedChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, entries)))
+    send_mock.assert_awaited_once()
+    assert error == handle_error_mock.await_args.args[1]
+    # Chat data, together with its outbox, is removed by the error handler.
+    remove_mock.assert_not_awaited()
+
+
+@patch("bot.update_checker.QUIET_HOURS", [])
+@patch("bot.update_checker._schedule_all_updates", new_callable=AsyncMock)
+@patch("bot.update_checker._fetch_scheduler", MagicMock(wait_until_idle=AsyncMock()))
+def test_postponed_outbox_updates_are_retried_on_lookup(_, pipeline_mocks) -> None:
+    media_put_mock, *_ = pipeline_mocks
+    stored_updates = outbox_updates(("OUTBOX_1", CHAT_ID, FEED_TYPE, FEED_NAME, *PARSED_ENTRY_1))
+    with patch("bot.update_checker.get_all_outbox_updates", stored_updates):
+        run(check_all_feeds())
+    # New entries are queued right after parsing, only postponed ones are read from outbox.
+    assert stored_updates.call_args.args[1]
+    media_put_mock.assert_awaited_once()
+
+
+@patch("bot.update_checker.release_update")
+def test_prepared_updates_are_released_after_sending(release_mock, pipeline_mocks) -> None:
+    _, send_mock, handle_error_mock, _, _ = pipeline_mocks
+    send_mock.side_effect = [None, BadRequest("error")]
+    handle_error_mock.side_effect = BadRequest("fallback error")
+    entries = [
+        ("OUTBOX_1", PARSED_ENTRY_1, PREPARED_UPDATE),
+        ("OUTBOX_2", PARSED_ENTRY_2, PREPARED_UPDATE),
+        ("OUTBOX_3", PARSED_ENTRY_2, ValueError("not prepared")),
+    ]
+    run(_send_update(_PreparedChatUpdate(CHAT_ID, FEED_TYPE, FEED_NAME, entries)))
+    # Entries which couldn't be sent are released as well.
+    assert [call(PREPARED_UPDATE), call(PREPARED_UPDATE)] == release_mock.call_args_list
+
+
+@patch("bot.update_checker.get_parsed_feed", new_callable=AsyncMock)
+def test_outbox_updates_are_resumed_without_fetching(get_parsed_feed_mock, pipeline_mocks) -> None:
+    media_put_mock, *_ = pipeline_mocks
+    stored_updates = outbox_updates(
+        ("OUTBOX_1", CHAT_ID, FEED_TYPE, FEED_NAME, *PARSED_ENTRY_1),
+        ("OUTBOX_2", CHAT_ID, FEED_TYPE, FEED_NAME, *PARSED_ENTRY_2),
+        ("OUTBOX_3", CHAT_ID, FEED_TYPE, "OTHER_NAME", *PARSED_ENTRY_1),
+    )
+    with patch("bot.update_checker.get_all_outbox_updates", stored_updates):
+        run(resume_outbox_updates(None))
+    get_parsed_feed_mock.assert_not_awaited()
+    assert [
+        call(
+            _ParsedChatUpdate(
+                CHAT_ID,
+                FEED_TYPE,
+                FEED_NAME,
+                [("OUTBOX_1", PARSED_ENTRY_1), ("OUTBOX_2", PARSED_ENTRY_2)],
+            )
+        ),
+        call(_ParsedChatUpdate(CHAT_ID, FEED_TYPE, "OTHER_NAME", [("OUTBOX_3", PARSED_ENTRY_1)])),
+    ] == media_put_mock.await_args_list
+    assert {"OUTBOX_1", "OUTBOX_2", "OUTBOX_3"} == _pending_outbox_ids
+
+
+def test_pending_outbox_updates_are_not_queued_again(pipeline_mocks) -> None:
+    media_put_mock, *_ = pipeline_mocks
+    _pending_outbox_ids.add("OUTBOX_1")
+    stored_updates = outbox_updates(("OUTBOX_1", CHAT_ID, FEED_TYPE, FEED_NAME, *PARSED_ENTRY_1))
+    with patch("bot.update_checker.get_all_outbox_updates", stored_updates):
+        run(resume_outbox_updates(None))
+    media_put_mock.assert_not_awaited()
+
+
+def test_subscriptions_are_grouped_across_batches() -> None:
+    batches = [
+        documents((1, FEED_TYPE, "A"), (2, FEED_TYPE, "A")),
+        documents((3, FEED_TYPE, "A"), (1, FEED_TYPE, "B")),
+        documents((2, FEED_TYPE, "B")),
+        documents(),
+    ]
+    with (
+        patch("db.wrapper.DB_BATCH_SIZE", 2),
+        patch("db.wrapper.find_many", side_effect=batches) as find_many_mock,
+    ):
+        groups = run(collect_groups(get_all_stored_data()))
+    assert [("https://feed.link/A", [1, 2, 3]), ("https://feed.link/B", [1, 2])] == groups
+    assert 4 == find_many_mock.call_count
+
+
+def test_subscriptions_of_unknown_types_are_skipped() -> None:
+    subscriptions = stored_data(
+        (1, FEED_TYPE, "A", "", None),
+        (1, "UNKNOWN_TYPE", "A", "", None),
+        (2, FEED_TYPE, "A", "", None),
+    )
+    groups = run(collect_groups(subscriptions()))
+    assert [("https://feed.link/A", [1, 2])] == groups
+
+
+def test_feed_types_sharing_link_are_grouped_together() -> None:
+    shared_url = "https://{source_pattern}.shared.link/rss"
+    rss_feeds = {
+        "TYPE_A": {"url": shared_url},
+        "TYPE_B": {"url": shared_url},
+        "TYPE_C": {"url": "https://other.link/{source_pattern}"},
+    }
+    subscriptions = {
+        "TYPE_A": [(1, "TYPE_A", "a", "", None), (2, "TYPE_A", "b", "", None)],
+        "TYPE_B": [(3, "TYPE_B", "a", "", None), (4, "TYPE_B", "c", "", None)],
+        "TYPE_C": [(5, "TYPE_C", "a", "", None)],
+    }
+
+    async def get_all_stored_data(feed_type: str):
+        for subscription in subscriptions[feed_type]:
+            yield subscription
+
+    with (
+        patch("bot.update_checker.RSS_FEEDS", rss_feeds),
+        patch("feed.reader.RSS_FEEDS", rss_feeds),
+        patch("bot.update_checker.get_all_stored_data", side_effect=get_all_stored_data),
+    ):
+        groups = run(collect_groups(_get_all_subscriptions()))
+    assert [
+        ("https://a.shared.link/rss", [1, 3]),
+        ("https://b.shared.link/rss", [2]),
+        ("https://c.shared.link/rss", [4]),
+        ("https://other.link/a", [5]),
+    ] == groups
+
+
+@patch("bot.update_checker.feed_is_not_modified", MagicMock(return_value=False))
+@patch("bot.update_checker.feed_is_valid", MagicMock(return_value=True))
+@patch("bot.update_checker._schedule_next_check", new_callable=AsyncMock)
+@patch("bot.update_checker.get_parsed_feed", new_callable=AsyncMock)
+@patch("bot.update_checker.store_feed_validators", new_callable=AsyncMock)
+def test_validators_are_stored_only_after_new_entries(store_validators_mock, get_feed_mock, _):
+    get_feed_mock.return_value = FeedParserDict(etag="ETAG", modified="MODIFIED")
+    with (
+        patch("bot.update_checker._parse_stage", MagicMock(put=AsyncMock())) as parse_stage,
+        patch("bot.update_checker.get_not_handled_entries", side_effect=[[], [ENTRY_1]]),
+    ):
+        # Without new entries, validators are stored right away.
+        run(_check_feed_for_updates(FEED_LINK, [SUBSCRIPTION], None, None, None))
+        store_validators_mock.assert_awaited_once_with(FEED_LINK, "ETAG", "MODIFIED")
+        store_validators_mock.reset_mock()
+        run(_check_feed_for_updates(FEED_LINK, [SUBSCRIPTION], None, None, None))
+    store_validators_mock.assert_not_awaited()
+    feed_update = parse_stage.put.await_args.args[0]
+    assert (FEED_LINK, "ETAG", "MODIFIED") == feed_update[:3]
@@ -0,0 +1,105 @@
+from io import BytesIO
+from struct import pack
+
+from pytest import mark
+
+from bot.video_probe import probe_video_dimensions
+
+WIDTH = 1920
+HEIGHT = 1080
+DISPLAY_WIDTH = 1440
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return pack(">I4s", len(payload) + 8, box_type) + payload
+
+
+def tkhd(width: int, height: int, version: int = 0) -> bytes:
+    times_size = 32 if version == 1 else 20
+    payload = bytes([version, 0, 0, 0]) + bytes(times_size + 52)
+    return box(b"tkhd", payload + pack(">II", width << 16, height << 16))
+
+
+def hdlr(handler: bytes) -> bytes:
+    return box(b"hdlr", bytes(8) + handler + bytes(12))
+
+
+def stsd(width: int, height: int) -> bytes:
+    sample_entry = bytes(8) + bytes(8) + bytes(16) + pack(">HH", width, height) + bytes(50)
+    return box(b"stsd", bytes(4) + pack(">I", 1) + sample_entry)
+
+
+def trak(handler: bytes, tkhd_box: bytes, width: int = WIDTH, height: int = HEIGHT) -> bytes:
+    stbl = box(b"stbl", stsd(width, height))
+    mdia = box(b"mdia", hdlr(handler) + box(b"minf", stbl))
+    return box(b"trak", tkhd_box + mdia)
+
+
+def mp4(*traks: bytes, moov_at_end: bool = False) -> BytesIO:
+    ftyp = box(b"ftyp", b"isom" + bytes(4))
+    mdat = box(b"mdat", bytes(10_000))
+    moov = box(b"moov", b"".join(traks))
+    return BytesIO(ftyp + (mdat + moov if moov_at_end else moov + mdat))
+
+
+def vint(value: int, length: int) -> bytes:
+    return ((1 << (7 * length)) | value).to_bytes(length, "big")
+
+
+def element(element_id: int, payload: bytes, unknown_size: bool = False) -> bytes:
+    size = b"\x01\xff\xff\xff\xff\xff\xff\xff" if unknown_size else vint(len(payload), 8)
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + size + payload
+
+
+def uint(element_id: int, value: int) -> bytes:
+    return element(element_id, value.to_bytes(2, "big"))
+
+
+def webm(track_type: int = 1, display_width: int = None, unknown_size: bool = False) -> BytesIO:
+    video = uint(0xB0, WIDTH) + uint(0xBA, HEIGHT)
+    if display_width:
+        video += uint(0x54B0, display_width) + uint(0x54BA, HEIGHT)
+    track_entry = element(0xAE, uint(0x83, track_type) + element(0xE0, video))
+    tracks = element(0x1654AE6B, track_entry)
+    cluster = element(0x1F43B675, bytes(1000), unknown_size)
+    segment = element(0x18538067, tracks + cluster, unknown_size)
+    return BytesIO(element(0x1A45DFA3, bytes(4)) + segment)
+
+
+@mark.parametrize(argnames="version", argvalues=[0, 1])
+@mark.parametrize(argnames="moov_at_end", argvalues=[False, True])
+def test_mp4_dimensions(version: int, moov_at_end: bool) -> None:
+    video = mp4(trak(b"vide", tkhd(WIDTH, HEIGHT, version)), moov_at_end=moov_at_end)
+    assert (WIDTH, HEIGHT) == probe_video_dimensions(video)
+
+
+def test_mp4_audio_track_is_skipped() -> None:
+    video = mp4(trak(b"soun", tkhd(0, 0)), trak(b"vide", tkhd(WIDTH, HEIGHT)))
+    assert (WIDTH, HEIGHT) == probe_video_dimensions(video)
+
+
+def test_mp4_sample_description_is_used_without_track_dimensions() -> None:
+    video = mp4(trak(b"vide", tkhd(0, 0)))
+    assert (WIDTH, HEIGHT) == probe_video_dimensions(video)
+
+
+def test_mp4_without_video_track() -> None:
+    assert probe_video_dimensions(mp4(trak(b"soun", tkhd(0, 0)))) is None
+
+
+@mark.parametrize(argnames="unknown_size", argvalues=[False, True])
+def test_webm_dimensions(unknown_size: bool) -> None:
+    assert (WIDTH, HEIGHT) == probe_video_dimensions(webm(unknown_size=unknown_size))
+
+
+def test_webm_display_dimensions_are_preferred() -> None:
+    assert (DISPLAY_WIDTH, HEIGHT) == probe_video_dimensions(webm(display_width=DISPLAY_WIDTH))
+
+
+def test_webm_without_video_track() -> None:
+    assert probe_video_dimensions(webm(track_type=2)) is None
+
+
+@mark.parametrize(argnames="content", argvalues=[b"", b"not a video", bytes(100)])
+def test_unknown_content(content: bytes) -> None:
+    assert probe_video_dimensions(BytesIO(content)) is None
@@ -0,0 +1,100 @@
+from db.chat_cache import MISSING, ChatCache
+
+KIND = "KIND"
+OTHER_KIND = "OTHER_KIND"
+KEY = "KEY"
+VALUE = "VALUE"
+
+
+def test_get_missing_value() -> None:
+    cache = ChatCache(2, 2)
+    assert MISSING is cache.get(1, KIND, KEY)
+    cache.put(1, KIND, KEY, VALUE)
+    assert MISSING is cache.get(1, KIND, "OTHER_KEY")
+
+
+def test_put_and_get_value() -> None:
+    cache = ChatCache(2, 2)
+    cache.put(1, KIND, KEY, None)
+    assert cache.get(1, KIND, KEY) is None
+
+
+def test_least_recently_used_chat_is_removed() -> None:
+    cache = ChatCache(2, 2)
+    cache.put(1, KIND, KEY, VALUE)
+    cache.put(2, KIND, KEY, VALUE)
+    cache.get(1, KIND, KEY)
+    cache.put(3, KIND, KEY, VALUE)
+    assert VALUE == cache.get(1, KIND, KEY)
+    assert MISSING is cache.get(2, KIND, KEY)
+    assert VALUE == cache.get(3, KIND, KEY)
+
+
+def test_replace_updates_only_cached_values() -> None:
+    cache = ChatCache(2, 2)
+    cache.put(1, KIND, KEY, VALUE)
+    cache.replace(1, KIND, KEY, "NEW_VALUE")
+    cache.replace(1, KIND, "OTHER_KEY", "NEW_VALUE")
+    cache.replace(2, KIND, KEY, "NEW_VALUE")
+    assert "NEW_VALUE" == cache.get(1, KIND, KEY)
+    assert MISSING is cache.get(1, KIND, "OTHER_KEY")
+    assert MISSING is cache.get(2, KIND, KEY)
+
+
+def test_invalidate_single_kind() -> None:
+    cache = ChatCache(2, 2)
+    cache.put(1, KIND, KEY, VALUE)
+    cache.put(1, OTHER_KIND, KEY, VALUE)
+    cache.invalidate(1, KIND)
+    assert MISSING is cache.get(1, KIND, KEY)
+    assert VALUE == cache.get(1, OTHER_KIND, KEY)
+
+
+def test_invalidate_whole_chat() -> None:
+    cache = ChatCache(2, 2)
+    cache.put(1, KIND, KEY, VALUE)
+    cache.put(1, OTHER_KIND, KEY, VALUE)
+    cache.invalidate(1)
+    assert MISSING is cache.get(1, KIND, KEY)
+    assert MISSING is cache.get(1, OTHER_KIND, KEY)
+
+
+def test_least_recently_used_value_of_kind_is_removed() -> None:
+    cache = ChatCache(2, 2)
+    cache.put(1, KIND, 1, VALUE)
+    cache.put(1, KIND, 2, VALUE)
+    cache.get(1, KIND, 1)
+    cache.put(1, KIND, 3, VALUE)
+    cache.put(1, OTHER_KIND, 4, VALUE)
+    assert VALUE == cache.get(1, KIND, 1)
+    assert MISSING is cache.get(1, KIND, 2)
+    assert VALUE == cache.get(1, KIND, 3)
+
+
+def test_value_read_at_current_version_is_cached() -> None:
+    cache = ChatCache(2, 2)
+    version = cache.version(1)
+    cache.put(1, KIND, KEY, VALUE, version)
+    assert VALUE == cache.get(1, KIND, KEY)
+
+
+def test_value_read_before_write_is_not_cached() -> None:
+    cache = ChatCache(2, 2)
+    for write in [
+        lambda: cache.put(1, OTHER_KIND, KEY, VALUE),
+        lambda: cache.replace(1, KIND, KEY, VALUE),
+        lambda: cache.invalidate(1, OTHER_KIND),
+        lambda: cache.invalidate(1),
+    ]:
+        version = cache.version(1)
+        write()
+        cache.put(1, KIND, KEY, "STALE_VALUE", version)
+        assert "STALE_VALUE" != cache.get(1, KIND, KEY)
+
+
+def test_value_read_for_removed_chat_is_not_cached() -> None:
+    cache = ChatCache(1, 2)
+    version = cache.version(1)
+    cache.put(2, KIND, KEY, VALUE)
+    cache.put(1, KIND, KEY, VALUE, version)
+    assert MISSING is cache.get(1, KIND, KEY)
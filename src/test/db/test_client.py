@@ -1,155 +1,320 @@
-from unittest.mock import MagicMock, patch
+from asyncio import iscoroutine, run
+from typing import Any, Callable
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from pymongo import ASCENDING
+from pymongo import ASCENDING, UpdateOne
 from pytest import fixture, mark, raises
 
 from db.client import (
     delete_many,
+    distinct,
     exists,
     find_many,
     find_one,
     initialize_db,
+    insert_many,
     insert_one,
+    update_many,
     update_one,
 )
-from settings import DB_FEEDS_NAME, DB_HOST, DB_NAME, DB_PORT
+from settings import (
+    DB_FEED_STATE_NAME,
+    DB_FEEDS_NAME,
+    DB_FILE_IDS_NAME,
+    DB_HOST,
+    DB_LEASES_NAME,
+    DB_NAME,
+    DB_OUTBOX_NAME,
+    DB_PERSISTENCE_NAME,
+    DB_PORT,
+)
+
+
+def mocked_collection() -> AsyncMock:
+    collection = AsyncMock()
+    # Only "find" is synchronous in async client, cursor is iterated asynchronously instead.
+    collection.find = MagicMock()
+    return collection
 
-feeds_collection_mock = MagicMock()
+
+feeds_collection_mock = mocked_collection()
+feed_state_collection_mock = mocked_collection()
+file_ids_collection_mock = mocked_collection()
+outbox_collection_mock = mocked_collection()
+persistence_collection_mock = mocked_collection()
+leases_collection_mock = mocked_collection()
 operation_result_mock = MagicMock()
 document = MagicMock()
 db_filter = MagicMock()
+bulk_updates = [({"filter": "value"}, {"$set": {"field": "value"}})]
 
 
 def mocked_mongo_client(host: str, port: str):
     assert DB_HOST == host
     assert DB_PORT == port
-    return {DB_NAME: {DB_FEEDS_NAME: feeds_collection_mock}}
+    return {
+        DB_NAME: {
+            DB_FEEDS_NAME: feeds_collection_mock,
+            DB_FEED_STATE_NAME: feed_state_collection_mock,
+            DB_FILE_IDS_NAME: file_ids_collection_mock,
+            DB_OUTBOX_NAME: outbox_collection_mock,
+            DB_PERSISTENCE_NAME: persistence_collection_mock,
+            DB_LEASES_NAME: leases_collection_mock,
+        }
+    }
+
+
+def call(client_function: Callable, *args: Any, **kwargs: Any) -> Any:
+    result = client_function(*args, **kwargs)
+    return run(result) if iscoroutine(result) else result
 
 
 @fixture(autouse=True)
 def clear_initialized_collection():
     import db.client as dbc
 
-    dbc._feeds_collection = None
+    dbc._collections.clear()
     yield
 
 
 @fixture(autouse=True)
 def clear_mocks():
     feeds_collection_mock.reset_mock()
+    feed_state_collection_mock.reset_mock()
+    file_ids_collection_mock.reset_mock()
+    outbox_collection_mock.reset_mock()
+    persistence_collection_mock.reset_mock()
+    leases_collection_mock.reset_mock()
     yield
 
 
-@patch("db.client.MongoClient", side_effect=mocked_mongo_client)
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
 def test_initialize_db(mongo_client_mock: MagicMock):
     feeds_collection_mock.create_index.return_value = operation_result_mock
 
-    initialize_db()
+    run(initialize_db())
 
     mongo_client_mock.assert_called()
 
     create_feeds_index = feeds_collection_mock.create_index
-    create_feeds_index.assert_called()
-    create_feeds_index_kwargs = create_feeds_index.call_args.kwargs
-    expected_feeds_keys = [
+    assert 3 == create_feeds_index.call_count
+    unique_feeds_index_kwargs, sorting_feeds_index_kwargs, chat_feeds_index_kwargs = [
+        call.kwargs for call in create_feeds_index.call_args_list
+    ]
+    expected_unique_feeds_keys = [
         ("chat_id", ASCENDING),
         ("feed_name", ASCENDING),
         ("feed_type", ASCENDING),
     ]
-    assert expected_feeds_keys == create_feeds_index_kwargs.get("keys")
-    assert create_feeds_index_kwargs.get("unique")
+    assert expected_unique_feeds_keys == unique_feeds_index_kwargs.get("keys")
+    assert unique_feeds_index_kwargs.get("unique")
+    expected_sorting_feeds_keys = [
+        ("feed_type", ASCENDING),
+        ("feed_name", ASCENDING),
+        ("chat_id", ASCENDING),
+    ]
+    assert expected_sorting_feeds_keys == sorting_feeds_index_kwargs.get("keys")
+    assert not sorting_feeds_index_kwargs.get("unique")
+    expected_chat_feeds_keys = [
+        ("chat_id", ASCENDING),
+        ("feed_type", ASCENDING),
+        ("feed_name", ASCENDING),
+    ]
+    assert expected_chat_feeds_keys == chat_feeds_index_kwargs.get("keys")
+    assert not chat_feeds_index_kwargs.get("unique")
+
+    create_feed_state_index = feed_state_collection_mock.create_index
+    create_feed_state_index.assert_called()
+    create_feed_state_index_kwargs = create_feed_state_index.call_args.kwargs
+    assert [("feed_link", ASCENDING)] == create_feed_state_index_kwargs.get("keys")
+    assert create_feed_state_index_kwargs.get("unique")
+
+    create_file_ids_index = file_ids_collection_mock.create_index
+    create_file_ids_index.assert_called()
+    create_file_ids_index_kwargs = create_file_ids_index.call_args.kwargs
+    assert [("digest", ASCENDING)] == create_file_ids_index_kwargs.get("keys")
+    assert create_file_ids_index_kwargs.get("unique")
 
+    create_outbox_index = outbox_collection_mock.create_index
+    create_outbox_index.assert_called()
+    create_outbox_index_kwargs = create_outbox_index.call_args.kwargs
+    expected_outbox_keys = [("chat_id", ASCENDING), ("created_at", ASCENDING)]
+    assert expected_outbox_keys == create_outbox_index_kwargs.get("keys")
+    assert not create_outbox_index_kwargs.get("unique")
 
-@patch("db.client.MongoClient", side_effect=mocked_mongo_client)
+    create_persistence_index = persistence_collection_mock.create_index
+    create_persistence_index.assert_called()
+    create_persistence_index_kwargs = create_persistence_index.call_args.kwargs
+    expected_persistence_keys = [("kind", ASCENDING), ("key", ASCENDING)]
+    assert expected_persistence_keys == create_persistence_index_kwargs.get("keys")
+    assert create_persistence_index_kwargs.get("unique")
+
+    create_leases_index = leases_collection_mock.create_index
+    create_leases_index.assert_called()
+    create_leases_index_kwargs = create_leases_index.call_args.kwargs
+    expected_leases_keys = [("kind", ASCENDING), ("key", ASCENDING)]
+    assert expected_leases_keys == create_leases_index_kwargs.get("keys")
+    assert create_leases_index_kwargs.get("unique")
+
+
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
 def test_db_is_not_initialized_again(mongo_client_mock: MagicMock):
     feeds_collection_mock.create_index.return_value = operation_result_mock
-    initialize_db()
-    initialize_db()
+    run(initialize_db())
+    run(initialize_db())
     mongo_client_mock.assert_called_once()
-    feeds_collection_mock.create_index.assert_called_once()
+    feed_state_collection_mock.create_index.assert_called_once()
 
 
-@patch("db.client.MongoClient", side_effect=mocked_mongo_client)
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
 @mark.parametrize(
     argnames=["client_function", "db_function", "args"],
     argvalues=[
         (insert_one, "insert_one", (document,)),
+        (insert_many, "insert_many", ([document],)),
         (delete_many, "delete_many", (db_filter,)),
         (update_one, "find_one_and_update", (db_filter, document)),
         (find_many, "find", (db_filter,)),
         (find_one, "find_one", (db_filter,)),
+        (distinct, "distinct", ("key", db_filter)),
     ],
 )
 def test_db_operations(_, client_function, db_function, args):
-    initialize_db()
+    run(initialize_db())
     db_function = getattr(feeds_collection_mock, db_function)
     db_function.return_value = operation_result_mock
-    operation_result = client_function(*args)
+    operation_result = call(client_function, *args)
     db_function.assert_called()
     assert operation_result_mock == operation_result
     assert args == db_function.call_args.args
 
 
-@patch("db.client.MongoClient", side_effect=mocked_mongo_client)
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
 @mark.parametrize(argnames="document_count", argvalues=[0, 1, 2])
 def test_element_exists(_, document_count: int):
-    initialize_db()
+    run(initialize_db())
     feeds_collection_mock.count_documents.return_value = document_count
-    result = exists(db_filter)
+    result = run(exists(db_filter))
     feeds_collection_mock.count_documents.assert_called()
     assert bool(document_count) == result
     assert (db_filter,) == feeds_collection_mock.count_documents.call_args.args
 
 
-@patch("db.client.MongoClient", side_effect=mocked_mongo_client)
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
 @mark.parametrize(
     argnames=["client_function", "db_function", "args"],
     argvalues=[
         (insert_one, "insert_one", (document,)),
+        (insert_many, "insert_many", ([document],)),
         (delete_many, "delete_many", (db_filter,)),
         (update_one, "find_one_and_update", (db_filter, document)),
         (find_many, "find", (db_filter,)),
         (find_one, "find_one", (db_filter,)),
+        (distinct, "distinct", ("key", db_filter)),
         (exists, "count_documents", (db_filter,)),
+        (update_many, "bulk_write", (bulk_updates,)),
     ],
 )
-def test_correct_collection_is_selected(_, client_function, db_function, args):
-    initialize_db()
-    client_function(*args, collection=DB_FEEDS_NAME)
-    getattr(feeds_collection_mock, db_function).assert_called_once()
+@mark.parametrize(
+    argnames=["collection_name", "collection_mock"],
+    argvalues=[
+        (DB_FEEDS_NAME, feeds_collection_mock),
+        (DB_FEED_STATE_NAME, feed_state_collection_mock),
+        (DB_FILE_IDS_NAME, file_ids_collection_mock),
+        (DB_OUTBOX_NAME, outbox_collection_mock),
+        (DB_PERSISTENCE_NAME, persistence_collection_mock),
+        (DB_LEASES_NAME, leases_collection_mock),
+    ],
+)
+def test_correct_collection_is_selected(
+    _, client_function, db_function, args, collection_name, collection_mock
+):
+    run(initialize_db())
+    call(client_function, *args, collection=collection_name)
+    getattr(collection_mock, db_function).assert_called_once()
 
 
-@patch("db.client.MongoClient", side_effect=mocked_mongo_client)
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
+def test_update_many(_):
+    run(initialize_db())
+    feeds_collection_mock.bulk_write.return_value = operation_result_mock
+    operation_result = run(update_many(bulk_updates * 2))
+    feeds_collection_mock.bulk_write.assert_called_once()
+    assert operation_result_mock == operation_result
+    expected_operations = [
+        UpdateOne(*bulk_updates[0], upsert=False),
+        UpdateOne(*bulk_updates[0], upsert=False),
+    ]
+    assert (expected_operations,) == feeds_collection_mock.bulk_write.call_args.args
+    assert not feeds_collection_mock.bulk_write.call_args.kwargs.get("ordered")
+
+
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
+@mark.parametrize(argnames="upsert", argvalues=[False, True])
+def test_update_many_upsert(_, upsert: bool):
+    run(initialize_db())
+    run(update_many(bulk_updates, upsert=upsert))
+    expected_operations = [UpdateOne(*bulk_updates[0], upsert=upsert)]
+    assert (expected_operations,) == feeds_collection_mock.bulk_write.call_args.args
+
+
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
+@mark.parametrize(argnames="upsert", argvalues=[False, True])
+def test_update_one_upsert(_, upsert: bool):
+    run(initialize_db())
+    run(update_one(db_filter, document, upsert=upsert))
+    assert upsert == feeds_collection_mock.find_one_and_update.call_args.kwargs.get("upsert")
+
+
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
 @mark.parametrize(
     argnames=["client_function", "args"],
     argvalues=[
         (insert_one, (document,)),
+        (insert_many, ([document],)),
         (delete_many, (db_filter,)),
         (update_one, (db_filter, document)),
         (find_many, (db_filter,)),
         (find_one, (db_filter,)),
+        (distinct, ("key", db_filter)),
         (exists, (db_filter,)),
+        (update_many, (bulk_updates,)),
     ],
 )
 def test_db_operations_fail_on_uninitialized_db(_, client_function, args):
     with raises(AssertionError) as exception_info:
-        client_function(*args)
+        call(client_function, *args)
     assert str(exception_info.value) == "DB is not initialized!"
 
 
-@patch("db.client.MongoClient", side_effect=mocked_mongo_client)
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
 @mark.parametrize(
     argnames=["client_function", "args"],
     argvalues=[
         (insert_one, (document,)),
+        (insert_many, ([document],)),
         (delete_many, (db_filter,)),
         (update_one, (db_filter, document)),
         (find_many, (db_filter,)),
         (find_one, (db_filter,)),
+        (distinct, ("key", db_filter)),
         (exists, (db_filter,)),
+        (update_many, (bulk_updates,)),
     ],
 )
 def test_db_operations_fail_on_unexpected_collection_name(_, client_function, args):
     with raises(ValueError) as exception_info:
-        client_function(*args, collection="unexpected_collection_name")
+        call(client_function, *args, collection="unexpected_collection_name")
     assert str(exception_info.value) == f"Unknown collection name: unexpected_collection_name"
+
+
+@patch("db.client.AsyncMongoClient", side_effect=mocked_mongo_client)
+def test_find_many_with_query_options(_):
+    run(initialize_db())
+    projection = {"field": True}
+    sort = [("field", ASCENDING)]
+    find_many(db_filter, projection=projection, sort=sort, limit=10)
+    find_kwargs = feeds_collection_mock.find.call_args.kwargs
+    assert projection == find_kwargs.get("projection")
+    assert sort == find_kwargs.get("sort")
+    assert 10 == find_kwargs.get("limit")
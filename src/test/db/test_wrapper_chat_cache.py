@@ -0,0 +1,118 @@
+from asyncio import run
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from pytest import fixture
+
+from db.chat_cache import ChatCache
+from db.wrapper import (
+    feed_is_already_stored,
+    get_latest_entry_data,
+    get_stored_feed_types,
+    get_stored_feeds_page,
+    remove_stored_chat_data,
+    remove_stored_feed,
+    store_feed_data,
+    update_all_stored_latest_data,
+)
+
+CHAT_ID = 1
+FEED_TYPE = "FEED_TYPE"
+FEED_NAME = "FEED_NAME"
+DOCUMENT = {"latest_link": "LINK", "latest_date": None}
+
+
+@fixture(autouse=True)
+def db_mocks():
+    with (
+        patch("db.wrapper._chat_cache", ChatCache(10, 10)),
+        patch("db.wrapper.find_one", new_callable=AsyncMock, return_value=DOCUMENT) as find_one,
+        patch("db.wrapper.distinct", new_callable=AsyncMock, return_value=[FEED_TYPE]) as distinct,
+        patch("db.wrapper.insert_one", new_callable=AsyncMock),
+        patch("db.wrapper.update_many", AsyncMock(return_value=MagicMock(matched_count=1))),
+        patch("db.wrapper.delete_many", new_callable=AsyncMock, return_value=MagicMock()),
+    ):
+        yield find_one, distinct
+
+
+def test_feed_is_read_once(db_mocks) -> None:
+    find_one_mock, _ = db_mocks
+    assert run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert ("LINK", None) == run(get_latest_entry_data(CHAT_ID, FEED_TYPE, FEED_NAME))
+    find_one_mock.assert_awaited_once()
+
+
+def test_missing_feed_is_cached(db_mocks) -> None:
+    find_one_mock, _ = db_mocks
+    find_one_mock.return_value = None
+    assert not run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert not run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    find_one_mock.assert_awaited_once()
+
+
+def test_stored_feed_is_cached_and_invalidates_types(db_mocks) -> None:
+    find_one_mock, distinct_mock = db_mocks
+    run(get_stored_feed_types(CHAT_ID))
+    run(store_feed_data(CHAT_ID, FEED_NAME, FEED_TYPE, "ID", "NEW_LINK", None))
+    assert ("NEW_LINK", None) == run(get_latest_entry_data(CHAT_ID, FEED_TYPE, FEED_NAME))
+    run(get_stored_feed_types(CHAT_ID))
+    find_one_mock.assert_not_awaited()
+    assert 2 == distinct_mock.await_count
+
+
+def test_bulk_update_replaces_cached_latest_data(db_mocks) -> None:
+    run(get_latest_entry_data(CHAT_ID, FEED_TYPE, FEED_NAME))
+    latest_data = [(CHAT_ID, FEED_TYPE, FEED_NAME, "OLD_ID", "ID", "NEW_LINK", None)]
+    run(update_all_stored_latest_data(latest_data))
+    assert ("NEW_LINK", None) == run(get_latest_entry_data(CHAT_ID, FEED_TYPE, FEED_NAME))
+
+
+def test_feed_removed_while_read_is_not_cached_as_stored(db_mocks) -> None:
+    find_one_mock, _ = db_mocks
+
+    async def find_one_removed_meanwhile(*_, **__):
+        await remove_stored_feed(CHAT_ID, FEED_TYPE, FEED_NAME)
+        return DOCUMENT
+
+    find_one_mock.side_effect = find_one_removed_meanwhile
+    assert run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert not run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    find_one_mock.assert_awaited_once()
+
+
+@patch("db.wrapper.WORKERS_ENABLED", True)
+def test_latest_data_is_always_read_with_workers(db_mocks) -> None:
+    find_one_mock, _ = db_mocks
+    assert run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert ("LINK", None) == run(get_latest_entry_data(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert ("LINK", None) == run(get_latest_entry_data(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert 3 == find_one_mock.await_count
+
+
+def test_removed_feed_is_cached_as_missing(db_mocks) -> None:
+    find_one_mock, _ = db_mocks
+    run(remove_stored_feed(CHAT_ID, FEED_TYPE, FEED_NAME))
+    assert not run(feed_is_already_stored(CHAT_ID, FEED_TYPE, FEED_NAME))
+    find_one_mock.assert_not_awaited()
+
+
+def test_removed_chat_data_is_read_again(db_mocks) -> None:
+    _, distinct_mock = db_mocks
+    run(get_stored_feed_types(CHAT_ID))
+    run(remove_stored_chat_data(CHAT_ID))
+    run(get_stored_feed_types(CHAT_ID))
+    assert 2 == distinct_mock.await_count
+
+
+def test_feeds_page_is_searched_ignoring_case() -> None:
+    async def no_documents(*_, **__):
+        for document in []:
+            yield document
+
+    with patch("db.wrapper.find_many", side_effect=no_documents) as find_many_mock:
+        run(get_stored_feeds_page(CHAT_ID, 2, name_ranges=[("A", "B")], name_prefix="a.b"))
+        run(get_stored_feeds_page(CHAT_ID, 2, name_ranges=[("A", "B")], name_prefix="a.c"))
+    name_filter = {"feed_name": {"$regex": r"^a\.b", "$options": "i"}}
+    assert name_filter in find_many_mock.call_args_list[0].args[0]["$and"]
+    # Pages of different queries are cached separately.
+    assert 2 == find_many_mock.call_count
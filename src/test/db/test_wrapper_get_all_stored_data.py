@@ -0,0 +1,72 @@
+from asyncio import run
+from itertools import product
+from typing import Any, AsyncIterator
+from unittest.mock import patch
+
+from db.wrapper import _after_document_filter, get_all_stored_data
+
+DOCUMENTS = [
+    {"chat_id": chat_id, "feed_type": feed_type, "feed_name": feed_name, "latest_id": ""}
+    for feed_type, feed_name, chat_id in product(["A", "B"], ["X", "Y"], [1, 2])
+]
+
+
+def matches(document: dict[str, Any], db_filter: dict[str, Any] | None) -> bool:
+    """Evaluate filters used by keyset pagination, with only equality and "$gt" operators."""
+    if db_filter is None:
+        return True
+    return all(_matches_condition(document, key, value) for key, value in db_filter.items())
+
+
+def _matches_condition(document: dict[str, Any], key: str, value: Any) -> bool:
+    if key == "$or":
+        return any(matches(document, alternative) for alternative in value)
+    return document[key] > value["$gt"] if isinstance(value, dict) else document[key] == value
+
+
+def find_many(db_filter: dict[str, Any] | None, limit: int, **_) -> AsyncIterator[dict]:
+    async def cursor():
+        found = [document for document in DOCUMENTS if matches(document, db_filter)]
+        for document in found[:limit]:
+            yield document
+
+    return cursor()
+
+
+async def collect(stored_data: AsyncIterator[tuple]) -> list[tuple]:
+    return [data async for data in stored_data]
+
+
+def test_after_document_filter_selects_following_documents() -> None:
+    for index, document in enumerate(DOCUMENTS, start=1):
+        following = [
+            other for other in DOCUMENTS if matches(other, _after_document_filter(document))
+        ]
+        assert DOCUMENTS[index:] == following
+
+
+@patch("db.wrapper.DB_BATCH_SIZE", 3)
+def test_all_data_is_streamed_in_batches() -> None:
+    with patch("db.wrapper.find_many", side_effect=find_many) as find_many_mock:
+        stored_data = run(collect(get_all_stored_data()))
+    expected_data = [
+        (document["chat_id"], document["feed_type"], document["feed_name"])
+        for document in DOCUMENTS
+    ]
+    assert expected_data == [
+        (chat_id, feed_type, feed_name) for chat_id, feed_type, feed_name, *_ in stored_data
+    ]
+    # Three full batches, one partial and one empty, ending the stream.
+    assert 4 == find_many_mock.call_count
+    assert find_many_mock.call_args_list[0].args[0] is None
+
+
+@patch("db.wrapper.DB_BATCH_SIZE", 3)
+def test_data_of_single_type_is_streamed() -> None:
+    with patch("db.wrapper.find_many", side_effect=find_many):
+        stored_data = run(collect(get_all_stored_data("B")))
+    expected_data = [document for document in DOCUMENTS if document["feed_type"] == "B"]
+    assert [document["feed_name"] for document in expected_data] == [
+        feed_name for _, _, feed_name, *_ in stored_data
+    ]
+    assert {"B"} == {feed_type for _, feed_type, *_ in stored_data}
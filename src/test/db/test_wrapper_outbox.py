@@ -0,0 +1,37 @@
+from asyncio import run
+from unittest.mock import AsyncMock, patch
+
+from db.wrapper import get_all_outbox_updates, postpone_outbox_update
+
+OUTBOX_ID = "OUTBOX_ID"
+
+
+async def collect(outbox_updates) -> list[tuple]:
+    return [update async for update in outbox_updates]
+
+
+@patch("db.wrapper.update_one", new_callable=AsyncMock, return_value={"attempts": 2})
+def test_postponed_update_counts_attempts(update_one_mock) -> None:
+    assert 3 == run(postpone_outbox_update(OUTBOX_ID, 60))
+    db_filter, update = update_one_mock.await_args.args
+    assert {"_id": OUTBOX_ID} == db_filter
+    assert "next_attempt_at" in update[0]["$set"]
+
+
+@patch("db.wrapper.update_one", new_callable=AsyncMock, return_value=None)
+def test_removed_update_is_not_postponed(_) -> None:
+    assert 0 == run(postpone_outbox_update(OUTBOX_ID, 60))
+
+
+@patch("db.wrapper.time", return_value=100)
+def test_only_due_updates_are_read(_) -> None:
+    async def no_documents(*_, **__):
+        for document in []:
+            yield document
+
+    with patch("db.wrapper.find_many", side_effect=no_documents) as find_many_mock:
+        run(collect(get_all_outbox_updates(50)))
+        run(collect(get_all_outbox_updates(50, postponed_only=True)))
+    all_filter, postponed_filter = [call.args[0] for call in find_many_mock.call_args_list]
+    assert {"created_at": {"$lt": 50}, "next_attempt_at": {"$not": {"$gt": 100}}} == all_filter
+    assert {**all_filter, "attempts": {"$gt": 0}} == postponed_filter
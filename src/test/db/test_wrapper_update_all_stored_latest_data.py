@@ -0,0 +1,50 @@
+from asyncio import run
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from db.wrapper import update_all_stored_latest_data
+
+FEED_TYPE = "FEED_TYPE"
+FEED_NAME = "FEED_NAME"
+LATEST_DATA = [
+    (1, FEED_TYPE, FEED_NAME, "OLD_ID", "ID", "LINK", None),
+    (2, FEED_TYPE, FEED_NAME, "OLD_ID", "ID", "LINK", None),
+]
+
+
+def documents(*chat_ids: int):
+    async def cursor(*_, **__):
+        for chat_id in chat_ids:
+            yield {"chat_id": chat_id, "feed_type": FEED_TYPE, "feed_name": FEED_NAME}
+
+    return cursor
+
+
+@patch("db.wrapper.find_many")
+@patch("db.wrapper.update_many", new_callable=AsyncMock)
+def test_feeds_are_updated_only_from_latest_id_they_were_read_with(
+    update_many_mock, find_many_mock
+) -> None:
+    update_many_mock.return_value = MagicMock(matched_count=2)
+    assert [True, True] == run(update_all_stored_latest_data(LATEST_DATA))
+    (db_filter, update), _ = update_many_mock.await_args.args[0]
+    assert {
+        "chat_id": 1,
+        "feed_type": FEED_TYPE,
+        "feed_name": FEED_NAME,
+        "latest_id": "OLD_ID",
+    } == db_filter
+    assert "ID" == update["$set"]["latest_id"]
+    # All feeds were updated, there's no need to check which ones.
+    find_many_mock.assert_not_called()
+
+
+@patch("db.wrapper.update_many", new_callable=AsyncMock)
+def test_feeds_updated_by_another_process_are_reported(update_many_mock) -> None:
+    update_many_mock.return_value = MagicMock(matched_count=1)
+    with patch("db.wrapper.find_many", side_effect=documents(2)) as find_many_mock:
+        assert [False, True] == run(update_all_stored_latest_data(LATEST_DATA))
+    # Feeds are told apart by the token of the write, not by their new latest ID.
+    (_, update), _ = update_many_mock.await_args.args[0]
+    db_filter = find_many_mock.call_args.args[0]
+    assert update["$set"]["latest_token"] == db_filter["latest_token"]
+    assert {1, 2} == set(db_filter["chat_id"]["$in"])
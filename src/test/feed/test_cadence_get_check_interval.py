@@ -0,0 +1,77 @@
+from time import gmtime
+from typing import Iterator
+from unittest.mock import patch
+
+from feedparser import FeedParserDict
+from pytest import fixture
+
+from feed.cadence import get_check_interval
+
+MIN_INTERVAL = 100
+MAX_INTERVAL = 10000
+IDLE_BACKOFF = 2
+
+
+def feed_with_entries(*timestamps: int, **kwargs) -> FeedParserDict:
+    entries = [FeedParserDict(published_parsed=gmtime(timestamp)) for timestamp in timestamps]
+    return FeedParserDict(entries=entries, **kwargs)
+
+
+@fixture(autouse=True)
+def settings() -> Iterator[None]:
+    with (
+        patch("feed.cadence.FEED_MIN_INTERVAL", MIN_INTERVAL),
+        patch("feed.cadence.FEED_MAX_INTERVAL", MAX_INTERVAL),
+        patch("feed.cadence.FEED_IDLE_BACKOFF", IDLE_BACKOFF),
+    ):
+        yield
+
+
+def test_median_publish_interval() -> None:
+    feed = feed_with_entries(5000, 1000, 2000, 2500, 4000)
+    assert 1000 == get_check_interval(feed, None, has_new_entries=True)
+
+
+def test_minimum_interval() -> None:
+    feed = feed_with_entries(1000, 1010, 1020)
+    assert MIN_INTERVAL == get_check_interval(feed, None, has_new_entries=True)
+
+
+def test_maximum_interval() -> None:
+    feed = feed_with_entries(100000, 200000)
+    assert MAX_INTERVAL == get_check_interval(feed, None, has_new_entries=True)
+
+
+def test_previous_interval_without_entry_dates() -> None:
+    feed = FeedParserDict(entries=[FeedParserDict()])
+    assert 500 == get_check_interval(feed, 500, has_new_entries=True)
+
+
+def test_minimum_interval_without_any_data() -> None:
+    assert MIN_INTERVAL == get_check_interval(FeedParserDict(), None, has_new_entries=True)
+
+
+def test_idle_feed_backoff() -> None:
+    feed = feed_with_entries(1000, 1200)
+    assert 1000 == get_check_interval(feed, 500, has_new_entries=False)
+
+
+def test_no_backoff_with_new_entries() -> None:
+    feed = feed_with_entries(1000, 1200)
+    assert 200 == get_check_interval(feed, 500, has_new_entries=True)
+
+
+def test_ttl_hint() -> None:
+    feed = feed_with_entries(1000, 1200, feed=FeedParserDict(ttl="10"))
+    assert 600 == get_check_interval(feed, None, has_new_entries=True)
+
+
+def test_cache_control_hint() -> None:
+    headers = {"cache-control": "public, max-age=900"}
+    feed = feed_with_entries(1000, 1200, headers=headers)
+    assert 900 == get_check_interval(feed, None, has_new_entries=True)
+
+
+def test_invalid_ttl_is_ignored() -> None:
+    feed = feed_with_entries(1000, 1200, feed=FeedParserDict(ttl="soon"))
+    assert 200 == get_check_interval(feed, None, has_new_entries=True)
@@ -1,9 +1,10 @@
+from typing import Any
 from unittest.mock import patch
 
 from feedparser import FeedParserDict
 from pytest import mark
 
-from feed.parser import parse_description
+from feed.parser import _compile_all_filters, parse_description
 
 FEED_TYPE = "FEED_TYPE"
 ENTRY = FeedParserDict({"summary": "\n\n\n<b>bold text</b><a>\n\nlink text</a> raw\ntext\n\n\n"})
@@ -12,7 +13,14 @@ FILTERS = ["nk te", "w\nt"]
 EXPECTED_FILTERED_DESCRIPTION = "bold text\n\nlixt raext"
 
 
-@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {"show_description": True}})
+def patch_feeds(rss_feeds: dict[str, dict[str, Any]]) -> Any:
+    """Patch feed types along with their filters, which are otherwise compiled at import."""
+    return patch.multiple(
+        "feed.parser", RSS_FEEDS=rss_feeds, _FILTERS=_compile_all_filters(rss_feeds)
+    )
+
+
+@patch_feeds({FEED_TYPE: {"show_description": True}})
 @mark.parametrize(
     ("summary", "expected_description"),
     [
@@ -33,11 +41,34 @@ def test_parse_description_description_enabled(summary, expected_description) ->
     assert expected_description == parse_description(entry, FEED_TYPE)
 
 
-@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {"show_description": True, "filters": FILTERS}})
+@patch_feeds({FEED_TYPE: {"show_description": True, "filters": FILTERS}})
 def test_parse_description_with_filtering() -> None:
     assert EXPECTED_FILTERED_DESCRIPTION == parse_description(ENTRY, FEED_TYPE)
 
 
-@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {}})
+@patch_feeds({FEED_TYPE: {}})
 def test_parse_description_description_disabled() -> None:
     assert parse_description(ENTRY, FEED_TYPE) is None
+
+
+@patch_feeds(
+    {
+        FEED_TYPE: {
+            "show_description": True,
+            "filters": [
+                "text",
+                {"pattern": "BOLD ", "ignore_case": True},
+                {"pattern": r"\s+li", "regex": True},
+            ],
+        }
+    },
+)
+def test_parse_description_with_regex_and_case_insensitive_filtering() -> None:
+    assert "nk  raw\n" == parse_description(ENTRY, FEED_TYPE)
+
+
+@patch_feeds(
+    {FEED_TYPE: {"show_description": True, "filters": ["link", "link text"]}},
+)
+def test_parse_description_longer_filter_is_removed_whole() -> None:
+    assert "bold text\n\n raw\ntext" == parse_description(ENTRY, FEED_TYPE)
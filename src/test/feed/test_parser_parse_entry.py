@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+from bs4 import BeautifulSoup
+from feedparser import FeedParserDict
+from pytest import mark
+
+from feed.parser import ParsedEntry, parse_entry
+
+FEED_TYPE = "FEED_TYPE"
+LINK = "LINK"
+TITLE = "TITLE"
+SUMMARY = """
+    <img src='img-link' alt='alt text'>
+    summary text
+    <source src='source-link'>
+"""
+ENTRY = FeedParserDict({"link": LINK, "title": TITLE, "summary": SUMMARY})
+ENTRY_WITH_MEDIA_CONTENT = FeedParserDict(
+    {"link": LINK, "title": TITLE, "summary": SUMMARY, "media_content": [{"url": "media-link"}]}
+)
+
+
+@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {"show_title": True, "show_description": True}})
+@mark.parametrize(
+    argnames=["entry", "expected_parsed_entry"],
+    argvalues=[
+        (ENTRY, ParsedEntry(LINK, "<b>TITLE</b>", "summary text", ["img-link", "source-link"])),
+        (
+            ENTRY_WITH_MEDIA_CONTENT,
+            ParsedEntry(LINK, "<b>TITLE</b>", "summary text", ["media-link"]),
+        ),
+    ],
+)
+def test_parse_entry(entry: FeedParserDict, expected_parsed_entry: ParsedEntry) -> None:
+    assert expected_parsed_entry == parse_entry(entry, FEED_TYPE)
+
+
+@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {}})
+@patch("feed.parser.BeautifulSoup")
+def test_parse_entry_summary_not_parsed_when_not_needed(beautiful_soup_mock) -> None:
+    parsed_entry = parse_entry(ENTRY_WITH_MEDIA_CONTENT, FEED_TYPE)
+    beautiful_soup_mock.assert_not_called()
+    assert ParsedEntry(LINK, None, None, ["media-link"]) == parsed_entry
+
+
+@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {}})
+@patch("feed.parser.BeautifulSoup", wraps=BeautifulSoup)
+def test_parse_entry_summary_parsed_once(beautiful_soup_mock) -> None:
+    parse_entry(ENTRY, FEED_TYPE)
+    beautiful_soup_mock.assert_called_once()
@@ -1,8 +1,9 @@
+from typing import Any
 from unittest.mock import patch
 
 from feedparser import FeedParserDict
 
-from feed.parser import parse_title
+from feed.parser import _compile_all_filters, parse_title
 
 FEED_TYPE = "FEED_TYPE"
 ENTRY = FeedParserDict({"title": "\n\n\ntext\n\nmore\ntext\n\n\n"})
@@ -11,16 +12,28 @@ FILTERS = ["\n\nmore", "xt"]
 EXPECTED_FILTERED_TITLE = "<b>te\nte</b>"
 
 
-@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {"show_title": True}})
+def patch_feeds(rss_feeds: dict[str, dict[str, Any]]) -> Any:
+    """Patch feed types along with their filters, which are otherwise compiled at import."""
+    return patch.multiple(
+        "feed.parser", RSS_FEEDS=rss_feeds, _FILTERS=_compile_all_filters(rss_feeds)
+    )
+
+
+@patch_feeds({FEED_TYPE: {"show_title": True}})
 def test_parse_title_enabled() -> None:
     assert EXPECTED_TITLE == parse_title(ENTRY, FEED_TYPE)
 
 
-@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {"show_title": True, "filters": FILTERS}})
+@patch_feeds({FEED_TYPE: {"show_title": True, "filters": FILTERS}})
 def test_parse_title_filtered() -> None:
     assert EXPECTED_FILTERED_TITLE == parse_title(ENTRY, FEED_TYPE)
 
 
-@patch("feed.parser.RSS_FEEDS", {FEED_TYPE: {}})
+@patch_feeds({FEED_TYPE: {}})
 def test_parse_title_disabled() -> None:
     assert parse_title(ENTRY, FEED_TYPE) is None
+
+
+@patch_feeds({FEED_TYPE: {"show_title": True, "filters": ["", {"pattern": ""}, "xt"]}})
+def test_parse_title_empty_filters_are_skipped() -> None:
+    assert "<b>te\n\nmore\nte</b>" == parse_title(ENTRY, FEED_TYPE)
@@ -0,0 +1,17 @@
+from feedparser import FeedParserDict
+from pytest import mark
+
+from feed.reader import feed_is_not_modified
+
+
+@mark.parametrize(
+    argnames=["parsed_rss", "expected_not_modified"],
+    argvalues=[
+        (FeedParserDict({"status": 304}), True),
+        (FeedParserDict({"status": 200, "entries": [None]}), False),
+        (FeedParserDict({"status": 301, "entries": [None]}), False),
+        (FeedParserDict({}), False),
+    ],
+)
+def test_feed_is_not_modified(parsed_rss: FeedParserDict, expected_not_modified: bool) -> None:
+    assert expected_not_modified == feed_is_not_modified(parsed_rss)
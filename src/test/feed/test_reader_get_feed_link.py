@@ -0,0 +1,13 @@
+from unittest.mock import patch
+
+from feed.reader import get_feed_link
+
+FEED_TYPE = "FEED_TYPE"
+FEED_NAME = "FEED_NAME"
+FEED_LINK = "FEED_LINK_{source_pattern}"
+EXPECTED_FEED_LINK = FEED_LINK.format(source_pattern=FEED_NAME)
+
+
+@patch("feed.reader.RSS_FEEDS", {FEED_TYPE: {"url": FEED_LINK}})
+def test_get_feed_link() -> None:
+    assert EXPECTED_FEED_LINK == get_feed_link(FEED_TYPE, FEED_NAME)
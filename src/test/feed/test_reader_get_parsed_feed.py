@@ -1,25 +1,84 @@
-from unittest.mock import patch
+from asyncio import run
+from unittest.mock import AsyncMock, patch
 
-from feedparser import FeedParserDict
+from httpx import ConnectError, InvalidURL, Request, Response
 
 from feed.reader import get_parsed_feed
 
 FEED_TYPE = "FEED_TYPE"
 FEED_NAME = "FEED_NAME"
-FEED_LINK = "FEED_LINK_{source_pattern}"
+FEED_LINK = "https://feed.link/{source_pattern}"
 EXPECTED_FEED_LINK = FEED_LINK.format(source_pattern=FEED_NAME)
-MOCKED_FEED_PARSER_DICT = FeedParserDict({"id": "FEED-ID"})
+ETAG = "ETAG"
+MODIFIED = "MODIFIED"
+FEED_CONTENT = b"""<?xml version="1.0"?>
+<rss version="2.0">
+  <channel>
+    <title>FEED-TITLE</title>
+    <item><guid>https://feed.link/ENTRY-ID</guid><link>/entry</link></item>
+  </channel>
+</rss>
+"""
 
 
-def mocked_parse(url_file_stream_or_string: str) -> FeedParserDict | None:
-    if url_file_stream_or_string == EXPECTED_FEED_LINK:
-        return MOCKED_FEED_PARSER_DICT
-    else:
-        return None
+def mocked_response(status_code: int, content: bytes = b"", **headers: str) -> Response:
+    return Response(
+        status_code, content=content, headers=headers, request=Request("GET", EXPECTED_FEED_LINK)
+    )
 
 
 @patch("feed.reader.RSS_FEEDS", {FEED_TYPE: {"url": FEED_LINK}})
-@patch("feed.reader.parse", side_effect=mocked_parse)
-def test_get_parsed_feed(_) -> None:
-    parsed_feed = get_parsed_feed(FEED_TYPE, FEED_NAME)
-    assert MOCKED_FEED_PARSER_DICT == parsed_feed
+@patch("feed.reader._client")
+def test_get_parsed_feed(client_mock) -> None:
+    response = mocked_response(200, FEED_CONTENT, etag=ETAG, **{"last-modified": MODIFIED})
+    client_mock.get = AsyncMock(return_value=response)
+    parsed_feed = run(get_parsed_feed(FEED_TYPE, FEED_NAME))
+    assert EXPECTED_FEED_LINK == client_mock.get.call_args.args[0]
+    assert EXPECTED_FEED_LINK == parsed_feed.href
+    assert 200 == parsed_feed.status
+    assert ETAG == parsed_feed.etag
+    assert MODIFIED == parsed_feed.modified
+    assert "FEED-TITLE" == parsed_feed.feed.title
+    assert ["https://feed.link/ENTRY-ID"] == [entry.id for entry in parsed_feed.entries]
+    assert "https://feed.link/entry" == parsed_feed.entries[0].link
+
+
+@patch("feed.reader.RSS_FEEDS", {FEED_TYPE: {"url": FEED_LINK}})
+@patch("feed.reader._client")
+def test_get_parsed_feed_with_validators(client_mock) -> None:
+    client_mock.get = AsyncMock(return_value=mocked_response(200, FEED_CONTENT))
+    run(get_parsed_feed(FEED_TYPE, FEED_NAME, ETAG, MODIFIED))
+    headers = client_mock.get.call_args.kwargs.get("headers")
+    assert ETAG == headers.get("if-none-match")
+    assert MODIFIED == headers.get("if-modified-since")
+
+
+@patch("feed.reader.RSS_FEEDS", {FEED_TYPE: {"url": FEED_LINK}})
+@patch("feed.reader._client")
+@patch("feed.reader.parse")
+def test_get_parsed_feed_not_modified(parse_mock, client_mock) -> None:
+    client_mock.get = AsyncMock(return_value=mocked_response(304))
+    parsed_feed = run(get_parsed_feed(FEED_TYPE, FEED_NAME, ETAG, MODIFIED))
+    parse_mock.assert_not_called()
+    assert 304 == parsed_feed.status
+    assert [] == parsed_feed.entries
+
+
+@patch("feed.reader.RSS_FEEDS", {FEED_TYPE: {"url": FEED_LINK}})
+@patch("feed.reader._client")
+def test_get_parsed_feed_connection_error(client_mock) -> None:
+    client_mock.get = AsyncMock(side_effect=ConnectError("connection error"))
+    parsed_feed = run(get_parsed_feed(FEED_TYPE, FEED_NAME))
+    assert EXPECTED_FEED_LINK == parsed_feed.href
+    assert parsed_feed.status is None
+    assert [] == parsed_feed.entries
+
+
+@patch("feed.reader.RSS_FEEDS", {FEED_TYPE: {"url": FEED_LINK}})
+@patch("feed.reader._client")
+def test_get_parsed_feed_invalid_url(client_mock) -> None:
+    client_mock.get = AsyncMock(side_effect=InvalidURL("invalid URL"))
+    parsed_feed = run(get_parsed_feed(FEED_TYPE, FEED_NAME))
+    assert EXPECTED_FEED_LINK == parsed_feed.href
+    assert parsed_feed.bozo
+    assert [] == parsed_feed.entries
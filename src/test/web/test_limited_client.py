@@ -0,0 +1,47 @@
+from asyncio import Event, create_task, run, sleep
+
+from web.client import LimitedClient
+
+URL_1 = "https://host.one/path"
+URL_2 = "https://host.two/path"
+
+
+async def request(client: LimitedClient, url: str) -> None:
+    async with client._limit(url):
+        pass
+
+
+def test_requests_to_host_are_limited() -> None:
+    async def send_requests() -> None:
+        client = LimitedClient(10, 1, 1)
+        first_sent = Event()
+        first_finished = Event()
+
+        async def first_request() -> None:
+            async with client._limit(URL_1):
+                first_sent.set()
+                await first_finished.wait()
+
+        first = create_task(first_request())
+        await first_sent.wait()
+        second = create_task(request(client, URL_1))
+        await sleep(0.01)
+        assert not second.done()
+        await request(client, URL_2)
+        first_finished.set()
+        await first
+        await second
+
+    run(send_requests())
+
+
+def test_idle_host_limits_are_removed() -> None:
+    async def send_requests() -> LimitedClient:
+        client = LimitedClient(10, 1, 1)
+        async with client._limit(URL_1), client._limit(URL_2):
+            assert {"host.one", "host.two"} == set(client._host_semaphores)
+        return client
+
+    client = run(send_requests())
+    assert {} == client._host_semaphores
+    assert not client._host_requests
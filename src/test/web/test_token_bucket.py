@@ -0,0 +1,77 @@
+from asyncio import create_task, gather, run, sleep
+from unittest.mock import AsyncMock, patch
+
+from web.token_bucket import TokenBucket
+
+RATE = 2
+CAPACITY = 3
+ORDERED_WAITERS = [("low_1", 1), ("low_2", 1), ("high", 0)]
+
+
+@patch("web.token_bucket.sleep", new_callable=AsyncMock)
+@patch("web.token_bucket.monotonic", return_value=0)
+def test_burst_up_to_capacity_does_not_wait(_, sleep_mock) -> None:
+    bucket = TokenBucket(RATE, CAPACITY)
+    for _ in range(CAPACITY):
+        run(bucket.acquire())
+    sleep_mock.assert_not_called()
+
+
+@patch("web.token_bucket.sleep", new_callable=AsyncMock)
+@patch("web.token_bucket.monotonic")
+def test_acquire_waits_for_refill(monotonic_mock, sleep_mock) -> None:
+    monotonic_mock.side_effect = [0, 0, 0, 0, 0, 1 / RATE]
+    bucket = TokenBucket(RATE, CAPACITY)
+    for _ in range(CAPACITY + 1):
+        run(bucket.acquire())
+    sleep_mock.assert_called_once_with(1 / RATE)
+
+
+@patch("web.token_bucket.sleep", new_callable=AsyncMock)
+@patch("web.token_bucket.monotonic")
+def test_tokens_are_refilled_up_to_capacity(monotonic_mock, sleep_mock) -> None:
+    monotonic_mock.side_effect = [0, 100, 100, 100, 100, 100 + 1 / RATE]
+    bucket = TokenBucket(RATE, CAPACITY)
+    for _ in range(CAPACITY + 1):
+        run(bucket.acquire())
+    sleep_mock.assert_called_once_with(1 / RATE)
+
+
+@patch("web.token_bucket.monotonic")
+def test_bucket_is_full_once_refilled(monotonic_mock) -> None:
+    monotonic_mock.return_value = 0
+    bucket = TokenBucket(RATE, CAPACITY)
+    run(bucket.acquire())
+    assert not bucket.is_full()
+    monotonic_mock.return_value = 1 / RATE
+    assert bucket.is_full()
+
+
+def test_waiters_take_tokens_by_priority() -> None:
+    async def acquire_all() -> list[str]:
+        bucket = TokenBucket(100, 1)
+        acquired = []
+
+        async def acquire(name: str, priority: int) -> None:
+            await bucket.acquire(priority)
+            acquired.append(name)
+
+        await acquire("first", 1)
+        waiters = [create_task(acquire(name, priority)) for name, priority in ORDERED_WAITERS]
+        await gather(*waiters)
+        return acquired
+
+    assert ["first", "high", "low_1", "low_2"] == run(acquire_all())
+
+
+def test_cancelled_waiter_is_removed() -> None:
+    async def acquire_after_cancelled() -> None:
+        bucket = TokenBucket(100, 1)
+        await bucket.acquire()
+        cancelled = create_task(bucket.acquire())
+        await sleep(0)
+        cancelled.cancel()
+        await bucket.acquire()
+        assert not bucket.is_full()
+
+    run(acquire_after_cancelled())